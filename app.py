@@ -7,6 +7,7 @@
 Краткое описание: веб-приложение для генерации и управления цветовыми палитрами на основе изображений
 """
 
+import atexit
 import hmac
 import os
 import secrets
@@ -25,23 +26,34 @@ from flask import (
 )
 from werkzeug.routing import BuildError
 
+from commands import register_commands
 from config import Config
 from extensions import db, login_manager, cors, babel
-import models  # noqa: F401 - регистрирует модели для db.create_all()
+import models  # noqa: F401 - регистрирует модели в db.metadata
 from routes.pages import register_routes as register_page_routes
 from routes.auth import register_routes as register_auth_routes
 from routes.api import register_routes as register_api_routes
 from routes.mobile_api import register_routes as register_mobile_api_routes
 from utils.cleanup import cleanup_old_uploads
+from utils.compute_pool import ComputePool
 from flask_babel import gettext as _
 from utils.i18n import is_supported_language, resolve_request_language
-from utils.rate_limit import InMemoryRateLimiter
+from utils.image_processor import is_known_engine
+from utils.maintenance import init_maintenance
+from utils.migrations import ensure_schema
+from utils.mobile_tokens import AccessTokenCache
+from utils.palette_cache import PaletteCache
+from utils.rate_limit import create_rate_limiter
+from utils.storage import create_upload_storage
+from utils.upload_derivatives import thumbnail_name
 
 
 def create_app() -> Flask:
     """Фабрика приложения, собирающая все модули воедино."""
     app = Flask(__name__)
     app.config.from_object(Config)
+    if not is_known_engine(app.config["PALETTE_ENGINE"]):
+        raise RuntimeError(f"Неизвестный движок квантования PALETTE_ENGINE={app.config['PALETTE_ENGINE']!r}")
 
     # Инициализация расширений
     db.init_app(app)
@@ -62,21 +74,50 @@ def create_app() -> Flask:
     login_manager.login_view = "login"
     login_manager.login_message = "Пожалуйста, войдите, чтобы получить доступ к этой странице."
     login_manager.login_message_category = "error"
-    app.extensions["rate_limiter"] = InMemoryRateLimiter()
+    app.extensions["rate_limiter"] = create_rate_limiter(app.config)
 
     # Гарантируем наличие служебных директорий
     os.makedirs(app.instance_path, exist_ok=True)
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    if not app.config["HISTOGRAM_FOLDER"]:
+        app.config["HISTOGRAM_FOLDER"] = os.path.join(app.instance_path, "histograms")
+    os.makedirs(app.config["HISTOGRAM_FOLDER"], exist_ok=True)
+
+    app.extensions["upload_storage"] = create_upload_storage(app.config)
+
+    app.extensions["palette_cache"] = PaletteCache(
+        app.config["PALETTE_CACHE_DIR"] or os.path.join(app.instance_path, "palette_cache"),
+        memory_items=app.config["PALETTE_CACHE_MEMORY_ITEMS"],
+        disk_max_bytes=app.config["PALETTE_CACHE_DISK_MAX_MB"] * 1024 * 1024,
+    )
+
+    app.extensions["mobile_token_cache"] = AccessTokenCache(
+        max_items=app.config["MOBILE_TOKEN_CACHE_ITEMS"],
+        ttl_seconds=app.config["MOBILE_TOKEN_CACHE_SECONDS"],
+    )
+
+    app.extensions["compute_pool"] = ComputePool(
+        workers=app.config["COMPUTE_POOL_SIZE"],
+        queue_max=app.config["COMPUTE_QUEUE_MAX"],
+        task_threads=app.config["COMPUTE_TASK_THREADS"],
+        retry_after_seconds=app.config["COMPUTE_RETRY_AFTER_SECONDS"],
+        task_timeout_seconds=app.config["COMPUTE_TASK_TIMEOUT_SECONDS"],
+    )
+    atexit.register(app.extensions["compute_pool"].shutdown)
 
     # Регистрация роутов по модулям
     register_page_routes(app)
     register_auth_routes(app)
     register_api_routes(app)
     register_mobile_api_routes(app)
+    register_commands(app)
 
     with app.app_context():
-        # Создаем отсутствующие таблицы (без изменения существующих колонок)
-        db.create_all()
+        # Сверяем версию схемы одним запросом и при необходимости применяем миграции
+        ensure_schema(app)
+
+    # Планировщик служебных задач в фоне (MAINTENANCE_SCHEDULER_ENABLED)
+    init_maintenance(app)
 
     def _resolve_request_lang(url_lang: str | None = None) -> str:
         """Служебная функция `_resolve_request_lang` для внутренней логики модуля."""
@@ -201,6 +242,7 @@ def create_app() -> Flask:
             "current_lang": _language_for_url(),
             "supported_langs": app.config["SUPPORTED_LANGUAGES"],
             "alternate_lang_url": _alternate_lang_url,
+            "upload_thumbnail": thumbnail_name,
             "js_i18n": {
                 "hex_copied": _("HEX код скопирован!"),
                 "copy_error": _("Ошибка копирования:"),
@@ -237,6 +279,7 @@ def create_app() -> Flask:
                 "rename_error": _("Ошибка при переименовании палитры"),
                 "rename_unknown_error": _("Произошла ошибка при переименовании палитры"),
                 "colors_copied": _("Цвета скопированы в буфер обмена!"),
+                "palette_list_error": _("Не удалось загрузить палитры"),
                 "generate_palette_first": _("Сначала сгенерируйте палитру!"),
                 "default_palette_name": _("Моя палитра"),
                 "copy_hex_title": _("Скопировать HEX"),
@@ -319,7 +362,13 @@ def create_app() -> Flask:
     @app.get("/healthz")
     def healthz():
         """Выполняет операцию `healthz` в рамках сценария модуля."""
-        return {"status": "ok"}, 200
+        return {
+            "status": "ok",
+            "palette_cache": app.extensions["palette_cache"].stats(),
+            "compute_pool": app.extensions["compute_pool"].stats(),
+            "mobile_token_cache": app.extensions["mobile_token_cache"].stats(),
+            "rate_limiter": app.extensions["rate_limiter"].stats(),
+        }, 200
 
     return app
 
@@ -329,7 +378,11 @@ app = create_app()
 
 if __name__ == "__main__":
     with app.app_context():
-        # Очистка старых загрузок при запуске приложения
-        cleanup_old_uploads()
+        # Очистка старых загрузок при запуске приложения; в продакшене – планировщик `utils/maintenance.py`
+        cleanup_old_uploads(
+            days=app.config["UPLOAD_RETENTION_DAYS"],
+            batch_size=app.config["CLEANUP_BATCH_SIZE"],
+            time_budget=app.config["CLEANUP_TIME_BUDGET_SECONDS"],
+        )
     is_production = os.environ.get("FLASK_ENV", "").lower() == "production"
     app.run(debug=not is_production)
@@ -0,0 +1,182 @@
+"""
+Модуль: `commands.py`.
+Назначение: Регистрация CLI-команд Flask (`flask <команда>`).
+"""
+
+import click
+
+from utils.cleanup import cleanup_old_uploads
+from utils.extraction_jobs import run_worker
+from utils.image_processor import ENGINES
+from utils.maintenance import MAINTENANCE_JOBS, get_maintenance_job, run_maintenance_job, run_scheduler
+from utils.migrations import current_version, head_version, upgrade_schema
+from utils.palette_benchmark import benchmark_compaction, benchmark_engines, collect_image_paths
+from utils.upload_derivatives import backfill_derivatives, purge_expired_originals
+from utils.upload_storage import migrate_flat_uploads
+
+
+def register_commands(app):
+    """Выполняет операцию `register_commands` в рамках сценария модуля."""
+
+    @app.cli.command("palette-benchmark")
+    @click.argument("sources", nargs=-1, type=click.Path(exists=True))
+    @click.option("--colors", "num_colors", default=5, show_default=True, help="Количество цветов палитры.")
+    @click.option("--repeat", default=3, show_default=True, help="Повторов на изображение (берётся лучший).")
+    @click.option(
+        "--engine",
+        "engines",
+        multiple=True,
+        type=click.Choice(sorted(ENGINES)),
+        help="Движок для замера (по умолчанию все).",
+    )
+    @click.option(
+        "--compaction",
+        "compaction_bits",
+        multiple=True,
+        type=click.IntRange(1, 8),
+        help="Сравнить кластеризацию всех пикселей со сжатием до уникальных цветов (бит на канал).",
+    )
+    def palette_benchmark(sources, num_colors, repeat, engines, compaction_bits):
+        """Замеряет задержку и искажение движков квантования на наборе изображений."""
+        image_paths = collect_image_paths(list(sources) or [app.config["UPLOAD_FOLDER"]])
+        if not image_paths:
+            raise click.ClickException("Не найдено изображений для замера.")
+
+        if compaction_bits:
+            click.echo(f"Изображений: {len(image_paths)}, k={num_colors}")
+            click.echo(f"{'engine':<15} {'bits':>5} {'points':>8} {'latency, ms':>12} {'MSE':>10} {'ΔRGB':>7}")
+            for engine in list(engines) or sorted(ENGINES):
+                for row in benchmark_compaction(
+                    image_paths,
+                    num_colors=num_colors,
+                    engine=engine,
+                    bits_options=list(compaction_bits),
+                    repeat=repeat,
+                ):
+                    bits = row["bits"] or "-"
+                    click.echo(
+                        f"{engine:<15} {bits:>5} {row['points']:>8.0f} {row['latency_ms']:>12.1f}"
+                        f" {row['error']:>10.1f} {row['difference']:>7.1f}"
+                    )
+            return
+
+        results = benchmark_engines(
+            image_paths,
+            num_colors=num_colors,
+            engines=list(engines) or None,
+            repeat=repeat,
+        )
+
+        click.echo(f"Изображений: {len(image_paths)}, k={num_colors}")
+        click.echo(f"{'engine':<15} {'latency, ms':>12} {'MSE':>10} {'vs kmeans':>10}")
+        for row in results:
+            relative = f"{row['relative_error'] * 100:.0f}%" if row["relative_error"] else "-"
+            click.echo(
+                f"{row['engine']:<15} {row['latency_ms']:>12.1f} {row['error']:>10.1f} {relative:>10}"
+            )
+
+    @app.cli.command("worker")
+    @click.option("--poll-interval", default=1.0, show_default=True, help="Пауза между опросами пустой очереди, с.")
+    @click.option("--once", is_flag=True, help="Обработать очередь и завершиться.")
+    @click.option("--max-jobs", default=0, show_default=True, help="Завершиться после N задач (0 – без ограничения).")
+    def worker(poll_interval, once, max_jobs):
+        """Обрабатывает очередь фоновых задач извлечения палитры."""
+        # Воркер сам является процессом для вычислений: пул процессов ему не нужен
+        app.extensions["compute_pool"] = None
+        click.echo("Воркер извлечения палитр запущен")
+        try:
+            processed = run_worker(poll_interval, once=once, max_jobs=max_jobs)
+        except KeyboardInterrupt:
+            return
+        click.echo(f"Обработано задач: {processed}")
+
+    @app.cli.command("migrate-uploads")
+    @click.option("--dry-run", is_flag=True, help="Только посчитать, ничего не переносить.")
+    def migrate_uploads(dry_run):
+        """Переносит загрузки из плоского каталога в дерево `ab/cd/<sha256>.<ext>` без дубликатов."""
+        stats = migrate_flat_uploads(app.config["UPLOAD_FOLDER"], dry_run=dry_run)
+        prefix = "Будет перенесено" if dry_run else "Перенесено"
+        click.echo(
+            f"{prefix}: {stats['migrated']}, дубликатов: {stats['deduplicated']}, "
+            f"файлов нет: {stats['missing']}, не изображения: {stats['invalid']}"
+        )
+
+    @app.cli.command("cleanup-uploads")
+    @click.option(
+        "--days",
+        type=click.IntRange(0),
+        default=None,
+        help="Срок хранения загрузок, дней (по умолчанию UPLOAD_RETENTION_DAYS).",
+    )
+    @click.option("--batch-size", type=click.IntRange(1), default=None, help="Записей в одной транзакции.")
+    @click.option(
+        "--time-budget",
+        type=click.IntRange(0),
+        default=None,
+        help="Предел времени работы, с (0 – без предела; по умолчанию CLEANUP_TIME_BUDGET_SECONDS).",
+    )
+    @click.option("--no-orphans", is_flag=True, help="Не сверять файлы хранилища с записями БД.")
+    def cleanup_uploads(days, batch_size, time_budget, no_orphans):
+        """Удаляет старые загрузки пачками и сверяет хранилище с БД."""
+        config = app.config
+        stats = cleanup_old_uploads(
+            days=config["UPLOAD_RETENTION_DAYS"] if days is None else days,
+            batch_size=batch_size or config["CLEANUP_BATCH_SIZE"],
+            time_budget=config["CLEANUP_TIME_BUDGET_SECONDS"] if time_budget is None else time_budget,
+            sweep_orphans=not no_orphans,
+            orphan_grace_seconds=config["CLEANUP_ORPHAN_GRACE_SECONDS"],
+        )
+        click.echo(
+            f"Удалено загрузок: {stats['expired_rows']}, записей без файла: {stats['rows_without_file']}, "
+            f"файлов: {stats['files_deleted']}, осиротевших файлов: {stats['orphan_files']}, "
+            f"временных: {stats['stale_temp_files']}, гистограмм: {stats['orphan_histograms']} "
+            f"(проверено файлов: {stats['files_scanned']}, транзакций: {stats['batches']})"
+        )
+        if not stats["complete"]:
+            click.echo("Бюджет времени исчерпан: очистка продолжится при следующем запуске")
+
+    @app.cli.command("upload-derivatives")
+    @click.option(
+        "--purge-originals",
+        is_flag=True,
+        help="Удалить оригиналы старше UPLOAD_ORIGINAL_RETENTION_DAYS, у которых есть мастер.",
+    )
+    def upload_derivatives(purge_originals):
+        """Достраивает WebP-мастера и миниатюры загрузок и при необходимости удаляет старые оригиналы."""
+        built = backfill_derivatives()
+        click.echo(f"Построено производных: {built}")
+        if purge_originals:
+            days = app.config["UPLOAD_ORIGINAL_RETENTION_DAYS"]
+            if days <= 0:
+                click.echo("UPLOAD_ORIGINAL_RETENTION_DAYS не задан: оригиналы хранятся бессрочно")
+                return
+            purged = purge_expired_originals(days)
+            click.echo(f"Удалено оригиналов старше {days} дн.: {purged}")
+
+    @app.cli.command("maintenance")
+    @click.option("--once", is_flag=True, help="Один проход по задачам, срок которых подошёл, и выход.")
+    @click.option(
+        "--job",
+        "job_name",
+        type=click.Choice([job.name for job in MAINTENANCE_JOBS]),
+        default=None,
+        help="Выполнить одну задачу сейчас, не дожидаясь её срока.",
+    )
+    def maintenance(once, job_name):
+        """Запускает планировщик служебных задач (отдельным процессом вместо потока в приложении)."""
+        if job_name:
+            stats = run_maintenance_job(get_maintenance_job(job_name), force=True)
+            if stats is None:
+                click.echo(f"Задача {job_name} уже выполняется другим экземпляром")
+            else:
+                click.echo(f"{job_name}: {stats}")
+            return
+        run_scheduler(once=once)
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade():
+        """Применяет неприменённые миграции схемы БД (`migrations/`)."""
+        applied = upgrade_schema()
+        for name in applied:
+            click.echo(f"Применена миграция: {name}")
+        click.echo(f"Версия схемы: {current_version()} (последняя: {head_version()})")
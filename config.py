@@ -5,6 +5,8 @@
 Назначение модуля:
 - Определение базовых параметров приложения Flask (секретный ключ, строка подключения к БД).
 - Настройка параметров загрузки файлов (папка, максимальный размер, допустимые расширения).
+- Выбор движка квантования палитры по умолчанию и параметры кэша палитр.
+- Параметры пула процессов для CPU-тяжёлых вычислений и фоновых задач извлечения палитры.
 - Предоставление вспомогательной функции allowed_file() для проверки расширения файлов.
 """
 
@@ -87,6 +89,8 @@ class Config:
     SQLALCHEMY_ENGINE_OPTIONS = {
         "pool_pre_ping": True,
     }
+    # Применять миграции схемы (`migrations/`) при старте; иначе – только `flask db-upgrade`
+    AUTO_MIGRATE = _get_env_bool("AUTO_MIGRATE", default=True)
     SESSION_COOKIE_SECURE = _get_env_bool("SESSION_COOKIE_SECURE", default=_PRODUCTION)
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = os.environ.get("SESSION_COOKIE_SAMESITE", "Lax")
@@ -106,15 +110,86 @@ class Config:
     )
 
     UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "static/uploads")
+    # Хранилище загрузок: `local` (UPLOAD_FOLDER) или `s3` (S3-совместимое, нужен boto3);
+    # при `s3` UPLOAD_FOLDER – только каталог временных файлов
+    UPLOAD_STORAGE = os.environ.get("UPLOAD_STORAGE", "local")
+    S3_BUCKET = os.environ.get("S3_BUCKET", "")
+    S3_PREFIX = os.environ.get("S3_PREFIX", "uploads/")
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "")
+    S3_REGION = os.environ.get("S3_REGION", "")
+    S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID", "")
+    S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY", "")
+    # Браузер читает файлы из S3 по подписанной ссылке (срок, с); 0 – отдавать через приложение
+    S3_PRESIGNED_URL_TTL = _get_env_int("S3_PRESIGNED_URL_TTL", 3600)
+    # Производные файлы загрузки: WebP-мастер (длинная сторона, px) и миниатюры (длинная сторона 1x, px)
+    UPLOAD_MASTER_MAX_SIDE = _get_env_int("UPLOAD_MASTER_MAX_SIDE", 2048)
+    UPLOAD_THUMBNAIL_SIZE = _get_env_int("UPLOAD_THUMBNAIL_SIZE", 240)
+    # Через сколько дней удалять оригинал, если есть мастер (`flask upload-derivatives`); 0 – хранить
+    UPLOAD_ORIGINAL_RETENTION_DAYS = _get_env_int("UPLOAD_ORIGINAL_RETENTION_DAYS", 0)
+    # Очистка загрузок (`flask cleanup-uploads`): срок хранения, размер пачки, бюджет времени
+    # и возраст, после которого файл без записи считается осиротевшим
+    UPLOAD_RETENTION_DAYS = _get_env_int("UPLOAD_RETENTION_DAYS", 7)
+    CLEANUP_BATCH_SIZE = _get_env_int("CLEANUP_BATCH_SIZE", 500)
+    CLEANUP_TIME_BUDGET_SECONDS = _get_env_int("CLEANUP_TIME_BUDGET_SECONDS", 300)
+    CLEANUP_ORPHAN_GRACE_SECONDS = _get_env_int("CLEANUP_ORPHAN_GRACE_SECONDS", 3600)
+    # Отдача загрузок и APK через nginx (X-Accel-Redirect); внутренние location – в deploy/nginx/paleta.conf
+    X_ACCEL_REDIRECT_ENABLED = _get_env_bool("X_ACCEL_REDIRECT_ENABLED", default=False)
+    X_ACCEL_UPLOADS_LOCATION = os.environ.get("X_ACCEL_UPLOADS_LOCATION", "/_protected/uploads/")
+    X_ACCEL_STATIC_LOCATION = os.environ.get("X_ACCEL_STATIC_LOCATION", "/_protected/static/")
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
     ALLOWED_IMAGE_FORMATS = {"png", "jpeg", "webp"}
     MAX_IMAGE_PIXELS = _get_env_int("MAX_IMAGE_PIXELS", 20_000_000)
     MIN_COLOR_COUNT = _get_env_int("MIN_COLOR_COUNT", 3)
     MAX_COLOR_COUNT = _get_env_int("MAX_COLOR_COUNT", 15)
+    PALETTE_ENGINE = os.environ.get("PALETTE_ENGINE", "kmeans").strip().lower() or "kmeans"
+    # Сжатие выборки до уникальных цветов перед кластеризацией: бит на канал (1–8), 0 – выключено
+    PALETTE_COMPACTION_BITS = _get_env_int("PALETTE_COMPACTION_BITS", 0)
+    # Пустое значение – каталог `palette_cache` внутри instance-папки приложения
+    PALETTE_CACHE_DIR = os.environ.get("PALETTE_CACHE_DIR", "").strip()
+    PALETTE_CACHE_MEMORY_ITEMS = _get_env_int("PALETTE_CACHE_MEMORY_ITEMS", 1024)
+    PALETTE_CACHE_DISK_MAX_MB = _get_env_int("PALETTE_CACHE_DISK_MAX_MB", 64)
+    # Пустое значение – каталог `histograms` внутри instance-папки приложения
+    HISTOGRAM_FOLDER = os.environ.get("HISTOGRAM_FOLDER", "").strip()
+    # Пул процессов для извлечения палитр и рендера PNG; 0 – считать в потоке запроса
+    COMPUTE_POOL_SIZE = _get_env_int("COMPUTE_POOL_SIZE", 0)
+    COMPUTE_QUEUE_MAX = _get_env_int("COMPUTE_QUEUE_MAX", 16)
+    COMPUTE_TASK_THREADS = _get_env_int("COMPUTE_TASK_THREADS", 1)
+    COMPUTE_TASK_TIMEOUT_SECONDS = _get_env_int("COMPUTE_TASK_TIMEOUT_SECONDS", 45)
+    COMPUTE_RETRY_AFTER_SECONDS = _get_env_int("COMPUTE_RETRY_AFTER_SECONDS", 5)
+    # Фоновые задачи извлечения (`async=1` в загрузке); требуют запущенного `flask worker`
+    EXTRACTION_JOBS_ENABLED = _get_env_bool("EXTRACTION_JOBS_ENABLED", default=False)
+    JOB_STALE_SECONDS = _get_env_int("JOB_STALE_SECONDS", 300)
+    JOB_MAX_ATTEMPTS = _get_env_int("JOB_MAX_ATTEMPTS", 3)
+    # Пауза перед повтором задачи после временного сбоя (хранилище, пул вычислений, БД)
+    JOB_RETRY_DELAY_SECONDS = _get_env_int("JOB_RETRY_DELAY_SECONDS", 30)
+    # Завершённые задачи извлечения удаляет планировщик обслуживания
+    JOB_RETENTION_HOURS = _get_env_int("JOB_RETENTION_HOURS", 24)
+
+    # Планировщик обслуживания (`utils/maintenance.py`): в потоке приложения или `flask maintenance`
+    MAINTENANCE_SCHEDULER_ENABLED = _get_env_bool("MAINTENANCE_SCHEDULER_ENABLED", default=False)
+    MAINTENANCE_JITTER_SECONDS = _get_env_int("MAINTENANCE_JITTER_SECONDS", 300)
+
+    # Лимиты частоты запросов (`utils/rate_limit.py`): предел числа ключей в памяти процесса
+    # (при переполнении вытесняются давно не использованные) и число шардов с отдельными блокировками
+    RATE_LIMIT_MAX_KEYS = _get_env_int("RATE_LIMIT_MAX_KEYS", 100000)
+    RATE_LIMIT_SHARDS = _get_env_int("RATE_LIMIT_SHARDS", 16)
+    # Где хранить счётчики лимитов: `memory` (в каждом процессе свои), `database` (таблица
+    # `rate_limit_counter`, общая для всех воркеров и узлов) или `redis` (нужен пакет redis)
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL", "").strip()
+
+    # Токены мобильного API: срок жизни access- и refresh-токена, LRU-кэш проверенных access-токенов
+    # в памяти процесса (записей, секунд – за это время отзыв доходит до остальных воркеров)
+    MOBILE_ACCESS_TOKEN_TTL_MINUTES = _get_env_int("MOBILE_ACCESS_TOKEN_TTL_MINUTES", 60)
+    MOBILE_REFRESH_TOKEN_TTL_DAYS = _get_env_int("MOBILE_REFRESH_TOKEN_TTL_DAYS", 30)
+    MOBILE_TOKEN_CACHE_ITEMS = _get_env_int("MOBILE_TOKEN_CACHE_ITEMS", 10000)
+    MOBILE_TOKEN_CACHE_SECONDS = _get_env_int("MOBILE_TOKEN_CACHE_SECONDS", 60)
 
     PASSWORD_RESET_CODE_TTL_MINUTES = _get_env_int("PASSWORD_RESET_CODE_TTL_MINUTES", 15)
     PASSWORD_RESET_MAX_ATTEMPTS = _get_env_int("PASSWORD_RESET_MAX_ATTEMPTS", 5)
+    # Сколько часов хранить истёкшие и использованные коды восстановления
+    PASSWORD_RESET_TOKEN_RETENTION_HOURS = _get_env_int("PASSWORD_RESET_TOKEN_RETENTION_HOURS", 24)
 
     SMTP_HOST = os.environ.get("SMTP_HOST", "").strip()
     SMTP_PORT = _get_env_int("SMTP_PORT", 587)
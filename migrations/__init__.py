@@ -0,0 +1,7 @@
+"""
+Пакет: `migrations`.
+Назначение: Версионные миграции схемы БД (`vNNNN_<имя>.py` с функцией `upgrade(connection)`).
+
+Миграции применяет `utils/migrations.py` – при старте приложения или командой `flask db-upgrade`.
+Новая миграция получает следующий номер; применённые миграции не изменяются.
+"""
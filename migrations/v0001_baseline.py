@@ -0,0 +1,127 @@
+"""
+Миграция: `v0001_baseline`.
+Назначение: Исходная схема – таблицы в том виде, в каком они были до появления миграций.
+
+Таблицы описаны здесь же, а не берутся из моделей: базовая версия не меняется вместе с моделями,
+и всё, что добавлено позже (индексы, `palette.color_count`, `mobile_token`, `rate_limit_counter`),
+создают только следующие миграции. В новой БД создаёт таблицы с нуля. В БД, созданной
+до появления миграций (`db.create_all()`), досоздаёт недостающие таблицы и nullable-колонки.
+"""
+
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+)
+
+from utils.schema import add_missing_columns
+
+metadata = MetaData()
+
+Table(
+    "user",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(80), unique=True, nullable=False),
+    Column("password_hash", String(200), nullable=False),
+)
+
+Table(
+    "user_contact",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False, unique=True),
+    Column("email", String(120), unique=True, nullable=True, index=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+Table(
+    "password_reset_token",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False, index=True),
+    Column("channel", String(10), nullable=False, index=True),
+    Column("destination", String(120), nullable=False, index=True),
+    Column("code_hash", String(255), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("expires_at", DateTime, nullable=False, index=True),
+    Column("used_at", DateTime, nullable=True),
+    Column("created_at", DateTime, nullable=False, index=True),
+)
+
+Table(
+    "palette",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("colors", JSON, nullable=False),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=False),
+    Column("created_at", DateTime),
+)
+
+Table(
+    "upload",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("filename", String(255)),
+    Column("created_at", DateTime),
+    Column("user_id", Integer, ForeignKey("user.id"), nullable=True),
+    Column("content_hash", String(64), nullable=True, index=True),
+    Column("palettes", JSON, nullable=True),
+    Column("placeholder", String(64), nullable=True),
+)
+
+Table(
+    "upload_blob",
+    metadata,
+    Column("digest", String(64), primary_key=True),
+    Column("extension", String(8), nullable=False),
+    Column("size_bytes", BigInteger, nullable=False),
+    Column("width", Integer, nullable=False),
+    Column("height", Integer, nullable=False),
+    Column("ref_count", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+)
+
+Table(
+    "extraction_job",
+    metadata,
+    Column("id", String(32), primary_key=True),
+    Column("upload_id", Integer, ForeignKey("upload.id"), nullable=False, index=True),
+    Column("color_count", Integer, nullable=False),
+    Column("engine", String(32), nullable=False),
+    Column("all_counts", Boolean, nullable=False),
+    Column("status", String(16), nullable=False),
+    Column("attempts", Integer, nullable=False),
+    Column("result", JSON, nullable=True),
+    Column("error", String(255), nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Index("ix_extraction_job_status_created_at", "status", "created_at"),
+)
+
+Table(
+    "maintenance_run",
+    metadata,
+    Column("name", String(64), primary_key=True),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Column("status", String(16), nullable=True),
+    Column("stats", JSON, nullable=True),
+)
+
+
+def upgrade(connection) -> None:
+    """Создаёт отсутствующие таблицы и колонки базовой схемы."""
+    metadata.create_all(bind=connection)
+    add_missing_columns(connection, metadata)
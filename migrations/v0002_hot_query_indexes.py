@@ -0,0 +1,60 @@
+"""
+Миграция: `v0002_hot_query_indexes`.
+Назначение: Составные индексы под частые запросы и уникальность названия палитры в пределах пользователя.
+
+- `palette (user_id, created_at, id)` – список палитр пользователя по дате;
+- `palette (user_id, name)` UNIQUE – поиск палитры по названию и защита от дублей;
+- `upload (user_id, created_at)`, `upload (created_at)`, `upload (filename)` – последние загрузки,
+  очистка по возрасту и поиск записи по имени файла.
+
+Перед созданием уникального индекса повторяющиеся названия получают суффикс ` (<id>)`.
+"""
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import aliased
+
+from models.palette import Palette
+from models.upload import Upload
+from utils.migrations import create_index
+
+_NAME_MAX_LENGTH = Palette.__table__.c.name.type.length
+_INDEXES = {
+    "ix_palette_user_created",
+    "uq_palette_user_name",
+    "ix_upload_user_created",
+    "ix_upload_created",
+    "ix_upload_filename",
+}
+
+
+def _rename_duplicate_palettes(connection) -> None:
+    """Служебная функция `_rename_duplicate_palettes` для внутренней логики модуля."""
+    palette = Palette.__table__
+    earlier = aliased(palette)
+    duplicates = connection.execute(
+        select(palette.c.id, palette.c.name).where(
+            select(earlier.c.id)
+            .where(
+                earlier.c.user_id == palette.c.user_id,
+                earlier.c.name == palette.c.name,
+                earlier.c.id < palette.c.id,
+            )
+            .exists()
+        )
+    ).all()
+    for palette_id, name in duplicates:
+        suffix = f" ({palette_id})"
+        connection.execute(
+            update(palette)
+            .where(palette.c.id == palette_id)
+            .values(name=name[: _NAME_MAX_LENGTH - len(suffix)] + suffix)
+        )
+
+
+def upgrade(connection) -> None:
+    """Создаёт индексы палитр и загрузок."""
+    _rename_duplicate_palettes(connection)
+    for table in (Palette.__table__, Upload.__table__):
+        for index in table.indexes:
+            if index.name in _INDEXES:
+                create_index(connection, index)
@@ -0,0 +1,26 @@
+"""
+Миграция: `v0003_palette_color_count`.
+Назначение: Колонка `palette.color_count` и индекс `(user_id, color_count, id)` для фильтра и сортировки по количеству цветов.
+
+Количество цветов существующих палитр заполняется одним UPDATE через `json_array_length`
+(есть и в Postgres, и в SQLite).
+"""
+
+from sqlalchemy import func, update
+
+from models.palette import Palette
+from utils.migrations import add_column, create_index
+
+
+def upgrade(connection) -> None:
+    """Добавляет и заполняет `palette.color_count`, создаёт индекс."""
+    palette = Palette.__table__
+    add_column(connection, palette.c.color_count)
+    connection.execute(
+        update(palette)
+        .where(palette.c.color_count.is_(None))
+        .values(color_count=func.json_array_length(palette.c.colors))
+    )
+    for index in palette.indexes:
+        if index.name == "ix_palette_user_colors":
+            create_index(connection, index)
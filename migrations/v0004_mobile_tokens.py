@@ -0,0 +1,15 @@
+"""
+Миграция: `v0004_mobile_tokens`.
+Назначение: Таблица `mobile_token` – токены мобильного API в БД вместо словарей в памяти процесса.
+
+Выданные до миграции токены жили только в памяти и при перезапуске терялись,
+поэтому переносить нечего: клиенты один раз войдут заново.
+"""
+
+from models.mobile_token import MobileToken
+from utils.migrations import create_table
+
+
+def upgrade(connection) -> None:
+    """Создаёт таблицу `mobile_token` с индексами."""
+    create_table(connection, MobileToken.__table__)
@@ -0,0 +1,19 @@
+"""
+Миграция: `v0005_rate_limit_counters`.
+Назначение: Таблица `rate_limit_counter` – общие счётчики лимитов частоты запросов (`RATE_LIMIT_BACKEND=database`).
+
+В Postgres таблица нежурналируемая (UNLOGGED): счётчики живут минуты, и запись их в WAL
+только нагружала бы диск; после аварийного перезапуска они обнуляются, что для лимитов допустимо.
+"""
+
+from models.rate_limit_counter import RateLimitCounter
+from utils.migrations import create_table
+
+
+def upgrade(connection) -> None:
+    """Создаёт таблицу `rate_limit_counter`."""
+    table = RateLimitCounter.__table__
+    create_table(connection, table)
+    if connection.dialect.name == "postgresql":
+        preparer = connection.dialect.identifier_preparer
+        connection.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} SET UNLOGGED")
@@ -8,5 +8,21 @@ from .user_contact import UserContact
 from .password_reset_token import PasswordResetToken
 from .palette import Palette
 from .upload import Upload
+from .upload_blob import UploadBlob
+from .extraction_job import ExtractionJob
+from .maintenance_run import MaintenanceRun
+from .mobile_token import MobileToken
+from .rate_limit_counter import RateLimitCounter
 
-__all__ = ["User", "UserContact", "PasswordResetToken", "Palette", "Upload"]
+__all__ = [
+    "User",
+    "UserContact",
+    "PasswordResetToken",
+    "Palette",
+    "Upload",
+    "UploadBlob",
+    "ExtractionJob",
+    "MaintenanceRun",
+    "MobileToken",
+    "RateLimitCounter",
+]
@@ -0,0 +1,49 @@
+"""
+Программа: «Paleta» – веб-приложение для работы с цветовыми палитрами.
+Модуль: models/extraction_job.py – задача фонового извлечения палитры.
+
+Назначение модуля:
+- Описание ORM-модели ExtractionJob – очереди задач извлечения палитры в БД.
+- Хранение параметров извлечения, статуса, числа попыток и результата задачи.
+"""
+
+import uuid
+from datetime import datetime
+
+from extensions import db
+
+
+class ExtractionJob(db.Model):
+    """Класс `ExtractionJob` описывает сущность текущего модуля."""
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+
+    # Публичный идентификатор задачи – случайный, чтобы его нельзя было подобрать
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    upload_id = db.Column(db.Integer, db.ForeignKey("upload.id"), nullable=False, index=True)
+    color_count = db.Column(db.Integer, nullable=False)
+    engine = db.Column(db.String(32), nullable=False)
+    all_counts = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(16), nullable=False, default=STATUS_QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # {"palette": [...], "palettes": {...}} после успешного выполнения
+    result = db.Column(db.JSON, nullable=True)
+    # msgid сообщения об ошибке (переводится при выдаче клиенту)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    upload = db.relationship("Upload")
+
+    __table_args__ = (
+        # Выбор следующей задачи воркером: WHERE status = ... ORDER BY created_at
+        db.Index("ix_extraction_job_status_created_at", "status", "created_at"),
+    )
+
+    @property
+    def is_finished(self) -> bool:
+        """Задача завершена (успешно или с ошибкой)."""
+        return self.status in {self.STATUS_DONE, self.STATUS_FAILED}
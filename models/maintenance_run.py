@@ -0,0 +1,23 @@
+"""
+Программа: «Paleta» – веб-приложение для работы с цветовыми палитрами.
+Модуль: models/maintenance_run.py – последний запуск служебной задачи.
+
+Назначение модуля:
+- Описание ORM-модели MaintenanceRun – времени и итога последнего запуска каждой служебной задачи.
+- По этой записи все экземпляры приложения видят, что задача уже выполнена, и не повторяют её до срока.
+"""
+
+from extensions import db
+
+
+class MaintenanceRun(db.Model):
+    """Класс `MaintenanceRun` описывает сущность текущего модуля."""
+    __tablename__ = "maintenance_run"
+
+    # Имя задачи планировщика (`utils/maintenance.py`)
+    name = db.Column(db.String(64), primary_key=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # ok / error / partial (бюджет времени исчерпан)
+    status = db.Column(db.String(16), nullable=True)
+    stats = db.Column(db.JSON, nullable=True)
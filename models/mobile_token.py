@@ -0,0 +1,30 @@
+"""
+Программа: «Paleta» – веб-приложение для работы с цветовыми палитрами.
+Модуль: models/mobile_token.py – токены доступа мобильного приложения.
+
+Назначение модуля:
+- Описание ORM-модели MobileToken – access- и refresh-токенов мобильного API со сроком действия.
+- В БД хранится только sha256 токена: утечка таблицы не даёт войти под чужой сессией.
+- Токены общие для всех процессов приложения и переживают перезапуск.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+class MobileToken(db.Model):
+    """Класс `MobileToken` описывает сущность текущего модуля."""
+    __tablename__ = "mobile_token"
+
+    KIND_ACCESS = "access"
+    KIND_REFRESH = "refresh"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    # access / refresh
+    kind = db.Column(db.String(10), nullable=False)
+    # sha256 токена (hex); сам токен знает только клиент
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
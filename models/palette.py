@@ -5,6 +5,7 @@
 Назначение модуля:
 - Описание ORM-модели Palette для хранения пользовательских палитр.
 - Хранение названия палитры, списка цветов и привязки к пользователю.
+- Хранение количества цветов для фильтрации и сортировки списка палитр в БД.
 - Дополнительный метод для экспорта палитры в формат GPL (GIMP Palette).
 """
 
@@ -13,9 +14,20 @@ from extensions import db
 
 class Palette(db.Model):
     """Класс `Palette` описывает сущность текущего модуля."""
+    __table_args__ = (
+        # Список палитр пользователя по дате (и keyset-пагинация по `(created_at, id)`)
+        db.Index("ix_palette_user_created", "user_id", "created_at", "id"),
+        # Название палитры уникально в пределах пользователя
+        db.Index("uq_palette_user_name", "user_id", "name", unique=True),
+        # Фильтр и сортировка по количеству цветов
+        db.Index("ix_palette_user_colors", "user_id", "color_count", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, default='Без названия')
     colors = db.Column(db.JSON, nullable=False)
+    # Количество цветов (дублирует длину `colors` для фильтра и сортировки в БД)
+    color_count = db.Column(db.Integer, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -0,0 +1,24 @@
+"""
+Программа: «Paleta» – веб-приложение для работы с цветовыми палитрами.
+Модуль: models/rate_limit_counter.py – общие счётчики ограничения частоты запросов.
+
+Назначение модуля:
+- Описание ORM-модели RateLimitCounter – числа запросов по ключу лимита в одном фиксированном окне.
+- Счётчики в БД общие для всех воркеров и узлов (`RATE_LIMIT_BACKEND=database`).
+- Первичный ключ – ключ лимита и окно: upsert на каждый запрос не расходует последовательность id.
+"""
+
+from extensions import db
+
+
+class RateLimitCounter(db.Model):
+    """Класс `RateLimitCounter` описывает сущность текущего модуля."""
+    __tablename__ = "rate_limit_counter"
+
+    # Ключ лимита вместе с длиной окна: `<bucket>:<клиент>:<секунды>`
+    bucket_key = db.Column(db.String(255), primary_key=True)
+    # Начало окна, секунды Unix-времени
+    window_start = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    # Счётчик нужен, пока окно – текущее или предыдущее; потом его удаляет планировщик
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
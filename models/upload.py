@@ -5,6 +5,10 @@
 Назначение модуля:
 - Описание ORM-модели Upload для учёта загруженных пользователями изображений.
 - Хранение имени файла, даты загрузки и (при наличии) ссылки на пользователя.
+- Хранение sha256 содержимого для поиска сохранённой гистограммы цветов и кэша палитр.
+- Хранение палитр для всех допустимых количеств цветов, чтобы переключение количества не требовало пересчёта.
+- Хранение BlurHash-превью, которое показывается, пока загружается миниатюра.
+- Ссылка на файл UploadBlob (по sha256): одинаковые загрузки делят один файл на диске.
 """
 
 from datetime import datetime
@@ -13,9 +17,32 @@ from extensions import db
 
 class Upload(db.Model):
     """Класс `Upload` описывает сущность текущего модуля."""
+    __table_args__ = (
+        # Последние загрузки пользователя
+        db.Index("ix_upload_user_created", "user_id", "created_at"),
+        # Отбор устаревших загрузок при очистке
+        db.Index("ix_upload_created", "created_at"),
+        # Поиск записи по имени файла при отдаче и повторном анализе
+        db.Index("ix_upload_filename", "filename"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    # Путь файла относительно UPLOAD_FOLDER: `ab/cd/<sha256>.<ext>` (старые загрузки – плоское имя,
+    # см. `flask migrate-uploads`)
     filename = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     # Привязка к пользователю (может быть пустой для анонимных загрузок)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
+    # sha256 содержимого файла (пусто у загрузок, сделанных до появления гистограмм)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    # Палитры для каждого количества цветов: {"3": [...], ..., "15": [...]}
+    palettes = db.Column(db.JSON, nullable=True)
+    # BlurHash-превью (~30 символов), считается при загрузке; пусто у старых загрузок
+    placeholder = db.Column(db.String(64), nullable=True)
 
+    # Файл загрузки; связь по sha256 без внешнего ключа – у старых записей файла-blob может не быть
+    blob = db.relationship(
+        "UploadBlob",
+        primaryjoin="foreign(Upload.content_hash) == UploadBlob.digest",
+        viewonly=True,
+    )
@@ -0,0 +1,33 @@
+"""
+Программа: «Paleta» – веб-приложение для работы с цветовыми палитрами.
+Модуль: models/upload_blob.py – файл изображения, хранимый по хешу содержимого.
+
+Назначение модуля:
+- Описание ORM-модели UploadBlob: одно и то же содержимое хранится на диске один раз.
+- Хранение sha256, расширения, размера в байтах и размеров изображения в пикселях.
+- Подсчёт ссылок из записей Upload: файл удаляется, когда ссылок не остаётся.
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+class UploadBlob(db.Model):
+    """Класс `UploadBlob` описывает сущность текущего модуля."""
+    __tablename__ = "upload_blob"
+
+    # sha256 содержимого – он же имя файла в дереве `ab/cd/<sha256>.<ext>`
+    digest = db.Column(db.String(64), primary_key=True)
+    extension = db.Column(db.String(8), nullable=False)
+    size_bytes = db.Column(db.BigInteger, nullable=False)
+    width = db.Column(db.Integer, nullable=False)
+    height = db.Column(db.Integer, nullable=False)
+    # Число записей Upload, ссылающихся на файл
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def relative_path(self) -> str:
+        """Путь файла относительно UPLOAD_FOLDER."""
+        return f"{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.{self.extension}"
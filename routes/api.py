@@ -6,36 +6,59 @@
 import os
 import re
 import tempfile
-import uuid
-from datetime import datetime
 from urllib.parse import urlparse
 
-from PIL import Image, UnidentifiedImageError
+from PIL import Image
 from flask import current_app, jsonify, request, send_file, send_from_directory, session
 from flask_login import current_user, login_required
 
 from config import Config
 from extensions import db
-from flask_babel import force_locale, gettext as _
+from flask_babel import gettext as _
+from models.extraction_job import ExtractionJob
 from models.palette import Palette
 from models.upload import Upload
+from utils.compute_pool import ComputePoolBusy, run_compute
 from utils.export_handler import export_palette_data
-from utils.image_processor import extract_colors_from_image
+from utils.extraction_jobs import enqueue_extraction, job_state
+from utils.file_serving import content_etag, send_storage_file
+from utils.palette_extraction import (
+    extract_upload_palette,
+    reanalyze_palette,
+    upload_content_hash,
+    upload_palette_ladder,
+    warm_start_palette,
+)
+from utils.palette_listing import DEFAULT_SORT, PALETTE_PAGE_SIZE, InvalidCursor, count_palettes, list_palettes
+from utils.palette_names import (
+    PaletteNameTaken,
+    default_name_aliases,
+    default_palette_name,
+    save_new_palette,
+    set_palette_name,
+)
 from utils.rate_limit import get_client_identifier
+from utils.request_params import parse_locked_indices, resolve_engine
+from utils.storage import get_upload_storage
+from utils.upload_derivatives import schedule_upload_derivatives, served_upload_name, thumbnail_name, upload_source_key
+from utils.upload_pipeline import prepare_upload
+from utils.upload_storage import blob_relative_path, find_upload_reference, store_upload_blob
+from utils.upload_stream import UploadValidationError
 
 Image.MAX_IMAGE_PIXELS = Config.MAX_IMAGE_PIXELS
 
-
-def _allowed_file(filename: str) -> bool:
-    """Служебная функция `_allowed_file` для внутренней логики модуля."""
-    return Config.allowed_file(filename)
-
-
 def _api_error(message: str, status: int = 400):
     """Служебная функция `_api_error` для внутренней логики модуля."""
     return jsonify({"success": False, "error": message}), status
 
 
+def _busy_error(exc: ComputePoolBusy):
+    """Служебная функция `_busy_error` для внутренней логики модуля."""
+    response, status = _api_error(_("Сервер перегружен. Повторите попытку позже."), 503)
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response, status
+
+
 def _rate_limited(bucket: str, limit: int, window_seconds: int, identity: str | None = None) -> bool:
     """Служебная функция `_rate_limited` для внутренней логики модуля."""
     limiter = current_app.extensions.get("rate_limiter")
@@ -54,34 +77,40 @@ def _clamp_color_count(raw_value: int | None) -> int:
     return max(Config.MIN_COLOR_COUNT, min(Config.MAX_COLOR_COUNT, raw_value))
 
 
-def _validate_uploaded_image(file_storage):
-    """Служебная функция `_validate_uploaded_image` для внутренней логики модуля."""
-    file_storage.stream.seek(0)
-    try:
-        with Image.open(file_storage.stream) as image:
-            image.verify()
-    except (UnidentifiedImageError, OSError):
-        return None, _api_error(_("Файл не является корректным изображением"), 400)
-    finally:
-        file_storage.stream.seek(0)
+def _is_flag_set(raw_value) -> bool:
+    """Служебная функция `_is_flag_set` для внутренней логики модуля."""
+    return str(raw_value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _find_job(job_id: str) -> ExtractionJob | None:
+    """Служебная функция `_find_job` для внутренней логики модуля."""
+    job = db.session.get(ExtractionJob, str(job_id))
+    if job is None or job.upload is None:
+        return None
+    owner_id = job.upload.user_id
+    if owner_id is not None and (not current_user.is_authenticated or current_user.id != owner_id):
+        return None
+    return job
 
-    try:
-        with Image.open(file_storage.stream) as image:
-            image_format = (image.format or "").lower()
-            width, height = image.size
-    except (UnidentifiedImageError, OSError):
-        return None, _api_error(_("Файл не является корректным изображением"), 400)
-    finally:
-        file_storage.stream.seek(0)
 
-    if image_format not in Config.ALLOWED_IMAGE_FORMATS:
-        return None, _api_error(_("Недопустимый формат изображения"), 400)
+def _job_payload(job: ExtractionJob) -> dict:
+    """Служебная функция `_job_payload` для внутренней логики модуля."""
+    payload = job_state(job)
+    payload["success"] = job.status != ExtractionJob.STATUS_FAILED
+    if job.status == ExtractionJob.STATUS_FAILED:
+        payload["error"] = _(job.error or "Не удалось извлечь цвета из изображения")
+    return payload
 
-    if width * height > Config.MAX_IMAGE_PIXELS:
-        return None, _api_error(_("Изображение слишком большое по разрешению"), 400)
 
-    format_to_extension = {"jpeg": "jpg", "png": "png", "webp": "webp"}
-    return format_to_extension[image_format], None
+def _palette_payload(palette: Palette) -> dict:
+    """Служебная функция `_palette_payload` для внутренней логики модуля."""
+    return {
+        "id": palette.id,
+        "name": palette.name,
+        "colors": palette.colors,
+        "color_count": palette.color_count if palette.color_count is not None else len(palette.colors or []),
+        "created_at": palette.created_at.isoformat() if palette.created_at else None,
+    }
 
 
 def _normalize_palette_colors(colors):
@@ -105,51 +134,6 @@ def _normalize_palette_colors(colors):
     return normalized
 
 
-def _translated_variants(message_id: str) -> set[str]:
-    """Служебная функция `_translated_variants` для внутренней логики модуля."""
-    variants: set[str] = set()
-    translated = _(message_id)
-    if isinstance(translated, str):
-        value = translated.strip()
-        if value:
-            variants.add(value)
-
-    for lang in ("ru", "en"):
-        if lang not in Config.SUPPORTED_LANGUAGES:
-            continue
-        with force_locale(lang):
-            localized = _(message_id)
-        if isinstance(localized, str):
-            value = localized.strip()
-            if value:
-                variants.add(value)
-
-    return variants
-
-
-def _default_palette_base_variants() -> set[str]:
-    """Служебная функция `_default_palette_base_variants` для внутренней логики модуля."""
-    variants = _translated_variants("Моя палитра")
-    variants.update({"Моя палитра", "My Palette"})
-    return variants
-
-
-def _default_palette_aliases() -> set[str]:
-    """Служебная функция `_default_palette_aliases` для внутренней логики модуля."""
-    aliases = set(_default_palette_base_variants())
-    aliases.update(_translated_variants("Без названия"))
-    aliases.update({"Untitled Palette", "Random Palette"})
-    return aliases
-
-
-def _default_palette_name_for_lang(lang_hint: str | None) -> str:
-    """Служебная функция `_default_palette_name_for_lang` для внутренней логики модуля."""
-    if lang_hint and lang_hint in Config.SUPPORTED_LANGUAGES:
-        with force_locale(lang_hint):
-            return _("Моя палитра").strip()
-    return _("Моя палитра").strip()
-
-
 def _lang_hint_from_referrer(referrer: str | None) -> str | None:
     """Служебная функция `_lang_hint_from_referrer` для внутренней логики модуля."""
     if not referrer:
@@ -178,39 +162,85 @@ def register_routes(app):
             if _rate_limited("upload", limit=40, window_seconds=10 * 60):
                 return _api_error(_("Слишком много загрузок. Попробуйте позже."), 429)
 
-            if "image" not in request.files:
-                return _api_error(_("Файл не был загружен"), 400)
-
-            file = request.files["image"]
-
-            if file.filename == "":
-                return _api_error(_("Файл не выбран"), 400)
-
-            if not _allowed_file(file.filename):
-                return _api_error(_("Недопустимый тип файла"), 400)
-
-            extension, validation_error = _validate_uploaded_image(file)
-            if validation_error is not None:
-                return validation_error
-
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            unique_filename = f"{timestamp}_{uuid.uuid4().hex[:12]}.{extension}"
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], unique_filename)
+            # Тело читается потоком: не-изображение или слишком большой кадр отклоняются по заголовку
+            try:
+                prepared = prepare_upload(request, app.config["UPLOAD_FOLDER"])
+            except UploadValidationError as exc:
+                return _api_error(_(exc.message), exc.status)
+
+            form = prepared.form
+            engine = resolve_engine(form.get("engine"))
+            if engine is None:
+                prepared.discard()
+                return _api_error(_("Неизвестный алгоритм извлечения цветов"), 400)
+
+            run_async = app.config["EXTRACTION_JOBS_ENABLED"] and _is_flag_set(form.get("async"))
+            if not run_async:
+                # Декодирование – в пуле вычислений; фоновую задачу декодирует воркер
+                try:
+                    prepared.decode()
+                except UploadValidationError as exc:
+                    prepared.discard()
+                    return _api_error(_(exc.message), exc.status)
+                except ComputePoolBusy as exc:
+                    prepared.discard()
+                    return _busy_error(exc)
+
+            digest = prepared.digest
+            # Одинаковое содержимое хранится один раз: `ab/cd/<sha256>.<ext>` со счётчиком ссылок
+            unique_filename = blob_relative_path(digest, prepared.extension)
+
+            color_count = _clamp_color_count(form.get("color_count", 5, type=int))
 
-            file.save(filepath)
+            upload_record = Upload(
+                filename=unique_filename,
+                user_id=current_user.id if current_user.is_authenticated else None,
+                content_hash=digest,
+                placeholder=prepared.placeholder,
+            )
 
-            color_count = _clamp_color_count(request.form.get("color_count", 5, type=int))
+            if run_async:
+                # Извлечение уходит в очередь `flask worker`; клиент ждёт результат по job_id
+                store_upload_blob(prepared)
+                db.session.add(upload_record)
+                job = enqueue_extraction(
+                    upload_record,
+                    color_count,
+                    engine,
+                    _is_flag_set(form.get("all_counts")),
+                )
+                db.session.commit()
+                response = jsonify(
+                    {
+                        "success": True,
+                        "job_id": job.id,
+                        "status": job.status,
+                        "filename": unique_filename,
+                        "thumbnail": thumbnail_name(unique_filename),
+                        "placeholder": upload_record.placeholder,
+                        "upload_id": upload_record.id,
+                        "status_url": f"/api/jobs/{job.id}",
+                    }
+                )
+                response.status_code = 202
+                return schedule_upload_derivatives(response, unique_filename)
 
+            # Палитра считается по принятому файлу; в хранилище он попадает только при успехе
+            palettes = None
             try:
-                palette = extract_colors_from_image(filepath, color_count)
+                palette = extract_upload_palette(prepared.path, digest, color_count, engine, prepared.pixels)
+                if _is_flag_set(form.get("all_counts")):
+                    palettes = {**upload_palette_ladder(upload_record, prepared.path, digest), str(color_count): palette}
+            except ComputePoolBusy as exc:
+                # Загрузка отклонена целиком: клиент повторит её позже
+                prepared.discard()
+                return _busy_error(exc)
             except Exception:
                 current_app.logger.exception("Ошибка извлечения цветов из изображения")
+                prepared.discard()
                 return _api_error(_("Не удалось извлечь цвета из изображения"), 500)
 
-            upload_record = Upload(
-                filename=unique_filename,
-                user_id=current_user.id if current_user.is_authenticated else None,
-            )
+            store_upload_blob(prepared)
             db.session.add(upload_record)
             db.session.commit()
 
@@ -219,18 +249,153 @@ def register_routes(app):
                 "palette": palette,
             }
 
-            return jsonify(
-                {
-                    "success": True,
-                    "filename": unique_filename,
-                    "palette": palette,
-                }
-            )
+            response = {
+                "success": True,
+                "filename": unique_filename,
+                "thumbnail": thumbnail_name(unique_filename),
+                "placeholder": upload_record.placeholder,
+                "upload_id": upload_record.id,
+                "palette": palette,
+            }
+            if palettes is not None:
+                response["palettes"] = palettes
+            # Мастер и миниатюры строятся после отправки ответа
+            return schedule_upload_derivatives(jsonify(response), unique_filename)
 
         except Exception:
             current_app.logger.exception("Критическая ошибка обработки загрузки")
             return _api_error(_("Внутренняя ошибка сервера"), 500)
 
+    @app.route("/api/upload/reanalyze", methods=["POST"])
+    def reanalyze_upload():
+        """Пересчёт палитры уже загруженного изображения по имени файла или id загрузки."""
+        try:
+            if _rate_limited("reanalyze", limit=120, window_seconds=10 * 60):
+                return _api_error(_("Слишком много запросов. Попробуйте позже."), 429)
+
+            data = request.get_json(silent=True) or {}
+            upload_record = find_upload_reference(
+                data.get("filename"),
+                data.get("upload_id"),
+                current_user.id if current_user.is_authenticated else None,
+            )
+            if upload_record is None:
+                return _api_error(_("Загрузка не найдена"), 404)
+
+            engine = resolve_engine(data.get("engine"))
+            if engine is None:
+                return _api_error(_("Неизвестный алгоритм извлечения цветов"), 400)
+
+            try:
+                color_count = _clamp_color_count(int(data.get("color_count", 5)))
+            except (TypeError, ValueError):
+                return _api_error(_("Некорректное количество цветов"), 400)
+
+            # Тёплый старт: текущая палитра клиента и индексы закреплённых (перетащенных) цветов
+            current_palette = None
+            locked: list[int] = []
+            if data.get("palette") is not None:
+                current_palette = _normalize_palette_colors(data.get("palette"))
+                if not current_palette:
+                    return _api_error(_("Не переданы корректные цвета палитры"), 400)
+                locked_indices = parse_locked_indices(data.get("locked"), len(current_palette), color_count)
+                if locked_indices is None:
+                    return _api_error(_("Некорректный список закреплённых цветов"), 400)
+
+            try:
+                with get_upload_storage().fetch(upload_source_key(upload_record)) as filepath:
+                    digest = upload_content_hash(upload_record, filepath)
+                    if current_palette is not None:
+                        palette, locked = warm_start_palette(
+                            filepath, digest, color_count, current_palette, locked_indices
+                        )
+                    else:
+                        palette = reanalyze_palette(filepath, digest, color_count, engine)
+                    palettes = None
+                    if _is_flag_set(data.get("all_counts")):
+                        palettes = {**upload_palette_ladder(upload_record, filepath, digest), str(color_count): palette}
+            except FileNotFoundError:
+                return _api_error(_("Изображение больше недоступно"), 404)
+            except ComputePoolBusy as exc:
+                return _busy_error(exc)
+            except Exception:
+                current_app.logger.exception("Ошибка пересчёта палитры по гистограмме")
+                return _api_error(_("Не удалось извлечь цвета из изображения"), 500)
+
+            if db.session.is_modified(upload_record):
+                db.session.commit()
+
+            session["last_upload"] = {
+                "filename": upload_record.filename,
+                "palette": palette,
+            }
+
+            response = {
+                "success": True,
+                "filename": upload_record.filename,
+                "upload_id": upload_record.id,
+                "palette": palette,
+            }
+            if current_palette is not None:
+                response["locked"] = locked
+            if palettes is not None:
+                response["palettes"] = palettes
+            return jsonify(response)
+
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Ошибка пересчёта палитры загрузки")
+            return _api_error(_("Внутренняя ошибка сервера"), 500)
+
+    @app.route("/api/jobs/<job_id>", methods=["GET"])
+    def get_extraction_job(job_id: str):
+        """Статус фоновой задачи извлечения палитры (для опроса клиентом)."""
+        if _rate_limited("jobs", limit=600, window_seconds=10 * 60):
+            return _api_error(_("Слишком много запросов. Попробуйте позже."), 429)
+
+        job = _find_job(job_id)
+        if job is None:
+            return _api_error(_("Задача не найдена"), 404)
+
+        payload = _job_payload(job)
+        if job.status == ExtractionJob.STATUS_DONE and "palette" in payload:
+            session["last_upload"] = {
+                "filename": payload["filename"],
+                "palette": payload["palette"],
+            }
+        return jsonify(payload)
+
+    @app.route("/api/palettes", methods=["GET"])
+    @login_required
+    def list_user_palettes():
+        """Страница палитр текущего пользователя: `cursor`, `limit`, поиск `q`, фильтр `colors`, сортировка `sort`."""
+        search = (request.args.get("q") or "").strip()[:100]
+        sort = request.args.get("sort") or DEFAULT_SORT
+        color_count = request.args.get("colors", type=int)
+        limit = request.args.get("limit", default=PALETTE_PAGE_SIZE, type=int)
+        cursor = request.args.get("cursor") or None
+        try:
+            palettes, next_cursor = list_palettes(
+                current_user.id,
+                sort=sort,
+                search=search,
+                color_count=color_count,
+                limit=limit,
+                cursor=cursor,
+            )
+        except InvalidCursor:
+            return _api_error(_("Некорректный курсор страницы"), 400)
+
+        payload = {
+            "success": True,
+            "palettes": [_palette_payload(palette) for palette in palettes],
+            "next_cursor": next_cursor,
+        }
+        if cursor is None:
+            # Общее количество – только для первой страницы выборки, дальше оно у клиента уже есть
+            payload["total"] = count_palettes(current_user.id, search=search, color_count=color_count)
+        return jsonify(payload)
+
     @app.route("/api/palettes/save", methods=["POST"])
     @login_required
     def save_palette():
@@ -264,46 +429,17 @@ def register_routes(app):
                     400,
                 )
 
-            default_base_name = _default_palette_name_for_lang(request_lang)
-            default_names = _default_palette_aliases()
-
-            if not palette_name or palette_name in default_names:
-                base_name = default_base_name
-
-                existing = Palette.query.filter_by(
-                    user_id=current_user.id,
-                    name=base_name,
-                ).first()
-
-                if not existing:
-                    palette_name = base_name
+            try:
+                if not palette_name or palette_name in default_name_aliases():
+                    new_palette = save_new_palette(
+                        current_user.id,
+                        colors,
+                        default_base=default_palette_name(request_lang),
+                    )
                 else:
-                    counter = 1
-                    while True:
-                        candidate_name = f"{base_name} {counter}"
-                        existing = Palette.query.filter_by(
-                            user_id=current_user.id,
-                            name=candidate_name,
-                        ).first()
-                        if not existing:
-                            palette_name = candidate_name
-                            break
-                        counter += 1
-            else:
-                existing_palette = Palette.query.filter_by(
-                    user_id=current_user.id,
-                    name=palette_name,
-                ).first()
-                if existing_palette:
-                    return _api_error(_("У вас уже есть палитра с таким названием"), 400)
-
-            new_palette = Palette(
-                name=palette_name,
-                colors=colors,
-                user_id=current_user.id,
-            )
-            db.session.add(new_palette)
-            db.session.commit()
+                    new_palette = save_new_palette(current_user.id, colors, name=palette_name)
+            except PaletteNameTaken:
+                return _api_error(_("У вас уже есть палитра с таким названием"), 400)
 
             return jsonify({"success": True, "palette_id": new_palette.id})
 
@@ -346,16 +482,11 @@ def register_routes(app):
                     403,
                 )
 
-            existing = Palette.query.filter_by(
-                user_id=current_user.id,
-                name=new_name,
-            ).first()
-            if existing and existing.id != palette.id:
+            try:
+                set_palette_name(palette, new_name)
+            except PaletteNameTaken:
                 return _api_error(_("У вас уже есть палитра с таким названием"), 400)
 
-            palette.name = new_name
-            db.session.commit()
-
             return jsonify({"success": True})
 
         except Exception:
@@ -407,7 +538,14 @@ def register_routes(app):
             if not colors:
                 return _api_error(_("Не переданы корректные цвета палитры"), 400)
 
-            content, filename, mode = export_palette_data(colors, format_type)
+            try:
+                if format_type == "png":
+                    # Рендер PNG – CPU-задача, выполняется в пуле процессов
+                    content, filename, mode = run_compute(export_palette_data, colors, format_type)
+                else:
+                    content, filename, mode = export_palette_data(colors, format_type)
+            except ComputePoolBusy as exc:
+                return _busy_error(exc)
             if content is None or filename is None:
                 return _api_error(_("Неподдерживаемый формат экспорта"), 400)
 
@@ -434,10 +572,20 @@ def register_routes(app):
             current_app.logger.exception("Ошибка экспорта палитры")
             return _api_error(_("Внутренняя ошибка сервера"), 500)
 
-    @app.route("/static/uploads/<filename>")
+    @app.route("/static/uploads/<path:filename>")
     def uploaded_file(filename):
         """Выполняет операцию `uploaded_file` в рамках сценария модуля."""
-        return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
+        # Миниатюра, мастер и оригинал подменяют друг друга, пока нужного файла нет
+        served = served_upload_name(filename)
+        return send_storage_file(
+            get_upload_storage(),
+            served,
+            app.config["X_ACCEL_UPLOADS_LOCATION"],
+            immutable=served == filename and content_etag(filename) is not None,
+            # Подмена временная: клиент перепроверит адрес, когда вариант будет построен
+            max_age=60 if served != filename else None,
+            presigned_ttl=app.config["S3_PRESIGNED_URL_TTL"],
+        )
 
     @app.route("/favicon.ico")
     def favicon():
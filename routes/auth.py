@@ -16,6 +16,7 @@ from models.password_reset_token import PasswordResetToken
 from models.user import User
 from models.user_contact import UserContact
 from utils.contact_normalizer import normalize_email
+from utils.mobile_tokens import revoke_user_tokens
 from utils.rate_limit import get_client_identifier
 from utils.reset_delivery import send_password_reset_code
 
@@ -472,6 +473,8 @@ def register_routes(app):
             PasswordResetToken.expires_at > now,
             PasswordResetToken.id != token.id,
         ).update({PasswordResetToken.used_at: now}, synchronize_session=False)
+        # Новый пароль закрывает сессии мобильного приложения; веб-сессия остаётся
+        revoke_user_tokens(current_user.id)
         db.session.commit()
 
         flash(_("Пароль успешно изменен."), "success")
@@ -597,6 +600,8 @@ def register_routes(app):
                 PasswordResetToken.expires_at > now,
                 PasswordResetToken.id != token.id,
             ).update({PasswordResetToken.used_at: now}, synchronize_session=False)
+            # Сброшенный пароль закрывает и сессии мобильного приложения
+            revoke_user_tokens(user_contact.user_id)
             db.session.commit()
 
             flash(_("Пароль обновлен. Теперь вы можете войти с новым паролем."), "success")
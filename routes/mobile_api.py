@@ -9,33 +9,47 @@ import os
 import re
 import secrets
 import tempfile
-import uuid
 from datetime import UTC, datetime, timedelta
 from functools import wraps
 
-from PIL import Image, UnidentifiedImageError
+from PIL import Image
 from flask import current_app, jsonify, request, send_file
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from config import Config
 from extensions import db
+from models.extraction_job import ExtractionJob
 from models.palette import Palette
 from models.password_reset_token import PasswordResetToken
 from models.upload import Upload
 from models.user import User
 from models.user_contact import UserContact
 from utils.contact_normalizer import normalize_email
+from utils.compute_pool import ComputePoolBusy, run_compute
 from utils.export_handler import export_palette_data
-from utils.image_processor import extract_colors_from_image
+from utils.extraction_jobs import enqueue_extraction, job_state
+from utils.mobile_tokens import consume_refresh_token, issue_tokens, resolve_access_token, revoke_tokens, revoke_user_tokens
+from utils.palette_extraction import (
+    extract_upload_palette,
+    reanalyze_palette,
+    upload_content_hash,
+    upload_palette_ladder,
+    warm_start_palette,
+)
+from utils.palette_listing import DEFAULT_SORT, InvalidCursor, count_palettes, list_palettes
+from utils.palette_names import PaletteNameTaken, save_new_palette, set_palette_name
 from utils.rate_limit import get_client_identifier
+from utils.request_params import parse_locked_indices, resolve_engine
 from utils.reset_delivery import send_password_reset_code
+from utils.upload_pipeline import prepare_upload
+from utils.storage import get_upload_storage
+from utils.upload_derivatives import schedule_upload_derivatives, thumbnail_name, upload_source_key
+from utils.upload_storage import blob_relative_path, find_upload_reference, store_upload_blob
+from utils.upload_stream import UploadValidationError
 
 
 Image.MAX_IMAGE_PIXELS = Config.MAX_IMAGE_PIXELS
 
-_access_tokens: dict[str, int] = {}
-_refresh_tokens: dict[str, int] = {}
-
 
 def _envelope_ok(data=None, status: int = 200):
     return jsonify({"success": True, "data": data}), status
@@ -53,6 +67,12 @@ def _envelope_error(message: str, code: str | None = None, status: int = 400):
     ), status
 
 
+def _busy_error(exc: ComputePoolBusy):
+    response, status = _envelope_error("Сервер перегружен. Повторите попытку позже.", code="busy", status=503)
+    response.headers["Retry-After"] = str(exc.retry_after)
+    return response, status
+
+
 def _rate_limited(bucket: str, limit: int, window_seconds: int, identity: str | None = None) -> bool:
     limiter = current_app.extensions.get("rate_limiter")
     if limiter is None:
@@ -131,24 +151,6 @@ def _normalize_palette_colors(colors):
     return normalized
 
 
-def _issue_tokens(user_id: int) -> dict[str, str]:
-    access = f"m_access_{secrets.token_urlsafe(24)}"
-    refresh = f"m_refresh_{secrets.token_urlsafe(24)}"
-    _access_tokens[access] = user_id
-    _refresh_tokens[refresh] = user_id
-    return {
-        "access_token": access,
-        "refresh_token": refresh,
-    }
-
-
-def _revoke_tokens(access_token: str | None = None, refresh_token: str | None = None):
-    if access_token:
-        _access_tokens.pop(access_token, None)
-    if refresh_token:
-        _refresh_tokens.pop(refresh_token, None)
-
-
 def _bearer_token() -> str | None:
     raw = request.headers.get("Authorization", "")
     if not raw.startswith("Bearer "):
@@ -161,7 +163,7 @@ def _mobile_user_from_access_token(access_token: str | None) -> User | None:
     if not access_token:
         return None
 
-    user_id = _access_tokens.get(access_token)
+    user_id = resolve_access_token(access_token)
     if not user_id:
         return None
 
@@ -195,45 +197,16 @@ def _serialize_palette(palette: Palette) -> dict:
     }
 
 
-def _allowed_file(filename: str) -> bool:
-    return Config.allowed_file(filename)
-
-
-def _validate_uploaded_image(file_storage):
-    file_storage.stream.seek(0)
-    try:
-        with Image.open(file_storage.stream) as image:
-            image.verify()
-    except (UnidentifiedImageError, OSError):
-        return None, "Файл не является корректным изображением"
-    finally:
-        file_storage.stream.seek(0)
-
-    try:
-        with Image.open(file_storage.stream) as image:
-            image_format = (image.format or "").lower()
-            width, height = image.size
-    except (UnidentifiedImageError, OSError):
-        return None, "Файл не является корректным изображением"
-    finally:
-        file_storage.stream.seek(0)
-
-    if image_format not in Config.ALLOWED_IMAGE_FORMATS:
-        return None, "Недопустимый формат изображения"
-
-    if width * height > Config.MAX_IMAGE_PIXELS:
-        return None, "Изображение слишком большое по разрешению"
-
-    format_to_extension = {"jpeg": "jpg", "png": "png", "webp": "webp"}
-    return format_to_extension[image_format], None
-
-
 def _clamp_color_count(raw_value: int | None) -> int:
     if raw_value is None:
         return 5
     return max(Config.MIN_COLOR_COUNT, min(Config.MAX_COLOR_COUNT, raw_value))
 
 
+def _is_flag_set(raw_value) -> bool:
+    return str(raw_value or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _issue_reset_code(user_id: int, destination: str) -> tuple[bool, str]:
     now = datetime.utcnow()
     expires_at = now + timedelta(
@@ -315,7 +288,7 @@ def register_routes(app):
             if not user or not check_password_hash(user.password_hash, password):
                 return _envelope_error("Неверный логин или пароль", code="invalid_credentials", status=401)
 
-            tokens = _issue_tokens(int(user.id))
+            tokens = issue_tokens(int(user.id))
             return _envelope_ok({"user": _serialize_user(user), "tokens": tokens})
         except Exception:
             current_app.logger.exception("mobile_login failed")
@@ -355,7 +328,7 @@ def register_routes(app):
             db.session.add(new_user)
             db.session.commit()
 
-            tokens = _issue_tokens(int(new_user.id))
+            tokens = issue_tokens(int(new_user.id))
             return _envelope_ok({"user": _serialize_user(new_user), "tokens": tokens}, status=201)
         except Exception:
             db.session.rollback()
@@ -370,17 +343,15 @@ def register_routes(app):
             if not refresh_token:
                 return _envelope_error("refresh_token обязателен", code="validation_error", status=400)
 
-            user_id = _refresh_tokens.get(refresh_token)
+            user_id = consume_refresh_token(refresh_token)
             if not user_id:
                 return _envelope_error("Refresh-токен недействителен", code="invalid_refresh", status=401)
 
             user = db.session.get(User, int(user_id))
             if not user:
-                _revoke_tokens(refresh_token=refresh_token)
                 return _envelope_error("Пользователь не найден", code="user_not_found", status=401)
 
-            _revoke_tokens(refresh_token=refresh_token)
-            tokens = _issue_tokens(int(user.id))
+            tokens = issue_tokens(int(user.id))
             return _envelope_ok({"user": _serialize_user(user), "tokens": tokens})
         except Exception:
             current_app.logger.exception("mobile_refresh failed")
@@ -391,7 +362,7 @@ def register_routes(app):
     def mobile_logout(user: User, access_token: str):
         payload = request.get_json(silent=True) or {}
         refresh_token = (payload.get("refresh_token") or "").strip() or None
-        _revoke_tokens(access_token=access_token, refresh_token=refresh_token)
+        revoke_tokens(access_token=access_token, refresh_token=refresh_token)
         return _envelope_ok({})
 
     @app.get("/api/mobile/v1/auth/me")
@@ -511,9 +482,12 @@ def register_routes(app):
                 PasswordResetToken.expires_at > now,
                 PasswordResetToken.id != token.id,
             ).update({PasswordResetToken.used_at: now}, synchronize_session=False)
+            # Остальные сессии закрываются; вызывающий клиент получает новую пару токенов
+            revoke_user_tokens(user.id)
             db.session.commit()
 
-            return _envelope_ok({"changed": True})
+            tokens = issue_tokens(int(user.id))
+            return _envelope_ok({"changed": True, "tokens": tokens})
         except Exception:
             db.session.rollback()
             current_app.logger.exception("mobile_change_password failed")
@@ -525,52 +499,199 @@ def register_routes(app):
             if _rate_limited("mobile_upload", limit=40, window_seconds=10 * 60):
                 return _envelope_error("Слишком много загрузок. Попробуйте позже.", code="rate_limited", status=429)
 
-            if "image" not in request.files:
-                return _envelope_error("Файл не был загружен", code="validation_error", status=400)
-
-            file = request.files["image"]
-            if file.filename == "":
-                return _envelope_error("Файл не выбран", code="validation_error", status=400)
-
-            if not _allowed_file(file.filename):
-                return _envelope_error("Недопустимый тип файла", code="validation_error", status=400)
-
-            extension, validation_error = _validate_uploaded_image(file)
-            if validation_error is not None:
-                return _envelope_error(validation_error, code="validation_error", status=400)
+            try:
+                prepared = prepare_upload(request, app.config["UPLOAD_FOLDER"])
+            except UploadValidationError as exc:
+                return _envelope_error(exc.message, code="validation_error", status=exc.status)
+
+            form = prepared.form
+            engine = resolve_engine(form.get("engine"))
+            if engine is None:
+                prepared.discard()
+                return _envelope_error("Неизвестный алгоритм извлечения цветов", code="validation_error", status=400)
+
+            run_async = app.config["EXTRACTION_JOBS_ENABLED"] and _is_flag_set(form.get("async"))
+            if not run_async:
+                # Декодирование – в пуле вычислений; фоновую задачу декодирует воркер
+                try:
+                    prepared.decode()
+                except UploadValidationError as exc:
+                    prepared.discard()
+                    return _envelope_error(exc.message, code="validation_error", status=exc.status)
+                except ComputePoolBusy as exc:
+                    prepared.discard()
+                    return _busy_error(exc)
+
+            digest = prepared.digest
+            # Одинаковое содержимое хранится один раз: `ab/cd/<sha256>.<ext>` со счётчиком ссылок
+            unique_filename = blob_relative_path(digest, prepared.extension)
+
+            color_count = _clamp_color_count(form.get("color_count", 5, type=int))
 
-            timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            unique_filename = f"{timestamp}_{uuid.uuid4().hex[:12]}.{extension}"
-            filepath = os.path.join(app.config["UPLOAD_FOLDER"], unique_filename)
-            file.save(filepath)
+            mobile_user = _current_mobile_user_optional()
+            upload_record = Upload(
+                filename=unique_filename,
+                user_id=mobile_user.id if mobile_user else None,
+                content_hash=digest,
+                placeholder=prepared.placeholder,
+            )
 
-            color_count = _clamp_color_count(request.form.get("color_count", 5, type=int))
+            if run_async:
+                store_upload_blob(prepared)
+                db.session.add(upload_record)
+                job = enqueue_extraction(
+                    upload_record,
+                    color_count,
+                    engine,
+                    _is_flag_set(form.get("all_counts")),
+                )
+                db.session.commit()
+                response, status = _envelope_ok(
+                    {
+                        "job_id": job.id,
+                        "status": job.status,
+                        "filename": unique_filename,
+                        "thumbnail": thumbnail_name(unique_filename),
+                        "placeholder": upload_record.placeholder,
+                        "upload_id": int(upload_record.id),
+                        "status_url": f"/api/mobile/v1/jobs/{job.id}",
+                    },
+                    status=202,
+                )
+                return schedule_upload_derivatives(response, unique_filename), status
 
+            palettes = None
             try:
-                palette = extract_colors_from_image(filepath, color_count)
+                palette = extract_upload_palette(prepared.path, digest, color_count, engine, prepared.pixels)
+                if _is_flag_set(form.get("all_counts")):
+                    palettes = {**upload_palette_ladder(upload_record, prepared.path, digest), str(color_count): palette}
+            except ComputePoolBusy as exc:
+                prepared.discard()
+                return _busy_error(exc)
             except Exception:
                 current_app.logger.exception("mobile_upload_image: extract failed")
+                prepared.discard()
                 return _envelope_error("Не удалось извлечь цвета из изображения", code="extract_failed", status=500)
 
-            mobile_user = _current_mobile_user_optional()
-            upload_record = Upload(
-                filename=unique_filename,
-                user_id=mobile_user.id if mobile_user else None,
-            )
+            store_upload_blob(prepared)
             db.session.add(upload_record)
             db.session.commit()
 
-            return _envelope_ok(
-                {
-                    "filename": unique_filename,
-                    "palette": palette,
-                }
-            )
+            data = {
+                "filename": unique_filename,
+                "thumbnail": thumbnail_name(unique_filename),
+                "placeholder": upload_record.placeholder,
+                "upload_id": int(upload_record.id),
+                "palette": palette,
+            }
+            if palettes is not None:
+                data["palettes"] = palettes
+            response, status = _envelope_ok(data)
+            return schedule_upload_derivatives(response, unique_filename), status
         except Exception:
             db.session.rollback()
             current_app.logger.exception("mobile_upload_image failed")
             return _envelope_error("Внутренняя ошибка сервера", code="server_error", status=500)
 
+    @app.get("/api/mobile/v1/jobs/<job_id>")
+    def mobile_get_extraction_job(job_id: str):
+        if _rate_limited("mobile_jobs", limit=600, window_seconds=10 * 60):
+            return _envelope_error("Слишком много запросов. Попробуйте позже.", code="rate_limited", status=429)
+
+        job = db.session.get(ExtractionJob, str(job_id))
+        if job is None or job.upload is None:
+            return _envelope_error("Задача не найдена", code="not_found", status=404)
+        owner_id = job.upload.user_id
+        if owner_id is not None:
+            mobile_user = _current_mobile_user_optional()
+            if mobile_user is None or mobile_user.id != owner_id:
+                return _envelope_error("Задача не найдена", code="not_found", status=404)
+
+        data = job_state(job)
+        if job.status == ExtractionJob.STATUS_FAILED:
+            data["error"] = {
+                "code": "extract_failed",
+                "message": job.error or "Не удалось извлечь цвета из изображения",
+            }
+        return _envelope_ok(data)
+
+    @app.post("/api/mobile/v1/upload/reanalyze")
+    def mobile_reanalyze_upload():
+        try:
+            if _rate_limited("mobile_reanalyze", limit=120, window_seconds=10 * 60):
+                return _envelope_error("Слишком много запросов. Попробуйте позже.", code="rate_limited", status=429)
+
+            payload = request.get_json(silent=True) or {}
+            mobile_user = _current_mobile_user_optional()
+            upload = find_upload_reference(
+                payload.get("filename"),
+                payload.get("upload_id"),
+                mobile_user.id if mobile_user is not None else None,
+            )
+            if upload is None:
+                return _envelope_error("Загрузка не найдена", code="not_found", status=404)
+
+            engine = resolve_engine(payload.get("engine"))
+            if engine is None:
+                return _envelope_error("Неизвестный алгоритм извлечения цветов", code="validation_error", status=400)
+
+            try:
+                color_count = _clamp_color_count(int(payload.get("color_count", 5)))
+            except (TypeError, ValueError):
+                return _envelope_error("Некорректное количество цветов", code="validation_error", status=400)
+
+            current_palette = None
+            locked: list[int] = []
+            if payload.get("palette") is not None:
+                current_palette = _normalize_palette_colors(payload.get("palette"))
+                if not current_palette:
+                    return _envelope_error("Не переданы корректные цвета палитры", code="validation_error", status=400)
+                locked_indices = parse_locked_indices(payload.get("locked"), len(current_palette), color_count)
+                if locked_indices is None:
+                    return _envelope_error(
+                        "Некорректный список закреплённых цветов",
+                        code="validation_error",
+                        status=400,
+                    )
+
+            try:
+                with get_upload_storage().fetch(upload_source_key(upload)) as filepath:
+                    digest = upload_content_hash(upload, filepath)
+                    if current_palette is not None:
+                        palette, locked = warm_start_palette(
+                            filepath, digest, color_count, current_palette, locked_indices
+                        )
+                    else:
+                        palette = reanalyze_palette(filepath, digest, color_count, engine)
+                    palettes = None
+                    if _is_flag_set(payload.get("all_counts")):
+                        palettes = {**upload_palette_ladder(upload, filepath, digest), str(color_count): palette}
+            except FileNotFoundError:
+                return _envelope_error("Изображение больше недоступно", code="not_found", status=404)
+            except ComputePoolBusy as exc:
+                return _busy_error(exc)
+            except Exception:
+                current_app.logger.exception("mobile_reanalyze_upload: extract failed")
+                return _envelope_error("Не удалось извлечь цвета из изображения", code="extract_failed", status=500)
+
+            if db.session.is_modified(upload):
+                db.session.commit()
+
+            data = {
+                "filename": upload.filename,
+                "upload_id": int(upload.id),
+                "palette": palette,
+            }
+            if current_palette is not None:
+                data["locked"] = locked
+            if palettes is not None:
+                data["palettes"] = palettes
+            return _envelope_ok(data)
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("mobile_reanalyze_upload failed")
+            return _envelope_error("Внутренняя ошибка сервера", code="server_error", status=500)
+
     @app.post("/api/mobile/v1/export")
     def mobile_export_palette():
         try:
@@ -583,7 +704,13 @@ def register_routes(app):
                 return _envelope_error("Не переданы корректные цвета палитры", code="validation_error", status=400)
 
             format_type = (request.args.get("format") or "json").lower()
-            content, filename, mode = export_palette_data(colors, format_type)
+            try:
+                if format_type == "png":
+                    content, filename, mode = run_compute(export_palette_data, colors, format_type)
+                else:
+                    content, filename, mode = export_palette_data(colors, format_type)
+            except ComputePoolBusy as exc:
+                return _busy_error(exc)
             if content is None or filename is None:
                 return _envelope_error("Неподдерживаемый формат экспорта", code="unsupported_format", status=400)
 
@@ -616,29 +743,32 @@ def register_routes(app):
         except ValueError:
             return _envelope_error("Некорректные limit/offset", code="validation_error", status=400)
 
-        sort = (request.args.get("sort") or "created_desc").strip().lower()
-        query = Palette.query.filter_by(user_id=user.id)
-
-        if sort == "created_asc":
-            query = query.order_by(Palette.created_at.asc())
-        elif sort == "name_asc":
-            query = query.order_by(Palette.name.asc())
-        elif sort == "name_desc":
-            query = query.order_by(Palette.name.desc())
-        else:
-            query = query.order_by(Palette.created_at.desc())
-
-        total = query.count()
-        items = query.offset(offset).limit(limit).all()
-
-        return _envelope_ok(
-            {
-                "items": [_serialize_palette(item) for item in items],
-                "total": total,
-                "limit": limit,
-                "offset": offset,
-            }
-        )
+        sort = (request.args.get("sort") or DEFAULT_SORT).strip().lower()
+        # Клиенты с курсорами передают `cursor` (пустой – первая страница); без него – старый режим offset
+        cursor_mode = "cursor" in request.args
+        cursor = request.args.get("cursor") or None
+        try:
+            items, next_cursor = list_palettes(
+                user.id,
+                sort=sort,
+                limit=limit,
+                cursor=cursor,
+                offset=0 if cursor_mode else offset,
+            )
+        except InvalidCursor:
+            return _envelope_error("Некорректный cursor", code="validation_error", status=400)
+
+        data = {
+            "items": [_serialize_palette(item) for item in items],
+            "limit": limit,
+            "next_cursor": next_cursor,
+        }
+        if not cursor_mode:
+            data["offset"] = offset
+        if not cursor_mode or request.args.get("include_total", "").lower() in {"1", "true", "yes"}:
+            # COUNT нужен старым клиентам; клиент с курсорами запрашивает его явно (обычно раз за синхронизацию)
+            data["total"] = count_palettes(user.id)
+        return _envelope_ok(data)
 
     @app.post("/api/mobile/v1/palettes")
     @_with_mobile_user
@@ -659,22 +789,10 @@ def register_routes(app):
             if raw_name is not None and str(raw_name).strip() == "":
                 return _envelope_error("Название палитры не может быть пустым", code="validation_error", status=400)
 
-            if not name:
-                base = "Моя палитра"
-                candidate = base
-                index = 1
-                while Palette.query.filter_by(user_id=user.id, name=candidate).first() is not None:
-                    candidate = f"{base} {index}"
-                    index += 1
-                name = candidate
-            else:
-                existing = Palette.query.filter_by(user_id=user.id, name=name).first()
-                if existing is not None:
-                    return _envelope_error("У вас уже есть палитра с таким названием", code="name_exists", status=400)
-
-            palette = Palette(name=name, colors=colors, user_id=user.id)
-            db.session.add(palette)
-            db.session.commit()
+            try:
+                palette = save_new_palette(user.id, colors, name=name or None, default_base="Моя палитра")
+            except PaletteNameTaken:
+                return _envelope_error("У вас уже есть палитра с таким названием", code="name_exists", status=400)
 
             return _envelope_ok(_serialize_palette(palette), status=201)
         except Exception:
@@ -697,12 +815,10 @@ def register_routes(app):
             if palette.user_id != user.id:
                 return _envelope_error("У вас нет прав на изменение этой палитры", code="forbidden", status=403)
 
-            existing = Palette.query.filter_by(user_id=user.id, name=name).first()
-            if existing and existing.id != palette.id:
+            try:
+                set_palette_name(palette, name)
+            except PaletteNameTaken:
                 return _envelope_error("У вас уже есть палитра с таким названием", code="name_exists", status=400)
-
-            palette.name = name
-            db.session.commit()
             return _envelope_ok(_serialize_palette(palette))
         except Exception:
             db.session.rollback()
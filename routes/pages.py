@@ -8,9 +8,10 @@ from datetime import datetime, timedelta
 from flask import Response, current_app, redirect, render_template, request, send_from_directory, url_for
 from flask_login import login_required, current_user
 
-from models.palette import Palette
 from models.upload import Upload
+from utils.file_serving import send_stored_file
 from utils.i18n import resolve_request_language
+from utils.palette_listing import count_palettes, list_palettes
 
 
 def _resolve_lang() -> str:
@@ -82,12 +83,14 @@ def register_routes(app):
     @login_required
     def myPalet(lang):
         """Выполняет операцию `myPalet` в рамках сценария модуля."""
-        palettes = (
-            Palette.query.filter_by(user_id=current_user.id)
-            .order_by(Palette.created_at.desc())
-            .all()
+        # Первый экран рендерится сразу, остальное страница подгружает через `/api/palettes`
+        palettes, next_cursor = list_palettes(current_user.id)
+        return render_template(
+            "myPalet.html",
+            palettes=palettes,
+            next_cursor=next_cursor,
+            total_palettes=count_palettes(current_user.id),
         )
-        return render_template("myPalet.html", palettes=palettes)
 
     @app.get("/faq")
     def faq_legacy():
@@ -107,8 +110,9 @@ def register_routes(app):
     @app.get("/download/paleta.apk")
     def download_apk():
         """Отдаёт APK-файл мобильного приложения."""
-        return send_from_directory(
+        return send_stored_file(
             app.static_folder, "apk/paleta.apk",
+            app.config["X_ACCEL_STATIC_LOCATION"],
             as_attachment=True,
             download_name="Paleta.apk",
         )
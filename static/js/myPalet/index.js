@@ -4,9 +4,9 @@
  */
 
 import { copyPalette } from './clipboard.js';
-import { createFiltersController } from './filters.js';
 import { showToast } from './notifications.js';
 import { createPaletteActions } from './palette-actions.js';
+import { createPaletteListController } from './palette-list.js';
 import { createMyPaletState } from './state.js';
 
 const t = window.t || ((key, fallback) => fallback || key);
@@ -23,6 +23,10 @@ function collectMyPaletElements(root = document) {
         palettesContainer: root.getElementById('palettesContainer'),
         visibleCountEl: root.getElementById('paletteCountVisible'),
         totalCountEl: root.getElementById('paletteCountTotal'),
+        loadMoreBtn: root.getElementById('loadMorePalettes'),
+        listFooter: root.getElementById('paletteListFooter'),
+        emptyResultEl: root.getElementById('paletteEmptyResult'),
+        cardTemplate: root.getElementById('paletteCardTemplate'),
     };
 }
 
@@ -37,8 +41,12 @@ export function initMyPaletPage() {
     }
 
     const state = createMyPaletState();
-    const filtersController = createFiltersController(elements);
-    const actions = createPaletteActions({ state, showToast });
+    const listController = createPaletteListController(elements, { showToast });
+    const actions = createPaletteActions({
+        state,
+        showToast,
+        onDeleted: (paletteId) => listController.removeCard(paletteId),
+    });
 
     if (elements.deleteModalElement) {
         elements.deleteModalElement.addEventListener('hidden.bs.modal', () => {
@@ -65,7 +73,7 @@ export function initMyPaletPage() {
         });
     }
 
-    filtersController.bind();
+    listController.bind();
 
     document.addEventListener('click', async (event) => {
         const target = event.target instanceof Element ? event.target : null;
@@ -92,6 +100,12 @@ export function initMyPaletPage() {
             return;
         }
 
+        const copyButton = target ? target.closest('.btn-copy-palette') : null;
+        if (copyButton) {
+            copyPalette(copyButton.dataset.colors || '', showToast);
+            return;
+        }
+
         const deleteButton = target ? target.closest('.btn-delete-palette') : null;
         if (deleteButton) {
             actions.deletePalette(deleteButton.dataset.paletteId, deleteButton.dataset.paletteName);
@@ -11,7 +11,7 @@ const currentLang = window.currentLang || 'en';
 /**
  * Выполняет операцию `createPaletteActions` для соответствующего сценария интерфейса.
  */
-export function createPaletteActions({ state, showToast }) {
+export function createPaletteActions({ state, showToast, onDeleted = null }) {
     function buildDownloadFilename(name, format) {
         const safeName = (name || '')
             .trim()
@@ -89,9 +89,13 @@ export function createPaletteActions({ state, showToast }) {
             .then(data => {
                 if (data.success) {
                     showToast(t('palette_deleted', 'Палитра удалена!'));
-                    setTimeout(() => {
-                        location.reload();
-                    }, 500);
+                    if (onDeleted) {
+                        onDeleted(idToDelete);
+                    } else {
+                        setTimeout(() => {
+                            location.reload();
+                        }, 500);
+                    }
                 } else {
                     showToast(`${t('delete_error_prefix', 'Ошибка при удалении:')} ${data.error}`, 'error');
                 }
@@ -167,8 +171,10 @@ export function createPaletteActions({ state, showToast }) {
                     if (card) {
                         const titleEl = card.querySelector('.card-title');
                         if (titleEl) titleEl.textContent = newName;
-                        card.dataset.name = newName.toLowerCase();
                         card.dataset.paletteName = newName;
+                        card.querySelectorAll('.export-option').forEach(option => {
+                            option.dataset.name = newName;
+                        });
 
                         const renameBtn = card.querySelector(`button.btn-rename-palette[data-palette-id="${idToRename}"]`);
                         if (renameBtn) {
@@ -0,0 +1,168 @@
+/*
+ * Модуль: `static/js/myPalet/palette-list.js`.
+ * Назначение: Список палитр раздела «Мои палитры» – поиск, фильтр и сортировка на сервере, подгрузка страниц.
+ */
+
+const t = window.t || ((key, fallback) => fallback || key);
+const currentLang = window.currentLang || 'en';
+const SEARCH_DEBOUNCE_MS = 250;
+const SWATCH_STYLE = 'width: 25px; height: 25px; border-radius: 3px; border: 1px solid #ddd;';
+
+function formatCreatedAt(isoValue) {
+    // Время хранится в UTC без зоны – показываем те же цифры, что и серверный шаблон
+    const match = /^(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2})/.exec(isoValue || '');
+    if (!match) return '';
+    const [, year, month, day, hours, minutes] = match;
+    return currentLang === 'ru'
+        ? `${day}.${month}.${year} ${hours}:${minutes}`
+        : `${year}-${month}-${day} ${hours}:${minutes}`;
+}
+
+/**
+ * Выполняет операцию `createPaletteListController` для соответствующего сценария интерфейса.
+ */
+export function createPaletteListController(elements, { showToast }) {
+    const container = elements.palettesContainer;
+    let nextCursor = container?.dataset.nextCursor || null;
+    let loadedCount = container ? container.querySelectorAll('.palette-card').length : 0;
+    let total = Number(elements.totalCountEl?.textContent || loadedCount);
+    let requestId = 0;
+    let loading = false;
+    let searchTimer = null;
+
+    function updateView() {
+        if (elements.visibleCountEl) {
+            elements.visibleCountEl.textContent = loadedCount.toString();
+        }
+        if (elements.totalCountEl) {
+            elements.totalCountEl.textContent = total.toString();
+        }
+        elements.loadMoreBtn?.classList.toggle('d-none', !nextCursor);
+        elements.emptyResultEl?.classList.toggle('d-none', loadedCount > 0);
+    }
+
+    function buildUrl(cursor) {
+        const params = new URLSearchParams();
+        params.set('sort', elements.sortSelect?.value || 'created_desc');
+        const search = (elements.searchInput?.value || '').trim();
+        if (search) params.set('q', search);
+        const colorCount = elements.colorCountFilter?.value || '';
+        if (colorCount) params.set('colors', colorCount);
+        if (cursor) params.set('cursor', cursor);
+        return `/api/palettes?${params.toString()}`;
+    }
+
+    function renderCard(palette) {
+        const fragment = elements.cardTemplate.content.cloneNode(true);
+        const card = fragment.querySelector('.palette-card');
+        const colors = Array.isArray(palette.colors) ? palette.colors : [];
+        const paletteId = String(palette.id);
+
+        card.dataset.paletteId = paletteId;
+        card.dataset.paletteName = palette.name;
+        card.querySelector('.card-title').textContent = palette.name;
+        card.querySelector('.palette-created-at').textContent = formatCreatedAt(palette.created_at);
+
+        const swatches = card.querySelector('.palette-swatches');
+        colors.forEach(color => {
+            const swatch = document.createElement('div');
+            swatch.className = 'color-swatch-small';
+            swatch.style.cssText = SWATCH_STYLE;
+            swatch.style.backgroundColor = color;
+            swatches.appendChild(swatch);
+        });
+
+        card.querySelector('.btn-copy-palette').dataset.colors = colors.join(' ');
+        card.querySelectorAll('.export-option').forEach(option => {
+            option.dataset.colors = JSON.stringify(colors);
+            option.dataset.name = palette.name;
+        });
+        card.querySelectorAll('.btn-rename-palette, .btn-delete-palette').forEach(button => {
+            button.dataset.paletteId = paletteId;
+            button.dataset.paletteName = palette.name;
+        });
+        return card;
+    }
+
+    async function fetchPage({ reset = false } = {}) {
+        if (!container || !elements.cardTemplate) return;
+        if (!reset && (loading || !nextCursor)) return;
+
+        const currentRequest = ++requestId;
+        loading = true;
+        try {
+            const response = await fetch(buildUrl(reset ? null : nextCursor), {
+                headers: { Accept: 'application/json' },
+            });
+            if (response.status === 401) {
+                showToast(t('session_expired_login', 'Сессия истекла. Пожалуйста, войдите снова.'), 'error');
+                window.location.href = `/${currentLang}/login`;
+                return;
+            }
+            const data = await response.json();
+            // Ответ на устаревший запрос (фильтр уже сменился) отбрасываем
+            if (currentRequest !== requestId) return;
+            if (!response.ok || !data.success) {
+                throw new Error(data.error || 'palette list error');
+            }
+
+            if (reset) {
+                container.replaceChildren();
+                loadedCount = 0;
+                total = Number(data.total || 0);
+            }
+            data.palettes.forEach(palette => container.appendChild(renderCard(palette)));
+            loadedCount += data.palettes.length;
+            nextCursor = data.next_cursor || null;
+        } catch (error) {
+            if (currentRequest !== requestId) return;
+            console.error('Palette list error:', error);
+            showToast(t('palette_list_error', 'Не удалось загрузить палитры'), 'error');
+        } finally {
+            if (currentRequest === requestId) {
+                loading = false;
+                updateView();
+            }
+        }
+    }
+
+    function removeCard(paletteId) {
+        const card = container?.querySelector(`.palette-card[data-palette-id="${paletteId}"]`);
+        if (!card) return;
+        card.remove();
+        loadedCount = Math.max(0, loadedCount - 1);
+        total = Math.max(0, total - 1);
+        updateView();
+    }
+
+    function observeFooter() {
+        if (!elements.listFooter || !('IntersectionObserver' in window)) return;
+        // Следующая страница подгружается заранее, когда низ списка приближается к экрану
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                fetchPage();
+            }
+        }, { rootMargin: '600px 0px' });
+        observer.observe(elements.listFooter);
+    }
+
+    function bind() {
+        if (!container) return;
+
+        elements.searchInput?.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => fetchPage({ reset: true }), SEARCH_DEBOUNCE_MS);
+        });
+        elements.colorCountFilter?.addEventListener('change', () => fetchPage({ reset: true }));
+        elements.sortSelect?.addEventListener('change', () => fetchPage({ reset: true }));
+        elements.loadMoreBtn?.addEventListener('click', () => fetchPage());
+
+        updateView();
+        observeFooter();
+    }
+
+    return {
+        bind,
+        removeCard,
+    };
+}
@@ -3,6 +3,7 @@
  * Назначение: Модуль клиентской логики страницы извлечения и редактирования палитры.
  */
 
+import { reanalyzeUpload } from './api.js';
 import { dataURLToBlob, showToast } from './utils.js';
 import { withCsrfHeaders } from '../security/csrf.js';
 
@@ -22,11 +23,24 @@ export function bindPaletteActions({ elements, state, paletteView, markerControl
         markerController.updateActiveLoupe();
     });
 
+    // Палитры всех размеров пришли вместе с загрузкой: смена количества цветов без запроса к серверу
+    elements.colorCountSelect.addEventListener('change', () => {
+        paletteView.displayCachedPalette(elements.colorCountSelect.value);
+    });
+
     elements.reanalyzeBtn.addEventListener('click', async (event) => {
         event.stopPropagation();
 
+        const lockedIndices = [...state.lockedIndices].sort((a, b) => a - b);
+        const warmStart = !!state.currentFilename && lockedIndices.length > 0;
+
+        if (!warmStart && paletteView.displayCachedPalette(elements.colorCountSelect.value)) {
+            showToast(t('palette_recalculated', 'Палитра пересчитана!'));
+            return;
+        }
+
         const savedImageDataURL = localStorage.getItem('lastImageDataURL');
-        if (!state.currentImageFile && !savedImageDataURL) {
+        if (!state.currentFilename && !state.currentImageFile && !savedImageDataURL) {
             showToast(t('upload_image_first', 'Сначала загрузите изображение!'), 'error');
             return;
         }
@@ -34,27 +48,63 @@ export function bindPaletteActions({ elements, state, paletteView, markerControl
         paletteView.showLoading(true);
 
         try {
-            const formData = new FormData();
-            formData.append('color_count', elements.colorCountSelect.value);
-
-            if (state.currentImageFile) {
-                formData.append('image', state.currentImageFile);
-            } else if (savedImageDataURL) {
-                const blob = dataURLToBlob(savedImageDataURL);
-                formData.append('image', blob, 'image.png');
+            let data = null;
+            let displayOptions = {};
+
+            if (state.currentFilename) {
+                // Есть закреплённые цвета: пересчёт от текущей палитры, они остаются на местах
+                const result = await reanalyzeUpload({
+                    filename: state.currentFilename,
+                    colorCount: elements.colorCountSelect.value,
+                    palette: warmStart ? state.currentColors : null,
+                    locked: warmStart ? lockedIndices : null,
+                });
+                if (warmStart && result.ok && Array.isArray(result.data.locked)) {
+                    const preservedPositions = new Map();
+                    result.data.locked.forEach((newIndex, order) => {
+                        preservedPositions.set(newIndex, state.markerPositions[lockedIndices[order]]);
+                    });
+                    displayOptions = { locked: result.data.locked, preservedPositions };
+                }
+                // 404 – файл уже удалён по сроку хранения: откатываемся к повторной загрузке
+                data = result.status === 404 ? null : result.data;
             }
 
-            const response = await fetch('/api/upload', {
-                method: 'POST',
-                headers: withCsrfHeaders(),
-                body: formData,
-            });
+            if (data === null) {
+                const canReupload = state.currentImageFile || (savedImageDataURL && savedImageDataURL.startsWith('data:'));
+                if (!canReupload) {
+                    showToast(t('upload_image_first', 'Сначала загрузите изображение!'), 'error');
+                    return;
+                }
+
+                const formData = new FormData();
+                formData.append('color_count', elements.colorCountSelect.value);
+                formData.append('all_counts', '1');
+
+                if (state.currentImageFile) {
+                    formData.append('image', state.currentImageFile);
+                } else {
+                    const blob = dataURLToBlob(savedImageDataURL);
+                    formData.append('image', blob, 'image.png');
+                }
+
+                const response = await fetch('/api/upload', {
+                    method: 'POST',
+                    headers: withCsrfHeaders(),
+                    body: formData,
+                });
 
-            const data = await response.json();
+                data = await response.json();
+                if (data.success) {
+                    state.currentFilename = data.filename;
+                    localStorage.setItem('lastImageFilename', data.filename);
+                }
+            }
 
             if (data.success) {
                 state.currentColors = data.palette;
-                paletteView.displayPalette(state.currentColors);
+                paletteView.setPalettesByCount(data.palettes);
+                paletteView.displayPalette(state.currentColors, displayOptions);
                 localStorage.setItem('lastPalette', JSON.stringify(state.currentColors));
                 showToast(t('palette_recalculated', 'Палитра пересчитана!'));
             } else {
@@ -0,0 +1,79 @@
+/*
+ * Модуль: `static/js/palette/api.js`.
+ * Назначение: Запросы страницы извлечения палитры к серверному API.
+ */
+
+import { withCsrfHeaders } from '../security/csrf.js';
+
+/**
+ * Пересчитывает палитру уже загруженного изображения по имени файла без повторной загрузки.
+ * С `allCounts` сервер дополнительно возвращает `palettes` – палитры для всех количеств цветов.
+ * С `palette` и `locked` пересчёт стартует от текущей палитры и не меняет закреплённые цвета.
+ * Возвращает `{ ok, status, data }`.
+ */
+export async function reanalyzeUpload({ filename, colorCount, allCounts = true, palette = null, locked = null }) {
+    const payload = {
+        filename,
+        color_count: Number(colorCount) || 5,
+        all_counts: allCounts,
+    };
+    if (Array.isArray(palette)) {
+        payload.palette = palette;
+        payload.locked = Array.isArray(locked) ? locked : [];
+    }
+
+    const response = await fetch('/api/upload/reanalyze', {
+        method: 'POST',
+        headers: withCsrfHeaders({
+            'Content-Type': 'application/json',
+        }),
+        body: JSON.stringify(payload),
+    });
+
+    let data = {};
+    try {
+        data = await response.json();
+    } catch (_error) {
+        // Ignore JSON parse errors.
+    }
+
+    return { ok: response.ok && !!data.success, status: response.status, data };
+}
+
+// Опрос статуса задачи: интервал растёт от 0,5 до 4 с, чтобы долгие задачи не нагружали сервер
+const JOB_POLL_INITIAL_MS = 500;
+const JOB_POLL_MAX_MS = 4000;
+const JOB_WAIT_TIMEOUT_MS = 5 * 60 * 1000;
+
+async function fetchJob(jobId) {
+    const response = await fetch(`/api/jobs/${encodeURIComponent(jobId)}`, { cache: 'no-store' });
+    let data = {};
+    try {
+        data = await response.json();
+    } catch (_error) {
+        // Ignore JSON parse errors.
+    }
+    if (!response.ok) {
+        return { success: false, status: 'failed', error: data.error };
+    }
+    return data;
+}
+
+/**
+ * Ждёт завершения фоновой задачи извлечения палитры (ответ 202 от `/api/upload`).
+ * Опрашивает `GET /api/jobs/<id>` с растущим интервалом до завершения задачи или таймаута.
+ * Возвращает итоговый ответ задачи в формате `/api/upload`.
+ */
+export async function waitForExtractionJob(jobId) {
+    const deadline = Date.now() + JOB_WAIT_TIMEOUT_MS;
+    let delay = JOB_POLL_INITIAL_MS;
+    while (Date.now() < deadline) {
+        await new Promise(resolve => setTimeout(resolve, delay));
+        const data = await fetchJob(jobId);
+        if (data.status === 'done' || data.status === 'failed') {
+            return data;
+        }
+        delay = Math.min(delay * 2, JOB_POLL_MAX_MS);
+    }
+    return { success: false, status: 'failed' };
+}
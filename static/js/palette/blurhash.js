@@ -0,0 +1,114 @@
+/*
+ * Модуль: `static/js/palette/blurhash.js`.
+ * Назначение: Декодирование BlurHash-превью загрузок, которые показываются до прихода миниатюры.
+ */
+
+const BASE83_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~';
+// Превью растягивается на всю карточку, поэтому хватает маленького холста
+const PLACEHOLDER_SIZE = 32;
+
+function decodeBase83(value) {
+    let result = 0;
+    for (const char of value) {
+        const digit = BASE83_ALPHABET.indexOf(char);
+        if (digit < 0) throw new Error('Invalid BlurHash');
+        result = result * 83 + digit;
+    }
+    return result;
+}
+
+function srgbToLinear(value) {
+    const scaled = value / 255;
+    return scaled <= 0.04045 ? scaled / 12.92 : ((scaled + 0.055) / 1.055) ** 2.4;
+}
+
+function linearToSrgb(value) {
+    const clamped = Math.max(0, Math.min(1, value));
+    const scaled = clamped <= 0.0031308 ? clamped * 12.92 : 1.055 * clamped ** (1 / 2.4) - 0.055;
+    return Math.round(scaled * 255);
+}
+
+function signPow(value, exponent) {
+    return Math.sign(value) * Math.abs(value) ** exponent;
+}
+
+/**
+ * Декодирует BlurHash в пиксели RGBA размером `width`×`height`.
+ */
+export function decodeBlurHash(hash, width, height) {
+    const sizeFlag = decodeBase83(hash[0]);
+    const componentsX = (sizeFlag % 9) + 1;
+    const componentsY = Math.floor(sizeFlag / 9) + 1;
+    if (hash.length !== 4 + 2 * componentsX * componentsY) throw new Error('Invalid BlurHash');
+
+    const maxValue = (decodeBase83(hash[1]) + 1) / 166;
+    const colors = [];
+    const dc = decodeBase83(hash.slice(2, 6));
+    colors.push([srgbToLinear(dc >> 16), srgbToLinear((dc >> 8) & 255), srgbToLinear(dc & 255)]);
+    for (let index = 1; index < componentsX * componentsY; index += 1) {
+        const ac = decodeBase83(hash.slice(4 + index * 2, 6 + index * 2));
+        colors.push([
+            signPow((Math.floor(ac / 361) - 9) / 9, 2) * maxValue,
+            signPow((Math.floor(ac / 19) % 19 - 9) / 9, 2) * maxValue,
+            signPow((ac % 19 - 9) / 9, 2) * maxValue,
+        ]);
+    }
+
+    const pixels = new Uint8ClampedArray(width * height * 4);
+    for (let y = 0; y < height; y += 1) {
+        for (let x = 0; x < width; x += 1) {
+            let red = 0;
+            let green = 0;
+            let blue = 0;
+            for (let j = 0; j < componentsY; j += 1) {
+                const basisY = Math.cos((Math.PI * y * j) / height);
+                for (let i = 0; i < componentsX; i += 1) {
+                    const basis = Math.cos((Math.PI * x * i) / width) * basisY;
+                    const color = colors[i + j * componentsX];
+                    red += color[0] * basis;
+                    green += color[1] * basis;
+                    blue += color[2] * basis;
+                }
+            }
+            const offset = 4 * (x + y * width);
+            pixels[offset] = linearToSrgb(red);
+            pixels[offset + 1] = linearToSrgb(green);
+            pixels[offset + 2] = linearToSrgb(blue);
+            pixels[offset + 3] = 255;
+        }
+    }
+    return pixels;
+}
+
+/**
+ * Рисует BlurHash фоном изображения `img[data-blurhash]`, пока не загрузится само изображение.
+ */
+export function applyBlurHashPlaceholder(img) {
+    const hash = img?.dataset.blurhash;
+    if (!hash || img.complete) return;
+
+    try {
+        const canvas = document.createElement('canvas');
+        canvas.width = PLACEHOLDER_SIZE;
+        canvas.height = PLACEHOLDER_SIZE;
+        const context = canvas.getContext('2d');
+        const imageData = context.createImageData(PLACEHOLDER_SIZE, PLACEHOLDER_SIZE);
+        imageData.data.set(decodeBlurHash(hash, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE));
+        context.putImageData(imageData, 0, 0);
+
+        img.style.backgroundImage = `url(${canvas.toDataURL()})`;
+        img.style.backgroundSize = 'cover';
+        img.addEventListener('load', () => {
+            img.style.backgroundImage = '';
+        }, { once: true });
+    } catch (error) {
+        console.warn('BlurHash decode error:', error);
+    }
+}
+
+/**
+ * Применяет BlurHash-превью ко всем изображениям с `data-blurhash` внутри `root`.
+ */
+export function applyBlurHashPlaceholders(root = document) {
+    root.querySelectorAll('img[data-blurhash]').forEach(applyBlurHashPlaceholder);
+}
@@ -4,6 +4,7 @@
  */
 
 import { bindPaletteActions } from './actions.js';
+import { applyBlurHashPlaceholders } from './blurhash.js';
 import { collectPaletteElements, hasPalettePageElements } from './dom.js';
 import { createMarkerController } from './markers.js';
 import { createPaletteState } from './state.js';
@@ -19,6 +20,8 @@ export function initPalettePage() {
         return;
     }
 
+    applyBlurHashPlaceholders(elements.recentUploadsRow || document);
+
     const state = createPaletteState();
     const markerController = createMarkerController({ elements, state });
     const paletteView = createPaletteView({ elements, state, markerController });
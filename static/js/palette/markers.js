@@ -367,6 +367,7 @@ export function createMarkerController({ elements, state }) {
             markerButton.style.left = `${position.x * 100}%`;
             markerButton.style.top = `${position.y * 100}%`;
             markerButton.style.backgroundColor = state.currentColors[index] || '#000000';
+            markerButton.classList.toggle('locked', state.lockedIndices.has(index));
             markerButton.setAttribute(
                 'aria-label',
                 t('color_marker_label', 'Маркер цвета {index}', { index: index + 1 })
@@ -381,6 +382,8 @@ export function createMarkerController({ elements, state }) {
                 markerButton.classList.add('dragging');
 
                 rebuildSampleCanvas();
+                // Цвет, выбранный пользователем вручную, сохраняется при пересчёте палитры
+                setMarkerLocked(index, true);
                 moveMarkerFromClient(index, event.clientX, event.clientY, true);
 
                 window.addEventListener('pointermove', handleMarkerPointerMove);
@@ -393,6 +396,11 @@ export function createMarkerController({ elements, state }) {
                 setActiveMarker(index);
             });
 
+            markerButton.addEventListener('dblclick', (event) => {
+                event.preventDefault();
+                setMarkerLocked(index, !state.lockedIndices.has(index));
+            });
+
             elements.markerLayer.appendChild(markerButton);
             state.markerElements.push(markerButton);
         });
@@ -404,7 +412,7 @@ export function createMarkerController({ elements, state }) {
         }
     }
 
-    function resetMarkersForPalette(forceReset = false) {
+    function resetMarkersForPalette(forceReset = false, preservedPositions = null) {
         if (!Array.isArray(state.currentColors) || state.currentColors.length === 0) {
             clearMarkers();
             return;
@@ -417,10 +425,32 @@ export function createMarkerController({ elements, state }) {
             state.activeMarkerIndex = state.markerPositions.length ? 0 : -1;
         }
 
+        // Закреплённые маркеры остаются там, куда их поставил пользователь
+        if (preservedPositions) {
+            preservedPositions.forEach((position, index) => {
+                if (position && index < state.markerPositions.length) {
+                    state.markerPositions[index] = position;
+                }
+            });
+        }
+
         renderMarkers();
         updateActiveLoupe();
     }
 
+    function setMarkerLocked(index, locked) {
+        if (locked) {
+            state.lockedIndices.add(index);
+        } else {
+            state.lockedIndices.delete(index);
+        }
+
+        const markerElement = state.markerElements[index];
+        if (markerElement) {
+            markerElement.classList.toggle('locked', locked);
+        }
+    }
+
     function setMarkerColor(index, color) {
         const markerElement = state.markerElements[index];
         if (markerElement) {
@@ -440,6 +470,7 @@ export function createMarkerController({ elements, state }) {
         setActiveMarker,
         clearMarkers,
         resetMarkersForPalette,
+        setMarkerLocked,
         setMarkerColor,
     };
 }
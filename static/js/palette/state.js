@@ -6,7 +6,10 @@
 export function createPaletteState() {
     return {
         currentImageFile: null,
+        currentFilename: null,
         currentColors: [],
+        palettesByCount: null,
+        lockedIndices: new Set(),
         paletteControls: [],
         markerPositions: [],
         markerElements: [],
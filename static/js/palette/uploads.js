@@ -3,12 +3,16 @@
  * Назначение: Модуль клиентской логики страницы извлечения и редактирования палитры.
  */
 
+import { reanalyzeUpload, waitForExtractionJob } from './api.js';
+import { applyBlurHashPlaceholder } from './blurhash.js';
 import { showToast } from './utils.js';
 import { withCsrfHeaders } from '../security/csrf.js';
 
 const t = window.t || ((key, fallback) => fallback || key);
 const currentLang = (window.currentLang || 'en').toLowerCase();
 const dateLocale = currentLang === 'ru' ? 'ru-RU' : 'en-US';
+// Крупные файлы обрабатываются фоновой задачей, чтобы не упираться в таймаут прокси
+const ASYNC_UPLOAD_MIN_BYTES = 4 * 1024 * 1024;
 
 /**
  * Выполняет операцию `createUploadController` для соответствующего сценария интерфейса.
@@ -45,6 +49,11 @@ export function createUploadController({ elements, state, paletteView, markerCon
 
             const formData = new FormData();
             formData.append('image', file);
+            formData.append('color_count', elements.colorCountSelect?.value || '5');
+            formData.append('all_counts', '1');
+            if (file.size >= ASYNC_UPLOAD_MIN_BYTES) {
+                formData.append('async', '1');
+            }
 
             const response = await fetch('/api/upload', {
                 method: 'POST',
@@ -54,17 +63,22 @@ export function createUploadController({ elements, state, paletteView, markerCon
 
             if (!response.ok) throw new Error(t('upload_error', 'Ошибка загрузки изображения'));
 
-            const data = await response.json();
+            let data = await response.json();
+            if (response.status === 202 && data.job_id) {
+                data = await waitForExtractionJob(data.job_id);
+            }
 
             if (data.success) {
+                state.currentFilename = data.filename;
                 state.currentColors = data.palette;
+                paletteView.setPalettesByCount(data.palettes);
                 paletteView.displayPalette(state.currentColors);
                 paletteView.showResults();
 
                 localStorage.setItem('lastImageFilename', data.filename);
                 localStorage.setItem('lastPalette', JSON.stringify(state.currentColors));
 
-                addRecentUploadCard(data.filename);
+                addRecentUploadCard(data.filename, data.thumbnail, data.placeholder);
             } else {
                 alert(data.error || t('analyze_error', 'Ошибка при анализе изображения'));
             }
@@ -79,24 +93,44 @@ export function createUploadController({ elements, state, paletteView, markerCon
     async function useExistingUpload(filename) {
         if (!filename) return;
 
+        paletteView.showLoading(true);
+
         try {
-            const response = await fetch(`/static/uploads/${filename}`);
-            if (!response.ok) {
-                showToast(t('saved_image_load_error', 'Не удалось загрузить сохранённое изображение'), 'error');
+            // Сервер пересчитывает палитру по сохранённой гистограмме: без скачивания и повторной загрузки файла
+            const { ok, data } = await reanalyzeUpload({
+                filename,
+                colorCount: elements.colorCountSelect?.value,
+            });
+            if (!ok) {
+                showToast(data.error || t('saved_image_load_error', 'Не удалось загрузить сохранённое изображение'), 'error');
                 return;
             }
 
-            const blob = await response.blob();
-            const file = new File([blob], filename, { type: blob.type || 'image/png' });
+            const imageUrl = `/static/uploads/${data.filename}`;
+            state.currentImageFile = null;
+            state.currentFilename = data.filename;
+            markerController.clearMarkers();
+
+            elements.imagePreview.src = imageUrl;
+            elements.imagePreview.style.display = 'block';
+
+            state.currentColors = data.palette;
+            paletteView.setPalettesByCount(data.palettes);
+            paletteView.displayPalette(state.currentColors);
+            paletteView.showResults();
 
-            await handleImageFile(file);
+            localStorage.setItem('lastImageFilename', data.filename);
+            localStorage.setItem('lastPalette', JSON.stringify(state.currentColors));
+            localStorage.setItem('lastImageDataURL', imageUrl);
         } catch (error) {
             console.error('Use existing upload error:', error);
             showToast(t('saved_image_use_error', 'Произошла ошибка при использовании сохранённого изображения'), 'error');
+        } finally {
+            paletteView.showLoading(false);
         }
     }
 
-    function addRecentUploadCard(filename) {
+    function addRecentUploadCard(filename, thumbnail, placeholder) {
         if (!elements.recentUploadsSection || !elements.recentUploadsRow || !filename) return;
 
         if (elements.recentUploadsEmpty) {
@@ -118,8 +152,9 @@ export function createUploadController({ elements, state, paletteView, markerCon
         col.innerHTML = `
             <div class="card h-100 shadow-sm">
                 <div class="ratio ratio-4x3">
-                    <img src="/static/uploads/${filename}"
+                    <img src="/static/uploads/${thumbnail || filename}"
                          class="card-img-top object-fit-cover"
+                         loading="lazy"
                          alt="${t('recent_image_alt', 'Недавнее изображение')}">
                 </div>
                 <div class="card-body p-2">
@@ -135,6 +170,12 @@ export function createUploadController({ elements, state, paletteView, markerCon
             </div>
         `;
 
+        const image = col.querySelector('img');
+        if (placeholder) {
+            image.dataset.blurhash = placeholder;
+            applyBlurHashPlaceholder(image);
+        }
+
         if (elements.recentUploadsRow.firstChild) {
             elements.recentUploadsRow.insertBefore(col, elements.recentUploadsRow.firstChild);
         } else {
@@ -146,12 +187,15 @@ export function createUploadController({ elements, state, paletteView, markerCon
         const savedFilename = localStorage.getItem('lastImageFilename');
         const savedPalette = localStorage.getItem('lastPalette');
         const savedImageDataURL = localStorage.getItem('lastImageDataURL');
+        const savedPalettes = localStorage.getItem('lastPalettes');
 
         if (!savedFilename || !savedPalette || !savedImageDataURL) return;
 
         try {
             const palette = JSON.parse(savedPalette);
+            state.currentFilename = savedFilename;
             state.currentColors = palette;
+            state.palettesByCount = savedPalettes ? JSON.parse(savedPalettes) : null;
             paletteView.displayPalette(palette);
 
             elements.imagePreview.src = savedImageDataURL;
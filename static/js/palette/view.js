@@ -42,9 +42,14 @@ export function createPaletteView({ elements, state, markerController }) {
         return true;
     }
 
-    function displayPalette(colors) {
+    /**
+     * Отрисовывает палитру. `options.locked` – индексы закреплённых цветов,
+     * `options.preservedPositions` – Map индекс → позиция маркера, которую нужно сохранить.
+     */
+    function displayPalette(colors, options = {}) {
         elements.colorPalette.innerHTML = '';
         state.paletteControls = [];
+        state.lockedIndices = new Set(options.locked || []);
 
         if (!Array.isArray(colors) || colors.length === 0) {
             state.currentColors = [];
@@ -54,7 +59,7 @@ export function createPaletteView({ elements, state, markerController }) {
         }
 
         state.currentColors = colors.map(color => normalizeHexColor(color) || '#000000');
-        markerController.resetMarkersForPalette(true);
+        markerController.resetMarkersForPalette(true, options.preservedPositions || null);
 
         state.currentColors.forEach((color, index) => {
             const item = document.createElement('div');
@@ -76,6 +81,7 @@ export function createPaletteView({ elements, state, markerController }) {
             preview.addEventListener('click', () => copyToClipboard(state.currentColors[index]));
 
             picker.addEventListener('input', () => {
+                markerController.setMarkerLocked(index, true);
                 setColorAtIndex(index, picker.value);
             });
 
@@ -83,6 +89,7 @@ export function createPaletteView({ elements, state, markerController }) {
                 hexInput.value = hexInput.value.toUpperCase();
                 const normalized = normalizeHexColor(hexInput.value);
                 if (normalized) {
+                    markerController.setMarkerLocked(index, true);
                     setColorAtIndex(index, normalized);
                 }
             });
@@ -105,6 +112,27 @@ export function createPaletteView({ elements, state, markerController }) {
         markerController.updateActiveLoupe();
     }
 
+    function setPalettesByCount(palettes) {
+        state.palettesByCount = palettes && typeof palettes === 'object' ? palettes : null;
+        if (state.palettesByCount) {
+            localStorage.setItem('lastPalettes', JSON.stringify(state.palettesByCount));
+        } else {
+            localStorage.removeItem('lastPalettes');
+        }
+    }
+
+    /**
+     * Показывает палитру нужного размера из полученного с сервера набора; `false`, если её нет.
+     */
+    function displayCachedPalette(colorCount) {
+        const palette = state.palettesByCount?.[String(colorCount)];
+        if (!Array.isArray(palette) || palette.length === 0) {
+            return false;
+        }
+        displayPalette([...palette]);
+        return true;
+    }
+
     function showLoading(show) {
         if (show) {
             elements.loadingIndicator.classList.remove('d-none');
@@ -122,7 +150,10 @@ export function createPaletteView({ elements, state, markerController }) {
 
     function resetForNewUpload() {
         state.currentImageFile = null;
+        state.currentFilename = null;
         state.currentColors = [];
+        state.palettesByCount = null;
+        state.lockedIndices = new Set();
         state.paletteControls = [];
         markerController.clearMarkers();
 
@@ -134,6 +165,7 @@ export function createPaletteView({ elements, state, markerController }) {
 
         localStorage.removeItem('lastImageFilename');
         localStorage.removeItem('lastPalette');
+        localStorage.removeItem('lastPalettes');
         localStorage.removeItem('lastImageDataURL');
 
         elements.uploadZone.scrollIntoView({ behavior: 'smooth' });
@@ -143,6 +175,8 @@ export function createPaletteView({ elements, state, markerController }) {
     return {
         setColorAtIndex,
         displayPalette,
+        setPalettesByCount,
+        displayCachedPalette,
         showLoading,
         showResults,
         resetForNewUpload,
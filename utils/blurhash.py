@@ -0,0 +1,88 @@
+"""
+Модуль: `utils/blurhash.py`.
+Назначение: Кодирование BlurHash – строки из ~30 символов, по которой клиент рисует размытое превью.
+
+Строка считается по уже уменьшенной выборке пикселей загрузки, без повторного декодирования
+файла: косинусное разложение по нескольким компонентам – два матричных умножения NumPy.
+Формат совместим с эталонными декодерами (https://blurha.sh), поэтому мобильный клиент
+использует готовую библиотеку, а веб-страница – `static/js/palette/blurhash.js`.
+"""
+
+import numpy as np
+
+_BASE83_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+# Повороты/отражения кадра по тегу EXIF Orientation (2–8), применяемые к сетке (H, W, 3)
+_ORIENTATION_TRANSFORMS = {
+    2: lambda grid: grid[:, ::-1],
+    3: lambda grid: grid[::-1, ::-1],
+    4: lambda grid: grid[::-1],
+    5: lambda grid: grid.transpose(1, 0, 2),
+    6: lambda grid: np.rot90(grid, -1),
+    7: lambda grid: np.rot90(grid, 1)[::-1],
+    8: lambda grid: np.rot90(grid, 1),
+}
+
+
+def _base83(value: int, length: int) -> str:
+    """Служебная функция `_base83` для внутренней логики модуля."""
+    return "".join(_BASE83_ALPHABET[(value // 83 ** (length - 1 - i)) % 83] for i in range(length))
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    """Служебная функция `_srgb_to_linear` для внутренней логики модуля."""
+    scaled = values.astype(np.float64) / 255.0
+    return np.where(scaled <= 0.04045, scaled / 12.92, ((scaled + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    """Служебная функция `_linear_to_srgb` для внутренней логики модуля."""
+    value = min(1.0, max(0.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def orient_grid(grid: np.ndarray, orientation: int | None) -> np.ndarray:
+    """Поворачивает сетку пикселей (H, W, 3) так, как кадр показывается с учётом EXIF."""
+    transform = _ORIENTATION_TRANSFORMS.get(orientation or 1)
+    return transform(grid) if transform else grid
+
+
+def encode_blurhash(grid: np.ndarray, components: tuple[int, int] | None = None) -> str:
+    """Кодирует сетку пикселей (H, W, 3) uint8 в BlurHash.
+
+    По умолчанию 4×3 компоненты (3×4 для портретных кадров) – строка из 28 символов.
+    """
+    height, width = grid.shape[:2]
+    if components is None:
+        components = (4, 3) if width >= height else (3, 4)
+    components_x, components_y = components
+
+    linear = _srgb_to_linear(grid)
+    basis_x = np.cos(np.pi * np.outer(np.arange(components_x), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(components_y), np.arange(height)) / height)
+    # factors[j, i, c] = Σ_y Σ_x basis_y[j, y] · basis_x[i, x] · linear[y, x, c]
+    factors = np.einsum("jy,yxc,ix->jic", basis_y, linear, basis_x, optimize=True) / (width * height)
+    factors[1:] *= 2.0
+    factors[0, 1:] *= 2.0
+    factors = factors.reshape(-1, 3)
+
+    dc, ac = factors[0], factors[1:]
+    parts = [_base83((components_x - 1) + (components_y - 1) * 9, 1)]
+    if len(ac):
+        quantised_max = int(min(82.0, max(0.0, np.abs(ac).max() * 166 - 0.5)))
+        max_value = (quantised_max + 1) / 166
+        parts.append(_base83(quantised_max, 1))
+    else:
+        max_value = 1.0
+        parts.append(_base83(0, 1))
+
+    red, green, blue = (_linear_to_srgb(channel) for channel in dc)
+    parts.append(_base83((red << 16) + (green << 8) + blue, 4))
+
+    normalized = ac / max_value
+    quantised = np.clip(np.floor(np.sign(normalized) * np.sqrt(np.abs(normalized)) * 9 + 9.5), 0, 18).astype(int)
+    for q_red, q_green, q_blue in quantised:
+        parts.append(_base83(int(q_red) * 361 + int(q_green) * 19 + int(q_blue), 2))
+    return "".join(parts)
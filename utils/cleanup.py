@@ -1,29 +1,329 @@
 """
 Модуль: `utils/cleanup.py`.
 Назначение: Очистка устаревших пользовательских загрузок и связанных записей.
+
+Записи удаляются пачками по `batch_size`, каждая пачка – отдельная короткая транзакция,
+поэтому таблица `upload` не блокируется надолго. Файлы удаляются после коммита пачки.
+Сверка с диском (`os.scandir`) находит файлы без записей и записи без файлов. Свежие файлы
+не трогаются (`orphan_grace_seconds`): загрузка пишет файл раньше, чем коммитит запись.
+Все этапы укладываются в бюджет времени; незавершённую очистку продолжит следующий запуск:
+статистика прерванного запуска содержит `resume` – последний проверенный id записи,
+каталог хранилища или каталог гистограмм, – и с ним сверка начинается с места остановки.
+Записи проверяются по хранилищу один раз: `rows_checked_until` – наибольший id, сверенный
+завершёнными проходами, следующий круг начинает с него (для S3 каждая проверка – запрос HEAD).
+Гистограммы цветов и кэш палитр содержимого, файла которого больше нет, тоже удаляются.
 """
 
 import os
+import re
+import time
 from datetime import datetime, timedelta
+
+from flask import current_app
+
 from extensions import db
+from models.extraction_job import ExtractionJob
 from models.upload import Upload
+from models.upload_blob import UploadBlob
+from utils.palette_extraction import forget_upload_digest
+from utils.storage import get_upload_storage
+from utils.upload_derivatives import master_name
+from utils.upload_pipeline import incoming_folder
+from utils.upload_storage import delete_released_files, release_upload_blobs
 
-UPLOAD_FOLDER = 'static/uploads'
+_SHARD_DIR_RE = re.compile(r"^[0-9a-f]{2}$")
+_BLOB_FILE_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})\.")
+_HISTOGRAM_FILE_RE = re.compile(r"^(?P<digest>[0-9a-f]{64})\.npy$")
+_LEGACY_FILE_RE = re.compile(r"^[\w-]+\.(?:jpg|jpeg|png|webp)$")
 
-def cleanup_old_uploads(days=7):
-    """Выполняет операцию `cleanup_old_uploads` в рамках сценария модуля."""
-    cutoff = datetime.utcnow() - timedelta(days=days)
 
-    old_files = Upload.query.filter(
-        Upload.created_at < cutoff
-    ).all()
+class _Budget:
+    """Служебный класс `_Budget` для внутренней логики модуля."""
 
-    for f in old_files:
-        file_path = os.path.join(UPLOAD_FOLDER, f.filename)
+    def __init__(self, seconds: float | None):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.deadline = time.monotonic() + seconds if seconds else None
 
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    @property
+    def exhausted(self) -> bool:
+        """Служебная функция `exhausted` для внутренней логики модуля."""
+        return self.deadline is not None and time.monotonic() >= self.deadline
 
-        db.session.delete(f)
 
+def _delete_uploads(upload_ids: list[int], stats: dict) -> None:
+    """Удаляет пачку загрузок одной короткой транзакцией, затем – их файлы."""
+    uploads = Upload.query.filter(Upload.id.in_(upload_ids)).all()
+    released = release_upload_blobs(uploads)
+    ExtractionJob.query.filter(ExtractionJob.upload_id.in_(upload_ids)).delete(synchronize_session=False)
+    Upload.query.filter(Upload.id.in_(upload_ids)).delete(synchronize_session=False)
     db.session.commit()
+
+    stats["files_deleted"] += delete_released_files(released)
+    stats["batches"] += 1
+
+
+def _delete_expired(cutoff: datetime, batch_size: int, budget: _Budget, stats: dict) -> bool:
+    """Служебная функция `_delete_expired` для внутренней логики модуля."""
+    while not budget.exhausted:
+        upload_ids = [
+            row.id
+            for row in Upload.query.filter(Upload.created_at < cutoff)
+            .order_by(Upload.id)
+            .with_entities(Upload.id)
+            .limit(batch_size)
+        ]
+        if not upload_ids:
+            return True
+        _delete_uploads(upload_ids, stats)
+        stats["expired_rows"] += len(upload_ids)
+    return False
+
+
+def _delete_rows_without_files(
+    cutoff: datetime, batch_size: int, budget: _Budget, stats: dict, last_id: int = 0
+) -> bool:
+    """Удаляет записи, у которых нет ни оригинала, ни мастера (id перебираются по возрастанию после `last_id`)."""
+    storage = get_upload_storage()
+    while not budget.exhausted:
+        rows = (
+            Upload.query.filter(Upload.id > last_id, Upload.created_at < cutoff)
+            .order_by(Upload.id)
+            .with_entities(Upload.id, Upload.filename)
+            .limit(batch_size)
+            .all()
+        )
+        db.session.rollback()
+        if not rows:
+            stats["rows_checked_until"] = last_id
+            return True
+        last_id = rows[-1].id
+
+        missing = []
+        for row in rows:
+            master = master_name(row.filename or "")
+            if not row.filename or not (storage.exists(row.filename) or (master and storage.exists(master))):
+                missing.append(row.id)
+        if missing:
+            _delete_uploads(missing, stats)
+            stats["rows_without_file"] += len(missing)
+    stats["resume"] = {"row_id": last_id}
+    return False
+
+
+def _is_stale(entry: os.DirEntry, cutoff_ts: float) -> bool:
+    """Служебная функция `_is_stale` для внутренней логики модуля."""
+    return entry.stat(follow_symlinks=False).st_mtime < cutoff_ts
+
+
+def _sweep_incoming(upload_folder: str, cutoff_ts: float, stats: dict) -> None:
+    """Удаляет временные файлы прерванных загрузок."""
+    incoming = incoming_folder(upload_folder)
+    if not os.path.isdir(incoming):
+        return
+    with os.scandir(incoming) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and _is_stale(entry, cutoff_ts):
+                os.remove(entry.path)
+                stats["stale_temp_files"] += 1
+
+
+def _remove_legacy_orphans(paths_by_name: dict[str, str], stats: dict) -> None:
+    """Удаляет файлы с плоскими именами, на которые не ссылается ни одна запись `Upload`."""
+    known = {
+        row.filename
+        for row in Upload.query.filter(Upload.filename.in_(list(paths_by_name))).with_entities(Upload.filename)
+    }
+    db.session.rollback()
+    for name, path in paths_by_name.items():
+        if name not in known:
+            os.remove(path)
+            stats["orphan_files"] += 1
+    paths_by_name.clear()
+
+
+def _remove_orphans(paths_by_digest: dict[str, list[str]], stats: dict) -> None:
+    """Удаляет файлы, для sha256 которых нет записи `UploadBlob`."""
+    known = {
+        row.digest
+        for row in UploadBlob.query.filter(UploadBlob.digest.in_(list(paths_by_digest))).with_entities(UploadBlob.digest)
+    }
+    db.session.rollback()
+    for digest, paths in paths_by_digest.items():
+        if digest in known:
+            continue
+        for path in paths:
+            os.remove(path)
+            stats["orphan_files"] += 1
+    paths_by_digest.clear()
+
+
+def _sweep_orphan_files(
+    root: str, cutoff_ts: float, batch_size: int, budget: _Budget, stats: dict, after_shard: str | None = None
+) -> bool:
+    """Обходит локальное хранилище (`ab/cd/` и старые плоские файлы), удаляя давние файлы без записей.
+
+    С `after_shard` (`ab/cd`) обход продолжается с каталога, следующего за ним; плоские файлы
+    в этом случае уже проверены прерванным запуском.
+    """
+    legacy: dict[str, str] = {}
+    shard_dirs = []
+    with os.scandir(root) as top_entries:
+        for entry in top_entries:
+            if entry.is_dir(follow_symlinks=False) and _SHARD_DIR_RE.match(entry.name):
+                shard_dirs.append(entry.name)
+            elif (
+                after_shard is None
+                and entry.is_file(follow_symlinks=False)
+                and _LEGACY_FILE_RE.match(entry.name)
+                and _is_stale(entry, cutoff_ts)
+            ):
+                stats["files_scanned"] += 1
+                legacy[entry.name] = entry.path
+                if len(legacy) >= batch_size:
+                    _remove_legacy_orphans(legacy, stats)
+    if legacy:
+        _remove_legacy_orphans(legacy, stats)
+
+    pending: dict[str, list[str]] = {}
+    last_shard = None
+    for top in sorted(name for name in shard_dirs if after_shard is None or name >= after_shard[:2]):
+        with os.scandir(os.path.join(root, top)) as sub_entries:
+            leaf_names = sorted(entry.name for entry in sub_entries if entry.is_dir() and _SHARD_DIR_RE.match(entry.name))
+        for leaf_name in leaf_names:
+            shard = f"{top}/{leaf_name}"
+            if after_shard is not None and shard <= after_shard:
+                continue
+            if budget.exhausted:
+                if pending:
+                    _remove_orphans(pending, stats)
+                stats["resume"] = {"shard": last_shard or after_shard}
+                return False
+            with os.scandir(os.path.join(root, top, leaf_name)) as entries:
+                for entry in entries:
+                    match = _BLOB_FILE_RE.match(entry.name)
+                    if match is None or not entry.is_file(follow_symlinks=False) or not _is_stale(entry, cutoff_ts):
+                        continue
+                    stats["files_scanned"] += 1
+                    pending.setdefault(match["digest"], []).append(entry.path)
+            last_shard = shard
+            if len(pending) >= batch_size:
+                _remove_orphans(pending, stats)
+    if pending:
+        _remove_orphans(pending, stats)
+    return True
+
+
+def _remove_orphan_histograms(digests: set[str], stats: dict) -> None:
+    """Удаляет гистограммы и кэш палитр содержимого, на которое не ссылается ни одна запись."""
+    candidates = list(digests)
+    known = {
+        row.digest
+        for row in UploadBlob.query.filter(UploadBlob.digest.in_(candidates)).with_entities(UploadBlob.digest)
+    }
+    # У загрузок, сделанных до хранилища по хешам, записи `UploadBlob` нет
+    known.update(
+        row.content_hash
+        for row in Upload.query.filter(Upload.content_hash.in_(candidates)).with_entities(Upload.content_hash)
+    )
+    db.session.rollback()
+    for digest in digests - known:
+        forget_upload_digest(digest)
+        stats["orphan_histograms"] += 1
+    digests.clear()
+
+
+def _sweep_orphan_histograms(
+    folder: str, cutoff_ts: float, batch_size: int, budget: _Budget, stats: dict, after_shard: str | None = None
+) -> bool:
+    """Обходит каталог гистограмм (`ab/<sha256>.npy`), удаляя давние гистограммы без записей."""
+    with os.scandir(folder) as top_entries:
+        shards = sorted(
+            entry.name for entry in top_entries if entry.is_dir(follow_symlinks=False) and _SHARD_DIR_RE.match(entry.name)
+        )
+
+    pending: set[str] = set()
+    last_shard = None
+    for shard in shards:
+        if after_shard is not None and shard <= after_shard:
+            continue
+        if budget.exhausted:
+            if pending:
+                _remove_orphan_histograms(pending, stats)
+            stats["resume"] = {"histogram_shard": last_shard or after_shard}
+            return False
+        with os.scandir(os.path.join(folder, shard)) as entries:
+            for entry in entries:
+                match = _HISTOGRAM_FILE_RE.match(entry.name)
+                if match is not None and entry.is_file(follow_symlinks=False) and _is_stale(entry, cutoff_ts):
+                    pending.add(match["digest"])
+        last_shard = shard
+        if len(pending) >= batch_size:
+            _remove_orphan_histograms(pending, stats)
+    if pending:
+        _remove_orphan_histograms(pending, stats)
+    return True
+
+
+def cleanup_old_uploads(
+    days=7,
+    batch_size: int = 500,
+    time_budget: float | None = None,
+    sweep_orphans: bool = True,
+    orphan_grace_seconds: int = 3600,
+    resume: dict | None = None,
+    rows_checked_until: int = 0,
+) -> dict:
+    """Удаляет загрузки старше `days` дней и сверяет хранилище с БД; возвращает статистику.
+
+    `complete=False` в статистике – бюджет времени `time_budget` (с) исчерпан раньше конца;
+    тогда `resume` – место остановки сверки, его можно передать следующему запуску.
+    Записи с id не больше `rows_checked_until` по хранилищу не проверяются; новое значение –
+    в `rows_checked_until` статистики.
+    """
+    resume = resume or {}
+    budget = _Budget(time_budget)
+    stats = {
+        "expired_rows": 0,
+        "rows_without_file": 0,
+        "files_deleted": 0,
+        "orphan_files": 0,
+        "stale_temp_files": 0,
+        "orphan_histograms": 0,
+        "files_scanned": 0,
+        "batches": 0,
+        "complete": False,
+        # Пока этап сверки не пройден, место остановки остаётся прежним
+        "resume": resume or None,
+        "rows_checked_until": rows_checked_until,
+    }
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    if not _delete_expired(cutoff, batch_size, budget, stats):
+        return stats
+
+    if sweep_orphans:
+        grace_cutoff = datetime.utcnow() - timedelta(seconds=orphan_grace_seconds)
+        # Прерванный обход хранилища или гистограмм означает, что записи в этом круге уже сверены
+        storage_swept = "histogram_shard" in resume
+        if not storage_swept and "shard" not in resume and not _delete_rows_without_files(
+            grace_cutoff, batch_size, budget, stats, max(resume.get("row_id", 0), rows_checked_until)
+        ):
+            return stats
+
+        cutoff_ts = time.time() - orphan_grace_seconds
+        _sweep_incoming(current_app.config["UPLOAD_FOLDER"], cutoff_ts, stats)
+        # Обход каталогов возможен только для локального хранилища
+        root = get_upload_storage().local_path("")
+        if not storage_swept and root is not None and os.path.isdir(root):
+            if not _sweep_orphan_files(root, cutoff_ts, batch_size, budget, stats, resume.get("shard")):
+                return stats
+
+        histograms = current_app.config["HISTOGRAM_FOLDER"]
+        if histograms and os.path.isdir(histograms):
+            if not _sweep_orphan_histograms(
+                histograms, cutoff_ts, batch_size, budget, stats, resume.get("histogram_shard")
+            ):
+                return stats
+
+    stats["complete"] = True
+    stats["resume"] = None
+    return stats
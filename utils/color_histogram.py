@@ -0,0 +1,83 @@
+"""
+Модуль: `utils/color_histogram.py`.
+Назначение: Компактная гистограмма цветов загрузки для повторной кластеризации без декодирования.
+
+Гистограмма – массив uint32 из 32768 бинов (5 бит на канал, 128 КБ), сохраняется в `.npy`
+по sha256 содержимого изображения и читается через memory-map.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+HISTOGRAM_BITS = 5
+HISTOGRAM_BINS = 1 << (3 * HISTOGRAM_BITS)
+_SHIFT = 8 - HISTOGRAM_BITS
+_MASK = (1 << HISTOGRAM_BITS) - 1
+
+
+def build_histogram(pixels: np.ndarray) -> np.ndarray:
+    """Строит гистограмму по массиву пикселей (N, 3) uint8."""
+    quantized = pixels.astype(np.uint32, copy=False) >> _SHIFT
+    bins = (
+        (quantized[:, 0] << (2 * HISTOGRAM_BITS))
+        | (quantized[:, 1] << HISTOGRAM_BITS)
+        | quantized[:, 2]
+    )
+    return np.bincount(bins, minlength=HISTOGRAM_BINS).astype(np.uint32)
+
+
+def histogram_colors(histogram: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Возвращает центры непустых бинов (M, 3) и их веса."""
+    bins = np.flatnonzero(histogram)
+    channels = np.stack(
+        [
+            (bins >> (2 * HISTOGRAM_BITS)) & _MASK,
+            (bins >> HISTOGRAM_BITS) & _MASK,
+            bins & _MASK,
+        ],
+        axis=1,
+    )
+    colors = (channels << _SHIFT) + (1 << (_SHIFT - 1))
+    return colors.astype(np.float32), np.asarray(histogram[bins], dtype=np.float64)
+
+
+def histogram_path(folder: str, digest: str) -> str:
+    """Путь к файлу гистограммы для хеша содержимого."""
+    return os.path.join(folder, digest[:2], f"{digest}.npy")
+
+
+def save_histogram(path: str, histogram: np.ndarray) -> None:
+    """Атомарно сохраняет гистограмму (через временный файл)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, np.asarray(histogram, dtype=np.uint32))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def delete_histogram(path: str) -> bool:
+    """Удаляет файл гистограммы; отсутствие файла ошибкой не считается."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def load_histogram(path: str) -> np.ndarray | None:
+    """Открывает гистограмму через memory-map; `None`, если файла нет или он повреждён."""
+    try:
+        histogram = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if histogram.shape != (HISTOGRAM_BINS,) or histogram.dtype != np.uint32:
+        return None
+    return histogram
@@ -0,0 +1,159 @@
+"""
+Модуль: `utils/compute_pool.py`.
+Назначение: Ограниченный пул процессов для CPU-тяжёлых задач (извлечение палитры, рендер PNG).
+
+Задачи уходят из потоков gunicorn в отдельные процессы: они не держат GIL веб-воркера,
+а число потоков BLAS/OpenMP в каждом процессе ограничивается через threadpoolctl.
+Очередь ограничена: если в работе и ожидании уже `queue_max` задач, `submit`
+сразу бросает `ComputePoolBusy`, и маршрут отвечает 503 с заголовком Retry-After.
+При `workers=0` задачи выполняются в потоке запроса (режим разработки).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from flask import current_app, has_app_context
+
+# Переменные окружения, которые читают OpenBLAS/MKL/OpenMP при загрузке
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+class ComputePoolBusy(Exception):
+    """Очередь вычислений заполнена; клиенту стоит повторить запрос через `retry_after` секунд."""
+
+    def __init__(self, retry_after: int):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        super().__init__("compute queue is full")
+        self.retry_after = retry_after
+
+
+def _init_worker(task_threads: int) -> None:
+    """Инициализатор процесса пула: ограничивает нативные пулы потоков."""
+    for name in _THREAD_ENV_VARS:
+        os.environ[name] = str(task_threads)
+
+    from threadpoolctl import threadpool_limits
+
+    # Без контекстного менеджера ограничение действует до конца жизни процесса
+    threadpool_limits(limits=task_threads)
+
+
+class ComputePool:
+    """Пул процессов с ограниченной очередью и ленивым запуском."""
+
+    def __init__(
+        self,
+        workers: int,
+        queue_max: int,
+        task_threads: int = 1,
+        retry_after_seconds: int = 5,
+        task_timeout_seconds: float | None = None,
+    ):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.workers = max(0, workers)
+        self.queue_max = max(1, queue_max)
+        self.task_threads = max(1, task_threads)
+        self.retry_after_seconds = max(1, retry_after_seconds)
+        self.task_timeout_seconds = task_timeout_seconds or None
+        self._slots = threading.BoundedSemaphore(self.queue_max)
+        self._lock = threading.Lock()
+        self._executor: ProcessPoolExecutor | None = None
+        self._owner_pid: int | None = None
+        self._stats = {"submitted": 0, "rejected": 0, "in_flight": 0, "restarts": 0}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Создаёт процессы при первой задаче (и заново после fork или падения пула)."""
+        with self._lock:
+            if self._executor is None or self._owner_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.task_threads,),
+                )
+                self._owner_pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self, broken: ProcessPoolExecutor) -> None:
+        """Служебная функция `_reset_executor` для внутренней логики модуля."""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self._stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None) -> None:
+        """Служебная функция `_release` для внутренней логики модуля."""
+        with self._lock:
+            self._stats["in_flight"] -= 1
+        self._slots.release()
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Выполняет `fn(*args)` в пуле и возвращает результат; при полной очереди – `ComputePoolBusy`.
+
+        `fn` и аргументы должны сериализоваться через pickle (функции уровня модуля).
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise ComputePoolBusy(self.retry_after_seconds)
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["in_flight"] += 1
+
+        if self.workers == 0:
+            try:
+                return fn(*args)
+            finally:
+                self._release()
+
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except Exception as exc:
+            self._release()
+            if isinstance(exc, BrokenProcessPool):
+                self._reset_executor(executor)
+            raise
+        # Слот освобождается, когда задача действительно завершилась (даже после таймаута ожидания)
+        future.add_done_callback(self._release)
+
+        try:
+            return future.result(timeout=self.task_timeout_seconds)
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+
+    def stats(self) -> dict:
+        """Счётчики пула текущего процесса."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["queue_max"] = self.queue_max
+        return stats
+
+    def shutdown(self) -> None:
+        """Останавливает процессы пула, отменяя ожидающие задачи."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_compute(fn: Callable[..., Any], *args: Any) -> Any:
+    """Выполняет задачу в пуле приложения или, вне контекста приложения, напрямую."""
+    pool = current_app.extensions.get("compute_pool") if has_app_context() else None
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args)
@@ -0,0 +1,177 @@
+"""
+Модуль: `utils/extraction_jobs.py`.
+Назначение: Очередь задач извлечения палитры в БД и цикл фонового воркера (`flask worker`).
+
+Задачи выбираются через `SELECT ... FOR UPDATE SKIP LOCKED`, поэтому несколько воркеров
+(в том числе на разных узлах) не берут одну задачу дважды. Задача, зависшая в статусе
+`running` дольше `JOB_STALE_SECONDS` (воркер упал), возвращается в работу, пока не
+исчерпан лимит попыток `JOB_MAX_ATTEMPTS`. Так же, не раньше чем через `JOB_RETRY_DELAY_SECONDS`,
+повторяется задача, прерванная временным сбоем: ошибкой ввода-вывода или хранилища,
+переполненным пулом вычислений, потерей соединения с БД. Остальные ошибки (изображение
+удалено или не декодируется) завершают задачу статусом `failed` сразу; такую задачу
+клиент ставит заново.
+"""
+
+import time
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+from models.extraction_job import ExtractionJob
+from utils.compute_pool import ComputePoolBusy, run_compute
+from utils.palette_extraction import extract_upload_palette, upload_content_hash, upload_palette_ladder
+from utils.storage import get_upload_storage
+from utils.upload_derivatives import upload_source_key
+from utils.upload_pipeline import decode_upload_task
+
+# Сообщения об ошибках хранятся как msgid и переводятся при выдаче клиенту
+JOB_ERROR_IMAGE_MISSING = "Изображение больше недоступно"
+JOB_ERROR_EXTRACT_FAILED = "Не удалось извлечь цвета из изображения"
+
+# Ошибки, после которых задача возвращается в очередь (FileNotFoundError обрабатывается раньше)
+_TRANSIENT_ERRORS = (OSError, ComputePoolBusy, BrokenProcessPool, OperationalError)
+
+
+def enqueue_extraction(upload, color_count: int, engine: str, all_counts: bool) -> ExtractionJob:
+    """Добавляет задачу в сессию (коммит – на стороне вызывающего кода)."""
+    job = ExtractionJob(
+        upload=upload,
+        color_count=color_count,
+        engine=engine,
+        all_counts=all_counts,
+        status=ExtractionJob.STATUS_QUEUED,
+    )
+    db.session.add(job)
+    return job
+
+
+def claim_next_job(
+    stale_after_seconds: int, max_attempts: int, retry_delay_seconds: int = 0
+) -> ExtractionJob | None:
+    """Забирает самую старую доступную задачу и переводит её в `running`."""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=stale_after_seconds)
+    retry_before = now - timedelta(seconds=retry_delay_seconds)
+    while True:
+        job = (
+            ExtractionJob.query.filter(
+                or_(
+                    and_(
+                        ExtractionJob.status == ExtractionJob.STATUS_QUEUED,
+                        # Возвращённая после сбоя задача ждёт паузу с начала прошлой попытки
+                        or_(ExtractionJob.started_at.is_(None), ExtractionJob.started_at < retry_before),
+                    ),
+                    and_(
+                        ExtractionJob.status == ExtractionJob.STATUS_RUNNING,
+                        ExtractionJob.started_at < stale_before,
+                    ),
+                )
+            )
+            .order_by(ExtractionJob.created_at)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            db.session.rollback()
+            return None
+
+        if job.attempts >= max_attempts:
+            job.status = ExtractionJob.STATUS_FAILED
+            job.error = JOB_ERROR_EXTRACT_FAILED
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            continue
+
+        job.status = ExtractionJob.STATUS_RUNNING
+        job.started_at = datetime.utcnow()
+        job.attempts += 1
+        db.session.commit()
+        return job
+
+
+def run_job(job: ExtractionJob, max_attempts: int = 1) -> None:
+    """Выполняет задачу и сохраняет результат или ошибку; после временного сбоя – возвращает в очередь."""
+    upload = job.upload
+    storage = get_upload_storage()
+    try:
+        # С объектным хранилищем файл скачивается во временный на время задачи
+        with storage.fetch(upload_source_key(upload)) as filepath:
+            digest = upload_content_hash(upload, filepath)
+            # Маршрут ставит задачу без декодирования: выборку и превью получает воркер
+            pixels = None
+            if upload.placeholder is None:
+                decoded = run_compute(decode_upload_task, filepath)
+                upload.placeholder = decoded.placeholder
+                pixels = decoded.pixels
+            palette = extract_upload_palette(filepath, digest, job.color_count, job.engine, pixels)
+            result = {"palette": palette}
+            if job.all_counts:
+                result["palettes"] = {**upload_palette_ladder(upload, filepath, digest), str(job.color_count): palette}
+    except FileNotFoundError:
+        db.session.rollback()
+        job.status = ExtractionJob.STATUS_FAILED
+        job.error = JOB_ERROR_IMAGE_MISSING
+    except (*_TRANSIENT_ERRORS, *storage.transient_errors):
+        db.session.rollback()
+        if job.attempts >= max_attempts:
+            current_app.logger.exception("Ошибка фонового извлечения палитры (задача %s)", job.id)
+            job.status = ExtractionJob.STATUS_FAILED
+            job.error = JOB_ERROR_EXTRACT_FAILED
+        else:
+            current_app.logger.warning(
+                "Задача %s: временный сбой, повтор (попытка %s из %s)", job.id, job.attempts, max_attempts, exc_info=True
+            )
+            job.status = ExtractionJob.STATUS_QUEUED
+            db.session.commit()
+            return
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Ошибка фонового извлечения палитры (задача %s)", job.id)
+        job.status = ExtractionJob.STATUS_FAILED
+        job.error = JOB_ERROR_EXTRACT_FAILED
+    else:
+        job.status = ExtractionJob.STATUS_DONE
+        job.result = result
+
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_worker(poll_interval: float, once: bool = False, max_jobs: int = 0) -> int:
+    """Цикл воркера: обрабатывает задачи, пока не остановлен; возвращает число выполненных."""
+    config = current_app.config
+    processed = 0
+    while True:
+        job = claim_next_job(config["JOB_STALE_SECONDS"], config["JOB_MAX_ATTEMPTS"], config["JOB_RETRY_DELAY_SECONDS"])
+        if job is None:
+            if once:
+                return processed
+            db.session.remove()
+            time.sleep(poll_interval)
+            continue
+
+        current_app.logger.info("Задача %s: извлечение палитры (попытка %s)", job.id, job.attempts)
+        run_job(job, config["JOB_MAX_ATTEMPTS"])
+        processed += 1
+        db.session.remove()
+        if max_jobs and processed >= max_jobs:
+            return processed
+
+
+def job_state(job: ExtractionJob) -> dict:
+    """Статус задачи и, если готово, результат – без ошибок и переводов (их добавляют маршруты)."""
+    upload = job.upload
+    state = {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": upload.filename if upload else None,
+        "upload_id": job.upload_id,
+        "placeholder": upload.placeholder if upload else None,
+    }
+    if job.status == ExtractionJob.STATUS_DONE and job.result:
+        state.update(job.result)
+    return state
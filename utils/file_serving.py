@@ -0,0 +1,137 @@
+"""
+Модуль: `utils/file_serving.py`.
+Назначение: Отдача файлов с диска – через nginx (`X-Accel-Redirect`) или, без прокси, самим Flask.
+
+При `X_ACCEL_REDIRECT_ENABLED` приложение только проверяет путь и возвращает пустой ответ
+с внутренним адресом файла: передачу, диапазоны (Range) и условные запросы обслуживает nginx,
+и поток gunicorn освобождается сразу. Файлы с адресацией по содержимому (`ab/cd/<sha256>...`)
+никогда не меняются, поэтому отдаются со строгим ETag и `Cache-Control: immutable`.
+nginx при `X-Accel-Redirect` выставляет свой ETag (mtime и размер), поэтому условный запрос
+с совпавшим ETag приложение обслуживает само (304 без перенаправления), а внутренний location
+nginx возвращает ETag ответа приложения (`deploy/nginx/paleta.conf`).
+Из объектного хранилища (`utils/storage.py`) файл отдаётся переадресацией на подписанную
+ссылку или, если подписи выключены, потоком через приложение.
+"""
+
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from flask import Response, abort, current_app, redirect, request, send_from_directory, stream_with_context
+from werkzeug.security import safe_join
+
+_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Путь в дереве хешей; ETag – имя без расширения (`<sha256>`, `<sha256>.thumb-240`, ...)
+_CONTENT_ADDRESSED_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/(?P<stem>[0-9a-f]{64}(?:\.[a-z0-9-]+)?)\.[a-z0-9]+$")
+
+
+def content_etag(filename: str) -> str | None:
+    """Строгий ETag файла с адресацией по содержимому или None для прочих имён."""
+    match = _CONTENT_ADDRESSED_RE.match(filename or "")
+    return match["stem"] if match else None
+
+
+def _accel_response(filename: str, internal_location: str, as_attachment: bool, download_name: str | None):
+    """Служебная функция `_accel_response` для внутренней логики модуля."""
+    response = current_app.response_class(status=200)
+    response.headers["X-Accel-Redirect"] = internal_location.rstrip("/") + "/" + quote(filename)
+    response.content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if as_attachment:
+        response.headers.set("Content-Disposition", "attachment", filename=download_name or os.path.basename(filename))
+    return response
+
+
+def _apply_cache_headers(response, etag: str | None, immutable: bool, max_age: int | None) -> None:
+    """Служебная функция `_apply_cache_headers` для внутренней логики модуля."""
+    if etag:
+        response.set_etag(etag)
+    if max_age is None:
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+
+
+def send_stored_file(
+    directory: str,
+    filename: str,
+    internal_location: str,
+    immutable: bool = False,
+    max_age: int | None = None,
+    as_attachment: bool = False,
+    download_name: str | None = None,
+):
+    """Отдаёт файл `filename` из `directory`; `internal_location` – внутренний location nginx для этого каталога.
+
+    `immutable=True` – имя однозначно определяет содержимое (кэш на год без перепроверки).
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    etag = content_etag(filename) if immutable else None
+    if immutable:
+        max_age = _IMMUTABLE_MAX_AGE
+
+    if current_app.config["X_ACCEL_REDIRECT_ENABLED"]:
+        if etag and etag in request.if_none_match:
+            # Без X-Accel-Redirect: nginx сравнил бы If-None-Match со своим ETag, а не с этим
+            response = current_app.response_class(status=304)
+            _apply_cache_headers(response, etag, immutable, max_age)
+            return response
+        # Cache-Control nginx передаёт клиенту из ответа приложения, как и при отдаче Flask
+        response = _accel_response(filename, internal_location, as_attachment, download_name)
+        _apply_cache_headers(response, etag, immutable, max_age)
+        return response
+
+    response = send_from_directory(
+        directory,
+        filename,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        etag=etag or True,
+        max_age=max_age,
+    )
+    if immutable:
+        response.cache_control.immutable = True
+    return response
+
+
+def send_storage_file(
+    storage,
+    key: str,
+    internal_location: str,
+    immutable: bool = False,
+    max_age: int | None = None,
+    presigned_ttl: int = 0,
+):
+    """Отдаёт объект хранилища загрузок: с диска – как `send_stored_file`, из S3 – по подписанной ссылке или потоком."""
+    try:
+        local_path = storage.local_path(key)
+    except FileNotFoundError:
+        abort(404)
+    if local_path is not None:
+        # Локальное хранилище: ключ – путь относительно его корня
+        return send_stored_file(storage.root, key, internal_location, immutable=immutable, max_age=max_age)
+
+    url = storage.presigned_url(key, presigned_ttl) if presigned_ttl > 0 else None
+    if url is not None:
+        # Браузер читает файл прямо из хранилища; переадресацию можно кэшировать, пока жива подпись
+        response = redirect(url, code=302)
+        response.cache_control.private = True
+        response.cache_control.max_age = min(presigned_ttl // 2, max_age or presigned_ttl)
+        return response
+
+    if not storage.exists(key):
+        abort(404)
+    response = Response(
+        stream_with_context(storage.stream(key)),
+        mimetype=mimetypes.guess_type(key)[0] or "application/octet-stream",
+    )
+    etag = content_etag(key) if immutable else None
+    _apply_cache_headers(response, etag, immutable, _IMMUTABLE_MAX_AGE if immutable else max_age)
+    return response
@@ -0,0 +1,269 @@
+"""
+Модуль: `utils/maintenance.py`.
+Назначение: Планировщик служебных задач – очистка устаревших записей и файлов, ANALYZE горячих таблиц.
+
+Планировщик работает в фоновом потоке приложения (`MAINTENANCE_SCHEDULER_ENABLED`) или
+отдельным процессом (`flask maintenance`). Каждая задача запускается под advisory-блокировкой
+Postgres, поэтому при нескольких экземплярах её выполняет только один, а время последнего
+запуска в `MaintenanceRun` не даёт остальным повторить её до срока. Случайная задержка (jitter)
+разводит экземпляры во времени, а бюджет времени ограничивает каждый запуск: записи удаляются
+короткими пачками, и незавершённую очистку продолжит следующий запуск.
+"""
+
+import random
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from extensions import db
+from models.extraction_job import ExtractionJob
+from models.maintenance_run import MaintenanceRun
+from models.mobile_token import MobileToken
+from models.password_reset_token import PasswordResetToken
+from models.rate_limit_counter import RateLimitCounter
+from utils.cleanup import cleanup_old_uploads
+
+_BATCH_SIZE = 1000
+_MAX_SLEEP_SECONDS = 60
+_HOT_TABLES = ("upload", "upload_blob", "palette", "extraction_job", "password_reset_token", "mobile_token")
+
+# Блокировки задач без Postgres (SQLite в разработке): один процесс – один планировщик
+_LOCAL_LOCKS: dict[str, threading.Lock] = {}
+_scheduler_started = threading.Event()
+
+
+class MaintenanceJob:
+    """Служебная задача: функция `func(time_budget) -> dict`, период запуска и бюджет времени (с)."""
+
+    def __init__(self, name: str, func, interval_seconds: int, time_budget_seconds: int):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.name = name
+        self.func = func
+        self.interval_seconds = interval_seconds
+        self.time_budget_seconds = time_budget_seconds
+
+
+def _delete_in_batches(model, condition, time_budget: float) -> dict:
+    """Удаляет строки `model` по условию пачками, каждая – в своей транзакции.
+
+    Пачка выбирается по первичному ключу, в том числе составному.
+    """
+    key = list(model.__table__.primary_key.columns)
+    key_expr = key[0] if len(key) == 1 else db.tuple_(*key)
+    deadline = time.monotonic() + time_budget
+    deleted = 0
+    while time.monotonic() < deadline:
+        rows = model.query.filter(condition).with_entities(*key).limit(_BATCH_SIZE).all()
+        if not rows:
+            db.session.rollback()
+            return {"deleted": deleted, "complete": True}
+        keys = [row[0] for row in rows] if len(key) == 1 else [tuple(row) for row in rows]
+        model.query.filter(key_expr.in_(keys)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(rows)
+    return {"deleted": deleted, "complete": False}
+
+
+def purge_password_reset_tokens(time_budget: float) -> dict:
+    """Удаляет истёкшие и использованные коды восстановления пароля."""
+    hours = current_app.config["PASSWORD_RESET_TOKEN_RETENTION_HOURS"]
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    condition = db.or_(PasswordResetToken.expires_at < cutoff, PasswordResetToken.used_at < cutoff)
+    return _delete_in_batches(PasswordResetToken, condition, time_budget)
+
+
+def purge_mobile_tokens(time_budget: float) -> dict:
+    """Удаляет истёкшие токены мобильного API."""
+    return _delete_in_batches(MobileToken, MobileToken.expires_at < datetime.utcnow(), time_budget)
+
+
+def purge_rate_limit_counters(time_budget: float) -> dict:
+    """Удаляет счётчики лимитов частоты запросов за прошедшие окна (`RATE_LIMIT_BACKEND=database`)."""
+    return _delete_in_batches(RateLimitCounter, RateLimitCounter.expires_at < datetime.utcnow(), time_budget)
+
+
+def purge_extraction_jobs(time_budget: float) -> dict:
+    """Удаляет завершённые задачи извлечения старше `JOB_RETENTION_HOURS`."""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config["JOB_RETENTION_HOURS"])
+    condition = db.and_(
+        ExtractionJob.status.in_((ExtractionJob.STATUS_DONE, ExtractionJob.STATUS_FAILED)),
+        ExtractionJob.finished_at < cutoff,
+    )
+    return _delete_in_batches(ExtractionJob, condition, time_budget)
+
+
+def purge_expired_uploads(time_budget: float) -> dict:
+    """Удаляет загрузки старше `UPLOAD_RETENTION_DAYS` и осиротевшие файлы (`utils/cleanup.py`).
+
+    Сверка продолжается с места, на котором бюджет времени прервал предыдущий запуск,
+    а записи, уже сверенные с хранилищем, повторно не проверяются.
+    """
+    config = current_app.config
+    previous = db.session.get(MaintenanceRun, "purge_expired_uploads")
+    previous_stats = (previous.stats or {}) if previous is not None else {}
+    db.session.rollback()
+    return cleanup_old_uploads(
+        days=config["UPLOAD_RETENTION_DAYS"],
+        batch_size=config["CLEANUP_BATCH_SIZE"],
+        time_budget=config["CLEANUP_TIME_BUDGET_SECONDS"] or time_budget,
+        orphan_grace_seconds=config["CLEANUP_ORPHAN_GRACE_SECONDS"],
+        resume=previous_stats.get("resume"),
+        rows_checked_until=previous_stats.get("rows_checked_until", 0),
+    )
+
+
+def analyze_hot_tables(time_budget: float) -> dict:
+    """Обновляет статистику планировщика запросов по часто меняющимся таблицам."""
+    preparer = db.engine.dialect.identifier_preparer
+    is_postgres = db.engine.dialect.name == "postgresql"
+    analyzed = []
+    for table in _HOT_TABLES:
+        if is_postgres:
+            # Не даём ANALYZE выйти за бюджет задачи
+            db.session.execute(text(f"SET LOCAL statement_timeout = {int(time_budget * 1000)}"))
+        db.session.execute(text(f"ANALYZE {preparer.quote(table)}"))
+        db.session.commit()
+        analyzed.append(table)
+    return {"tables": analyzed, "complete": True}
+
+
+MAINTENANCE_JOBS = (
+    MaintenanceJob("purge_password_reset_tokens", purge_password_reset_tokens, 60 * 60, 60),
+    MaintenanceJob("purge_mobile_tokens", purge_mobile_tokens, 60 * 60, 60),
+    MaintenanceJob("purge_rate_limit_counters", purge_rate_limit_counters, 15 * 60, 60),
+    MaintenanceJob("purge_extraction_jobs", purge_extraction_jobs, 60 * 60, 60),
+    MaintenanceJob("purge_expired_uploads", purge_expired_uploads, 60 * 60, 300),
+    MaintenanceJob("analyze_hot_tables", analyze_hot_tables, 24 * 60 * 60, 120),
+)
+
+
+def get_maintenance_job(name: str) -> MaintenanceJob | None:
+    """Задача планировщика по имени."""
+    return next((job for job in MAINTENANCE_JOBS if job.name == name), None)
+
+
+@contextmanager
+def _job_lock(name: str):
+    """Служебная функция `_job_lock` для внутренней логики модуля."""
+    if db.engine.dialect.name != "postgresql":
+        lock = _LOCAL_LOCKS.setdefault(name, threading.Lock())
+        acquired = lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+        return
+
+    # Сессионная advisory-блокировка на отдельном соединении: снимается и при падении процесса
+    key = zlib.crc32(f"paleta:maintenance:{name}".encode())
+    with db.engine.connect() as connection:
+        acquired = bool(connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar())
+        connection.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                connection.commit()
+
+
+def _last_finished(name: str) -> datetime | None:
+    """Служебная функция `_last_finished` для внутренней логики модуля."""
+    run = db.session.get(MaintenanceRun, name)
+    finished_at = run.finished_at if run else None
+    db.session.rollback()
+    return finished_at
+
+
+def run_maintenance_job(job: MaintenanceJob, force: bool = False) -> dict | None:
+    """Выполняет задачу, если она не заблокирована другим экземпляром и подошёл её срок.
+
+    Возвращает статистику запуска или None, если задача пропущена.
+    """
+    with _job_lock(job.name) as acquired:
+        if not acquired:
+            return None
+
+        now = datetime.utcnow()
+        run = db.session.get(MaintenanceRun, job.name)
+        if run is None:
+            run = MaintenanceRun(name=job.name)
+            db.session.add(run)
+        elif not force and run.finished_at and run.finished_at > now - timedelta(seconds=job.interval_seconds):
+            # Другой экземпляр уже выполнил задачу в этом периоде
+            db.session.rollback()
+            return None
+        run.started_at = now
+        db.session.commit()
+
+        try:
+            stats = job.func(job.time_budget_seconds)
+            status = "ok" if stats.get("complete", True) else "partial"
+        except Exception:
+            db.session.rollback()
+            current_app.logger.exception("Служебная задача %s завершилась ошибкой", job.name)
+            stats, status = {}, "error"
+
+        run = db.session.get(MaintenanceRun, job.name)
+        run.finished_at = datetime.utcnow()
+        run.status = status
+        run.stats = stats
+        db.session.commit()
+        current_app.logger.info("Служебная задача %s: %s %s", job.name, status, stats)
+        return stats
+
+
+def run_scheduler(once: bool = False) -> None:
+    """Цикл планировщика: запускает задачи по расписанию со случайной задержкой."""
+    jitter = max(0, current_app.config["MAINTENANCE_JITTER_SECONDS"])
+    due: dict[str, float] = {}
+    while True:
+        now = time.time()
+        for job in MAINTENANCE_JOBS:
+            if job.name not in due:
+                finished = _last_finished(job.name)
+                last = (finished - datetime.utcnow()).total_seconds() + now if finished else 0.0
+                due[job.name] = last + job.interval_seconds + random.uniform(0, jitter)
+            if once or due[job.name] <= now:
+                run_maintenance_job(job)
+                # Срок следующего запуска – от записи в БД (задачу мог выполнить другой экземпляр)
+                due.pop(job.name)
+            db.session.remove()
+
+        if once:
+            return
+        time.sleep(max(1.0, min(_MAX_SLEEP_SECONDS, min(due.values(), default=now) - time.time())))
+
+
+def init_maintenance(app) -> None:
+    """Запускает планировщик в фоновом потоке при первом запросе к приложению, если он включён.
+
+    Поток стартует в процессе, обслуживающем запросы (после fork gunicorn), а не в CLI-командах.
+    """
+    if not app.config["MAINTENANCE_SCHEDULER_ENABLED"]:
+        return
+
+    def _run():
+        """Служебная функция `_run` для внутренней логики модуля."""
+        with app.app_context():
+            while True:
+                try:
+                    run_scheduler()
+                except Exception:
+                    app.logger.exception("Планировщик обслуживания упал, перезапуск через минуту")
+                    db.session.remove()
+                    time.sleep(_MAX_SLEEP_SECONDS)
+
+    @app.before_request
+    def _start_maintenance_scheduler():
+        """Служебная функция `_start_maintenance_scheduler` для внутренней логики модуля."""
+        if _scheduler_started.is_set():
+            return
+        _scheduler_started.set()
+        threading.Thread(target=_run, name="maintenance-scheduler", daemon=True).start()
@@ -0,0 +1,150 @@
+"""
+Модуль: `utils/migrations.py`.
+Назначение: Версионные миграции схемы БД вместо `db.create_all()` при каждом старте.
+
+Миграции лежат в пакете `migrations/` – модули `vNNNN_<имя>.py` с функцией `upgrade(connection)`.
+Применённые версии записываются в таблицу `schema_migration`; каждая миграция выполняется
+в своей транзакции. При старте приложение сверяет версию одним запросом, без отражения
+метаданных всех таблиц. В Postgres миграции выполняются под advisory-блокировкой, поэтому
+одновременно стартующие процессы (приложение, воркер) не применяют их дважды.
+"""
+
+import importlib
+import pkgutil
+import re
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, insert, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+import migrations
+from extensions import db
+
+_MODULE_RE = re.compile(r"^v(?P<version>\d{4})_(?P<name>\w+)$")
+_LOCK_KEY = zlib.crc32(b"paleta:migrations")
+
+# Таблица версий – вне `db.metadata`, её создаёт сам механизм миграций
+_metadata = MetaData()
+schema_migration = Table(
+    "schema_migration",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration:
+    """Миграция схемы: номер версии, имя и модуль с функцией `upgrade(connection)`."""
+
+    def __init__(self, version: int, name: str, module):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.version = version
+        self.name = name
+        self.module = module
+
+
+def available_migrations() -> list[Migration]:
+    """Миграции пакета `migrations/` по возрастанию версии."""
+    found = []
+    for module_info in pkgutil.iter_modules(migrations.__path__):
+        match = _MODULE_RE.match(module_info.name)
+        if match is None:
+            continue
+        module = importlib.import_module(f"migrations.{module_info.name}")
+        found.append(Migration(int(match["version"]), match["name"], module))
+    found.sort(key=lambda migration: migration.version)
+    return found
+
+
+def head_version() -> int:
+    """Версия последней миграции в коде."""
+    versions = [migration.version for migration in available_migrations()]
+    return versions[-1] if versions else 0
+
+
+def current_version() -> int:
+    """Версия схемы БД (0 – миграции ещё не применялись)."""
+    try:
+        with db.engine.connect() as connection:
+            return connection.execute(select(func.max(schema_migration.c.version))).scalar() or 0
+    except DBAPIError:
+        # Таблицы версий ещё нет
+        return 0
+
+
+@contextmanager
+def _migration_lock():
+    """Служебная функция `_migration_lock` для внутренней логики модуля."""
+    if db.engine.dialect.name != "postgresql":
+        yield
+        return
+    with db.engine.connect() as connection:
+        connection.exec_driver_sql(f"SELECT pg_advisory_lock({_LOCK_KEY})")
+        connection.commit()
+        try:
+            yield
+        finally:
+            connection.exec_driver_sql(f"SELECT pg_advisory_unlock({_LOCK_KEY})")
+            connection.commit()
+
+
+def upgrade_schema() -> list[str]:
+    """Применяет неприменённые миграции; возвращает их имена (`vNNNN_<имя>`)."""
+    applied = []
+    with _migration_lock():
+        with db.engine.begin() as connection:
+            _metadata.create_all(bind=connection)
+        # Версию перечитываем под блокировкой: миграции мог применить другой процесс
+        version = current_version()
+        for migration in available_migrations():
+            if migration.version <= version:
+                continue
+            with db.engine.begin() as connection:
+                migration.module.upgrade(connection)
+                connection.execute(
+                    insert(schema_migration).values(
+                        version=migration.version,
+                        name=migration.name,
+                        applied_at=datetime.utcnow(),
+                    )
+                )
+            applied.append(f"v{migration.version:04d}_{migration.name}")
+    return applied
+
+
+def ensure_schema(app) -> None:
+    """Проверяет версию схемы при старте и, если `AUTO_MIGRATE`, применяет недостающие миграции."""
+    head = head_version()
+    if current_version() >= head:
+        return
+    if not app.config["AUTO_MIGRATE"]:
+        app.logger.warning("Схема БД отстаёт от кода (нужна версия %s): выполните `flask db-upgrade`", head)
+        return
+    for name in upgrade_schema():
+        app.logger.info("Применена миграция схемы %s", name)
+
+
+def create_index(connection, index) -> None:
+    """Создаёт индекс модели, если его ещё нет (для миграций)."""
+    index.create(bind=connection, checkfirst=True)
+
+
+def create_table(connection, table) -> None:
+    """Создаёт таблицу модели вместе с её индексами, если её ещё нет (для миграций)."""
+    table.create(bind=connection, checkfirst=True)
+
+
+def add_column(connection, column) -> None:
+    """Добавляет nullable-колонку модели в существующую таблицу, если её ещё нет (для миграций)."""
+    table = column.table
+    existing = {item["name"] for item in inspect(connection).get_columns(table.name)}
+    if column.name in existing:
+        return
+    preparer = connection.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(
+        text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}")
+    )
@@ -0,0 +1,182 @@
+"""
+Модуль: `utils/mobile_tokens.py`.
+Назначение: Выдача, проверка, ротация и отзыв токенов мобильного API.
+
+Токены хранятся в таблице `mobile_token` (только sha256) со сроком действия, поэтому они общие
+для всех воркеров gunicorn и переживают перезапуск. Перед БД стоит ограниченный LRU-кэш
+access-токенов в памяти процесса: обычный запрос с токеном проверяется без обращения к БД.
+Запись кэша живёт не дольше `MOBILE_TOKEN_CACHE_SECONDS`, так что токен, отозванный в другом
+процессе, перестаёт приниматься здесь не позже этого срока; в своём процессе – сразу.
+Refresh-токен одноразовый: при обновлении он удаляется, и из двух параллельных запросов
+с одним токеном новую пару получает только один.
+"""
+
+import hashlib
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+
+from extensions import db
+from models.mobile_token import MobileToken
+
+
+def hash_token(token: str) -> str:
+    """sha256 токена – под ним токен хранится в БД и в кэше."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class AccessTokenCache:
+    """LRU-кэш проверенных access-токенов: sha256 токена -> (id пользователя, срок записи)."""
+
+    def __init__(self, max_items: int = 10000, ttl_seconds: int = 60):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self._max_items = max(0, max_items)
+        self._ttl_seconds = max(0, ttl_seconds)
+        self._items: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, token_hash: str) -> int | None:
+        """id пользователя для токена из кэша; `None`, если записи нет или она устарела."""
+        with self._lock:
+            entry = self._items.get(token_hash)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._items[token_hash]
+                self._stats["misses"] += 1
+                return None
+            self._items.move_to_end(token_hash)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, token_hash: str, user_id: int, expires_at: datetime) -> None:
+        """Запоминает токен до его истечения, но не дольше TTL кэша."""
+        if not self._max_items or not self._ttl_seconds:
+            return
+        lifetime = min(self._ttl_seconds, (expires_at - datetime.utcnow()).total_seconds())
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._items[token_hash] = (user_id, time.monotonic() + lifetime)
+            self._items.move_to_end(token_hash)
+            while len(self._items) > self._max_items:
+                self._items.popitem(last=False)
+
+    def discard(self, token_hash: str) -> None:
+        """Убирает токен из кэша."""
+        with self._lock:
+            self._items.pop(token_hash, None)
+
+    def discard_user(self, user_id: int) -> None:
+        """Убирает из кэша все токены пользователя."""
+        with self._lock:
+            for token_hash in [key for key, entry in self._items.items() if entry[0] == user_id]:
+                del self._items[token_hash]
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов и текущий размер кэша."""
+        with self._lock:
+            return {**self._stats, "items": len(self._items)}
+
+
+def _cache() -> AccessTokenCache:
+    """Служебная функция `_cache` для внутренней логики модуля."""
+    return current_app.extensions["mobile_token_cache"]
+
+
+def issue_tokens(user_id: int) -> dict:
+    """Выдаёт новую пару токенов; `expires_in` – срок жизни access-токена в секундах."""
+    config = current_app.config
+    now = datetime.utcnow()
+    access_ttl = timedelta(minutes=config["MOBILE_ACCESS_TOKEN_TTL_MINUTES"])
+    access = f"m_access_{secrets.token_urlsafe(24)}"
+    refresh = f"m_refresh_{secrets.token_urlsafe(24)}"
+    access_row = MobileToken(
+        user_id=user_id,
+        kind=MobileToken.KIND_ACCESS,
+        token_hash=hash_token(access),
+        expires_at=now + access_ttl,
+        created_at=now,
+    )
+    db.session.add(access_row)
+    db.session.add(
+        MobileToken(
+            user_id=user_id,
+            kind=MobileToken.KIND_REFRESH,
+            token_hash=hash_token(refresh),
+            expires_at=now + timedelta(days=config["MOBILE_REFRESH_TOKEN_TTL_DAYS"]),
+            created_at=now,
+        )
+    )
+    db.session.commit()
+    _cache().put(access_row.token_hash, user_id, access_row.expires_at)
+    return {
+        "access_token": access,
+        "refresh_token": refresh,
+        "expires_in": int(access_ttl.total_seconds()),
+    }
+
+
+def resolve_access_token(access_token: str) -> int | None:
+    """id пользователя по действующему access-токену; `None` – токен неизвестен, отозван или истёк."""
+    token_hash = hash_token(access_token)
+    cache = _cache()
+    user_id = cache.get(token_hash)
+    if user_id is not None:
+        return user_id
+
+    row = (
+        db.session.query(MobileToken.user_id, MobileToken.expires_at)
+        .filter(
+            MobileToken.token_hash == token_hash,
+            MobileToken.kind == MobileToken.KIND_ACCESS,
+            MobileToken.expires_at > datetime.utcnow(),
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    cache.put(token_hash, row.user_id, row.expires_at)
+    return row.user_id
+
+
+def consume_refresh_token(refresh_token: str) -> int | None:
+    """Погашает действующий refresh-токен и возвращает id его пользователя; `None` – токен недействителен."""
+    row = (
+        db.session.query(MobileToken.id, MobileToken.user_id)
+        .filter(
+            MobileToken.token_hash == hash_token(refresh_token),
+            MobileToken.kind == MobileToken.KIND_REFRESH,
+            MobileToken.expires_at > datetime.utcnow(),
+        )
+        .first()
+    )
+    if row is None:
+        db.session.rollback()
+        return None
+    # Токен принадлежит тому запросу, чей DELETE удалил строку
+    deleted = MobileToken.query.filter(MobileToken.id == row.id).delete(synchronize_session=False)
+    db.session.commit()
+    return row.user_id if deleted else None
+
+
+def revoke_tokens(access_token: str | None = None, refresh_token: str | None = None) -> None:
+    """Отзывает переданные токены."""
+    hashes = [hash_token(token) for token in (access_token, refresh_token) if token]
+    if not hashes:
+        return
+    MobileToken.query.filter(MobileToken.token_hash.in_(hashes)).delete(synchronize_session=False)
+    db.session.commit()
+    cache = _cache()
+    for token_hash in hashes:
+        cache.discard(token_hash)
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    """Отзывает все токены пользователя (без коммита – в транзакции вызывающего кода)."""
+    MobileToken.query.filter(MobileToken.user_id == user_id).delete(synchronize_session=False)
+    _cache().discard_user(user_id)
@@ -0,0 +1,138 @@
+"""
+Модуль: `utils/palette_benchmark.py`.
+Назначение: Замер скорости и качества движков квантования палитры.
+"""
+
+import os
+import statistics
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from utils.image_processor import ENGINES, load_image_pixels, quantize_pixels
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def quantization_error(pixels: np.ndarray, centers: np.ndarray) -> float:
+    """Средний квадрат расстояния от пикселя до ближайшего цвета палитры (RGB)."""
+    points = pixels.astype(np.float64, copy=False)
+    palette = centers.astype(np.float64, copy=False)
+    distances = (
+        (points * points).sum(axis=1)[:, None]
+        - 2.0 * points @ palette.T
+        + (palette * palette).sum(axis=1)[None, :]
+    )
+    return float(np.maximum(distances.min(axis=1), 0.0).mean())
+
+
+def palette_difference(first: np.ndarray, second: np.ndarray) -> float:
+    """Среднее RGB-расстояние между цветами двух палитр при оптимальном попарном сопоставлении."""
+    a = first.astype(np.float64, copy=False)
+    b = second.astype(np.float64, copy=False)
+    distances = np.sqrt(((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2))
+    rows, cols = linear_sum_assignment(distances)
+    return float(distances[rows, cols].mean())
+
+
+def collect_image_paths(sources: list[str]) -> list[str]:
+    """Раскрывает каталоги в список файлов изображений."""
+    paths: list[str] = []
+    for source in sources:
+        if os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(source, name))
+        elif os.path.isfile(source):
+            paths.append(source)
+    return paths
+
+
+def benchmark_engines(
+    image_paths: list[str],
+    num_colors: int = 5,
+    engines: list[str] | None = None,
+    repeat: int = 3,
+    compaction_bits: int = 0,
+) -> list[dict]:
+    """Возвращает медианное время (мс) и искажение для каждого движка по набору изображений."""
+    engine_names = engines or list(ENGINES)
+    samples = [load_image_pixels(path) for path in image_paths]
+
+    results = []
+    for engine in engine_names:
+        timings: list[float] = []
+        errors: list[float] = []
+        for pixels in samples:
+            runs: list[float] = []
+            centers = None
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                centers = quantize_pixels(pixels, num_colors, engine, compaction_bits=compaction_bits)
+                runs.append((time.perf_counter() - started) * 1000.0)
+            timings.append(min(runs))
+            errors.append(quantization_error(pixels, centers))
+
+        results.append(
+            {
+                "engine": engine,
+                "latency_ms": statistics.median(timings) if timings else 0.0,
+                "error": statistics.median(errors) if errors else 0.0,
+            }
+        )
+
+    reference = next((row["error"] for row in results if row["engine"] == "kmeans"), None)
+    for row in results:
+        row["relative_error"] = (row["error"] / reference) if reference else None
+    return results
+
+
+def benchmark_compaction(
+    image_paths: list[str],
+    num_colors: int = 5,
+    engine: str = "kmeans",
+    bits_options: list[int] | None = None,
+    repeat: int = 3,
+) -> list[dict]:
+    """Сравнивает кластеризацию всех пикселей со сжатием до уникальных цветов.
+
+    Для каждого варианта `bits` – медианы времени (мс), искажения, числа точек после сжатия
+    и отличия палитры от варианта без сжатия (среднее RGB-расстояние сопоставленных цветов).
+    """
+    samples = [load_image_pixels(path) for path in image_paths]
+    options = [0] + [bits for bits in (bits_options or [8, 6, 5]) if bits]
+
+    baseline: list[np.ndarray] = []
+    results = []
+    for bits in options:
+        timings: list[float] = []
+        errors: list[float] = []
+        differences: list[float] = []
+        points: list[int] = []
+        for index, pixels in enumerate(samples):
+            runs: list[float] = []
+            centers = None
+            for _ in range(max(1, repeat)):
+                started = time.perf_counter()
+                centers = quantize_pixels(pixels, num_colors, engine, compaction_bits=bits)
+                runs.append((time.perf_counter() - started) * 1000.0)
+            timings.append(min(runs))
+            errors.append(quantization_error(pixels, centers))
+            if bits:
+                points.append(len(np.unique(pixels >> (8 - bits), axis=0)))
+                differences.append(palette_difference(baseline[index], centers))
+            else:
+                points.append(len(pixels))
+                baseline.append(centers)
+
+        results.append(
+            {
+                "bits": bits,
+                "points": statistics.median(points) if points else 0,
+                "latency_ms": statistics.median(timings) if timings else 0.0,
+                "error": statistics.median(errors) if errors else 0.0,
+                "difference": statistics.median(differences) if differences else 0.0,
+            }
+        )
+    return results
@@ -0,0 +1,202 @@
+"""
+Модуль: `utils/palette_cache.py`.
+Назначение: Двухуровневый кэш извлечённых палитр по хешу содержимого изображения.
+
+Ключ кэша – (sha256 байтов изображения, количество цветов, движок квантования).
+Первый уровень – LRU в памяти процесса, второй – каталог на диске, общий для всех
+воркеров gunicorn, с вытеснением самых давно использованных записей по суммарному размеру.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(stream) -> str:
+    """Считает sha256 содержимого потока и возвращает позицию потока в начало."""
+    stream.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(_READ_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+class PaletteCache:
+    """LRU-кэш палитр в памяти поверх общего дискового уровня."""
+
+    def __init__(
+        self,
+        directory: str,
+        memory_items: int = 1024,
+        disk_max_bytes: int = 64 * 1024 * 1024,
+        sweep_interval_seconds: int = 60,
+    ):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self._directory = directory
+        self._memory_items = max(0, memory_items)
+        self._disk_max_bytes = max(0, disk_max_bytes)
+        self._sweep_interval = sweep_interval_seconds
+        self._memory: OrderedDict[str, list[str]] = OrderedDict()
+        self._lock = Lock()
+        self._last_sweep = 0.0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(digest: str, color_count: int, engine: str) -> str:
+        """Формирует ключ кэша из хеша изображения, количества цветов и движка."""
+        return f"{digest}_{int(color_count)}_{engine}"
+
+    def _disk_path(self, key: str) -> str:
+        """Служебная функция `_disk_path` для внутренней логики модуля."""
+        return os.path.join(self._directory, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, palette: list[str]) -> None:
+        """Служебная функция `_remember` для внутренней логики модуля."""
+        if not self._memory_items:
+            return
+        with self._lock:
+            self._memory[key] = palette
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> list[str] | None:
+        """Возвращает палитру из памяти или с диска; `None`, если записи нет."""
+        with self._lock:
+            palette = self._memory.get(key)
+            if palette is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return list(palette)
+
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                palette = json.load(f)
+            # Обновляем mtime – по нему вытесняются давно неиспользуемые записи
+            os.utime(path)
+        except (OSError, ValueError):
+            palette = None
+
+        if not isinstance(palette, list):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        self._remember(key, palette)
+        with self._lock:
+            self._stats["disk_hits"] += 1
+        return list(palette)
+
+    def set(self, key: str, palette: list[str]) -> None:
+        """Сохраняет палитру на обоих уровнях кэша."""
+        self._remember(key, list(palette))
+
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(palette, f)
+            os.replace(temp_path, path)
+        except OSError:
+            return
+
+        self._maybe_sweep()
+
+    def get_or_compute(self, key: str, compute: Callable[[], list[str]]) -> list[str]:
+        """Возвращает палитру из кэша или вычисляет и сохраняет её."""
+        palette = self.get(key)
+        if palette is None:
+            palette = compute()
+            self.set(key, palette)
+        return palette
+
+    def discard_digest(self, digest: str) -> int:
+        """Удаляет из обоих уровней все палитры изображения `digest`; возвращает число удалённых файлов."""
+        prefix = f"{digest}_"
+        with self._lock:
+            for key in [key for key in self._memory if key.startswith(prefix)]:
+                del self._memory[key]
+
+        removed = 0
+        try:
+            entries = list(os.scandir(os.path.join(self._directory, digest[:2])))
+        except OSError:
+            return 0
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.name.endswith(".json"):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                removed += 1
+        return removed
+
+    def _maybe_sweep(self) -> None:
+        """Не чаще раза в интервал проверяет размер дискового уровня."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < self._sweep_interval:
+                return
+            self._last_sweep = now
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Удаляет самые давно использованные файлы, пока размер не опустится до 90% лимита."""
+        entries = []
+        total = 0
+        try:
+            shards = list(os.scandir(self._directory))
+        except OSError:
+            return 0
+
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            try:
+                for entry in os.scandir(shard.path):
+                    if not entry.name.endswith(".json"):
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            except OSError:
+                continue
+
+        if total <= self._disk_max_bytes:
+            return 0
+
+        target = int(self._disk_max_bytes * 0.9)
+        removed = 0
+        for _mtime, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._stats["evictions"] += removed
+        return removed
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов текущего процесса."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
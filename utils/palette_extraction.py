@@ -0,0 +1,159 @@
+"""
+Модуль: `utils/palette_extraction.py`.
+Назначение: Извлечение палитры загрузки с учётом кэша палитр и сохранённой гистограммы цветов.
+"""
+
+import os
+
+import numpy as np
+from flask import current_app
+
+from config import Config
+from models.upload import Upload
+from utils.color_histogram import delete_histogram, histogram_path
+from utils.compute_pool import run_compute
+from utils.palette_cache import content_digest
+from utils.palette_tasks import (
+    histogram_palette_task,
+    palette_ladder_task,
+    pixels_palette_task,
+    upload_palette_task,
+    warm_start_task,
+)
+
+# Палитры по гистограмме кэшируются отдельно от палитр по полной выборке пикселей
+_HISTOGRAM_CACHE_SUFFIX = "@hist"
+
+
+def _histogram_file(digest: str) -> str:
+    """Служебная функция `_histogram_file` для внутренней логики модуля."""
+    return histogram_path(current_app.config["HISTOGRAM_FOLDER"], digest)
+
+
+def forget_upload_digest(digest: str) -> None:
+    """Удаляет гистограмму и кэшированные палитры изображения, когда его файл удалён из хранилища."""
+    delete_histogram(_histogram_file(digest))
+    current_app.extensions["palette_cache"].discard_digest(digest)
+
+
+def _compaction_bits() -> int:
+    """Служебная функция `_compaction_bits` для внутренней логики модуля."""
+    bits = current_app.config.get("PALETTE_COMPACTION_BITS", 0)
+    return bits if 1 <= bits <= 8 else 0
+
+
+def extract_upload_palette(
+    filepath: str,
+    digest: str,
+    color_count: int,
+    engine: str,
+    pixels: np.ndarray | None = None,
+) -> list[str]:
+    """Извлекает палитру новой загрузки и сохраняет гистограмму цветов для пересчётов.
+
+    Декодирование и кластеризация выполняются в пуле вычислений (`ComputePoolBusy` при перегрузке).
+    Если выборка `pixels` уже получена конвейером загрузки, файл повторно не декодируется.
+    """
+    compaction_bits = _compaction_bits()
+    # Сжатие немного меняет палитру, поэтому у неё свой ключ кэша
+    variant = f"{engine}@c{compaction_bits}" if compaction_bits else engine
+    cache = current_app.extensions.get("palette_cache")
+    key = cache.make_key(digest, color_count, variant) if cache is not None else None
+    palette = cache.get(key) if cache is not None else None
+
+    hist_file = _histogram_file(digest)
+    if palette is not None and os.path.exists(hist_file):
+        return palette
+
+    pending_count = None if palette is not None else color_count
+    if pixels is not None:
+        computed = run_compute(pixels_palette_task, pixels, hist_file, pending_count, engine, compaction_bits)
+    else:
+        computed = run_compute(upload_palette_task, filepath, hist_file, pending_count, engine, compaction_bits)
+    if palette is None:
+        palette = computed
+        if cache is not None:
+            cache.set(key, palette)
+    return palette
+
+
+def upload_content_hash(upload, filepath: str) -> str:
+    """Возвращает sha256 загрузки; для старых записей считает его по файлу и сохраняет в модели."""
+    if upload.content_hash:
+        return upload.content_hash
+
+    with open(filepath, "rb") as f:
+        digest = content_digest(f)
+    upload.content_hash = digest
+    return digest
+
+
+def reanalyze_palette(filepath: str, digest: str, color_count: int, engine: str) -> list[str]:
+    """Пересчитывает палитру существующей загрузки по гистограмме, не декодируя изображение."""
+
+    def compute() -> list[str]:
+        return run_compute(histogram_palette_task, filepath, _histogram_file(digest), color_count, engine)
+
+    cache = current_app.extensions.get("palette_cache")
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(cache.make_key(digest, color_count, engine + _HISTOGRAM_CACHE_SUFFIX), compute)
+
+
+def _ladder_is_complete(ladder) -> bool:
+    """Служебная функция `_ladder_is_complete` для внутренней логики модуля."""
+    if not isinstance(ladder, dict):
+        return False
+    return all(str(k) in ladder for k in range(Config.MIN_COLOR_COUNT, Config.MAX_COLOR_COUNT + 1))
+
+
+def upload_palette_ladder(upload, filepath: str, digest: str) -> dict[str, list[str]]:
+    """Палитры загрузки для всех допустимых количеств цветов; считаются один раз и хранятся в `Upload.palettes`."""
+    if _ladder_is_complete(upload.palettes):
+        return upload.palettes
+
+    # Тот же файл уже загружали: берём готовый набор у другой записи
+    twin = (
+        Upload.query.filter(Upload.content_hash == digest, Upload.palettes.isnot(None))
+        .with_entities(Upload.palettes)
+        .first()
+    )
+    if twin is not None and _ladder_is_complete(twin.palettes):
+        ladder = twin.palettes
+    else:
+        ladder = run_compute(
+            palette_ladder_task,
+            filepath,
+            _histogram_file(digest),
+            Config.MIN_COLOR_COUNT,
+            Config.MAX_COLOR_COUNT,
+        )
+    upload.palettes = ladder
+    return ladder
+
+
+def warm_start_palette(
+    filepath: str,
+    digest: str,
+    color_count: int,
+    palette: list[str],
+    locked: set[int],
+) -> tuple[list[str], list[int]]:
+    """Пересчитывает палитру от текущей, не трогая закреплённые цвета.
+
+    Если цветов нужно меньше, отбрасываются последние свободные; закреплённые сохраняют
+    относительный порядок. Возвращает палитру и новые индексы закреплённых цветов.
+    """
+    free_slots = max(0, color_count - len(locked))
+    kept: list[int] = []
+    for index in range(len(palette)):
+        if index in locked:
+            kept.append(index)
+        elif free_slots > 0:
+            kept.append(index)
+            free_slots -= 1
+
+    initial = [palette[index] for index in kept]
+    locked_mask = [index in locked for index in kept]
+    refined = run_compute(warm_start_task, filepath, _histogram_file(digest), initial, locked_mask, color_count)
+    return refined, [position for position, is_locked in enumerate(locked_mask) if is_locked]
@@ -0,0 +1,131 @@
+"""
+Модуль: `utils/palette_listing.py`.
+Назначение: Постраничный список палитр пользователя – поиск по названию, фильтр по количеству цветов и сортировка.
+
+Страницы выбираются по ключу (keyset): курсор – непрозрачная строка с ключом сортировки
+и id последней палитры страницы, а следующая страница – условие «после этого ключа»
+по индексам `(user_id, created_at, id)`, `(user_id, name)` и `(user_id, color_count, id)`.
+В отличие от OFFSET, стоимость страницы не растёт с её номером. Ключи сортировки заполнены
+у всех палитр: `created_at` – при создании, `color_count` – при сохранении и миграцией v0003.
+"""
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from extensions import db
+from models.palette import Palette
+
+DEFAULT_SORT = "created_desc"
+# Режим сортировки -> (колонка ключа, по убыванию)
+SORT_MODES = {
+    "created_desc": (Palette.created_at, True),
+    "created_asc": (Palette.created_at, False),
+    "name_asc": (Palette.name, False),
+    "name_desc": (Palette.name, True),
+    "colors_asc": (Palette.color_count, False),
+    "colors_desc": (Palette.color_count, True),
+}
+# Палитр на странице по умолчанию (первый экран «Моих палитр»)
+PALETTE_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Курсор страницы повреждён или выдан для другой сортировки."""
+
+
+def _key_value(palette: Palette, sort: str):
+    """Служебная функция `_key_value` для внутренней логики модуля."""
+    column, _descending = SORT_MODES[sort]
+    value = getattr(palette, column.key)
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_cursor(palette: Palette, sort: str) -> str:
+    """Курсор страницы, следующей за палитрой `palette`."""
+    payload = json.dumps([sort, _key_value(palette, sort), palette.id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort: str) -> tuple:
+    """Ключ сортировки и id из курсора; `InvalidCursor`, если курсор не подходит к `sort`."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_sort, value, palette_id = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as exc:
+        raise InvalidCursor(token) from exc
+    if cursor_sort != sort or not isinstance(palette_id, int):
+        raise InvalidCursor(token)
+
+    column, _descending = SORT_MODES[sort]
+    try:
+        if column is Palette.created_at:
+            value = datetime.fromisoformat(value)
+        elif not isinstance(value, int if column is Palette.color_count else str):
+            raise TypeError(value)
+    except (TypeError, ValueError) as exc:
+        raise InvalidCursor(token) from exc
+    return value, palette_id
+
+
+def _after_cursor(sort: str, value, palette_id: int):
+    """Служебная функция `_after_cursor` для внутренней логики модуля."""
+    column, descending = SORT_MODES[sort]
+    if descending:
+        return db.or_(column < value, db.and_(column == value, Palette.id < palette_id))
+    return db.or_(column > value, db.and_(column == value, Palette.id > palette_id))
+
+
+def _filtered_query(user_id: int, search: str = "", color_count: int | None = None):
+    """Служебная функция `_filtered_query` для внутренней логики модуля."""
+    query = Palette.query.filter(Palette.user_id == user_id)
+    search = (search or "").strip()
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(Palette.name.ilike(f"%{escaped}%", escape="\\"))
+    if color_count is not None:
+        query = query.filter(Palette.color_count == color_count)
+    return query
+
+
+def list_palettes(
+    user_id: int,
+    sort: str = DEFAULT_SORT,
+    search: str = "",
+    color_count: int | None = None,
+    limit: int = PALETTE_PAGE_SIZE,
+    cursor: str | None = None,
+    offset: int = 0,
+) -> tuple[list[Palette], str | None]:
+    """Страница палитр пользователя и курсор следующей страницы (None – страница последняя).
+
+    Неизвестный режим `sort` заменяется на `DEFAULT_SORT`; некорректный курсор – `InvalidCursor`.
+    `offset` – только для старых клиентов с постраничным OFFSET, вместе с курсором не используется.
+    """
+    if sort not in SORT_MODES:
+        sort = DEFAULT_SORT
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    column, descending = SORT_MODES[sort]
+
+    query = _filtered_query(user_id, search, color_count)
+    if cursor:
+        query = query.filter(_after_cursor(sort, *decode_cursor(cursor, sort)))
+    if descending:
+        query = query.order_by(column.desc(), Palette.id.desc())
+    else:
+        query = query.order_by(column.asc(), Palette.id.asc())
+    if offset > 0 and not cursor:
+        query = query.offset(offset)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(page[-1], sort)
+
+
+def count_palettes(user_id: int, search: str = "", color_count: int | None = None) -> int:
+    """Количество палитр пользователя, подходящих под поиск и фильтр."""
+    return _filtered_query(user_id, search, color_count).order_by(None).count()
@@ -0,0 +1,148 @@
+"""
+Модуль: `utils/palette_names.py`.
+Назначение: Названия палитр – стандартные названия («Моя палитра N») и сохранение с проверкой уникальности.
+
+Уникальность названия в пределах пользователя обеспечивает индекс `uq_palette_user_name`:
+палитра сохраняется сразу, а конфликт определяется по `IntegrityError` этого индекса, без
+предварительных SELECT; остальные нарушения целостности пробрасываются как есть. Свободный номер стандартного названия находится одним запросом – по наибольшему
+занятому суффиксу; при гонке двух сохранений номер пересчитывается и запись повторяется.
+Переводы стандартных названий запоминаются для каждой локали.
+"""
+
+import re
+from functools import lru_cache
+
+from flask_babel import force_locale, gettext as _
+from sqlalchemy import Integer, case, cast, func
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from extensions import db
+from models.palette import Palette
+
+_DEFAULT_NAME_MSGID = "Моя палитра"
+_UNTITLED_NAME_MSGID = "Без названия"
+# Названия, которые клиенты присылают вместо пустого (в том числе старые версии интерфейса)
+_LEGACY_DEFAULT_NAMES = frozenset({"Моя палитра", "My Palette", "Без названия", "Untitled Palette", "Random Palette"})
+_MAX_SAVE_ATTEMPTS = 5
+# Суффикс длиннее не считается номером (и не переполняет INTEGER)
+_MAX_SUFFIX_DIGITS = 9
+_NAME_CONSTRAINT = "uq_palette_user_name"
+# Так SQLite сообщает о нарушении уникального индекса (имени индекса в тексте нет)
+_SQLITE_NAME_CONFLICT = "UNIQUE constraint failed: palette.user_id, palette.name"
+
+
+class PaletteNameTaken(Exception):
+    """У пользователя уже есть палитра с таким названием."""
+
+
+@lru_cache(maxsize=None)
+def _translated(message_id: str, lang: str) -> str:
+    """Служебная функция `_translated` для внутренней логики модуля."""
+    with force_locale(lang):
+        return str(_(message_id)).strip()
+
+
+@lru_cache(maxsize=None)
+def _aliases_for(languages: tuple[str, ...]) -> frozenset[str]:
+    """Служебная функция `_aliases_for` для внутренней логики модуля."""
+    aliases = set(_LEGACY_DEFAULT_NAMES)
+    for lang in languages:
+        aliases.add(_translated(_DEFAULT_NAME_MSGID, lang))
+        aliases.add(_translated(_UNTITLED_NAME_MSGID, lang))
+    aliases.discard("")
+    return frozenset(aliases)
+
+
+def default_name_aliases() -> frozenset[str]:
+    """Все варианты стандартного названия на поддерживаемых языках – их заменяет «Моя палитра N»."""
+    return _aliases_for(tuple(Config.SUPPORTED_LANGUAGES))
+
+
+def default_palette_name(lang: str | None = None) -> str:
+    """Стандартное название палитры на языке `lang` (по умолчанию – на языке текущего запроса)."""
+    if lang in Config.SUPPORTED_LANGUAGES:
+        return _translated(_DEFAULT_NAME_MSGID, lang)
+    return _(_DEFAULT_NAME_MSGID).strip()
+
+
+def _numbered_name_condition(base: str):
+    """Служебная функция `_numbered_name_condition` для внутренней логики модуля."""
+    if db.engine.dialect.name == "postgresql":
+        return Palette.name.regexp_match(f"^{re.escape(base)} [0-9]{{1,{_MAX_SUFFIX_DIGITS}}}$")
+    # SQLite: GLOB без регулярных выражений – «base <цифра>...» без нецифровых символов после пробела
+    escaped = re.sub(r"([*?\[])", r"[\1]", base)
+    return db.and_(
+        Palette.name.op("GLOB")(f"{escaped} [0-9]*"),
+        db.not_(Palette.name.op("GLOB")(f"{escaped} *[^0-9]*")),
+        func.length(Palette.name) <= len(base) + 1 + _MAX_SUFFIX_DIGITS,
+    )
+
+
+def _is_name_conflict(exc: IntegrityError) -> bool:
+    """Служебная функция `_is_name_conflict` для внутренней логики модуля."""
+    # psycopg сообщает имя нарушенного ограничения в `diag`
+    diag = getattr(exc.orig, "diag", None)
+    constraint = getattr(diag, "constraint_name", None)
+    if constraint is not None:
+        return constraint == _NAME_CONSTRAINT
+    message = str(exc.orig)
+    return _NAME_CONSTRAINT in message or _SQLITE_NAME_CONFLICT in message
+
+
+def next_default_name(user_id: int, base: str) -> str:
+    """Свободное стандартное название: `base`, если оно не занято, иначе `base N` с наибольшим N + 1."""
+    suffix = cast(func.substr(Palette.name, len(base) + 2), Integer)
+    base_taken, highest = (
+        db.session.query(
+            func.count(case((Palette.name == base, 1))),
+            func.max(case((Palette.name != base, suffix))),
+        )
+        .filter(Palette.user_id == user_id)
+        .filter(db.or_(Palette.name == base, _numbered_name_condition(base)))
+        .one()
+    )
+    if not base_taken:
+        return base
+    return f"{base} {(highest or 0) + 1}"
+
+
+def save_new_palette(
+    user_id: int,
+    colors: list[str],
+    name: str | None = None,
+    default_base: str | None = None,
+) -> Palette:
+    """Сохраняет новую палитру. Без `name` палитра получает свободное стандартное название от `default_base`.
+
+    Занятое явное название – `PaletteNameTaken`.
+    """
+    for _attempt in range(_MAX_SAVE_ATTEMPTS):
+        palette_name = name if name is not None else next_default_name(user_id, default_base or default_palette_name())
+        palette = Palette(name=palette_name, colors=colors, color_count=len(colors), user_id=user_id)
+        db.session.add(palette)
+        try:
+            db.session.commit()
+            return palette
+        except IntegrityError as exc:
+            db.session.rollback()
+            if not _is_name_conflict(exc):
+                raise
+            if name is not None:
+                raise PaletteNameTaken(name) from None
+            # Тот же номер занял параллельный запрос – берём следующий
+    raise PaletteNameTaken(palette_name)
+
+
+def set_palette_name(palette: Palette, name: str) -> None:
+    """Переименовывает палитру; занятое название – `PaletteNameTaken`."""
+    if palette.name == name:
+        return
+    palette.name = name
+    try:
+        db.session.commit()
+    except IntegrityError as exc:
+        db.session.rollback()
+        if not _is_name_conflict(exc):
+            raise
+        raise PaletteNameTaken(name) from None
@@ -0,0 +1,76 @@
+"""
+Модуль: `utils/palette_tasks.py`.
+Назначение: CPU-тяжёлые задачи извлечения палитры для выполнения в пуле процессов.
+
+Функции не зависят от контекста Flask: получают пути и параметры, возвращают
+сериализуемые результаты, поэтому их можно передавать в `ComputePool.submit`.
+"""
+
+import os
+
+import numpy as np
+
+from utils.color_histogram import build_histogram, load_histogram, save_histogram
+from utils.image_processor import (
+    extract_colors_from_histogram,
+    extract_colors_from_pixels,
+    extract_palette_ladder_from_histogram,
+    load_image_pixels,
+    refine_palette_from_histogram,
+)
+
+
+def open_histogram(filepath: str, hist_file: str) -> np.ndarray:
+    """Открывает гистограмму загрузки; если её нет (старая загрузка), строит один раз по файлу."""
+    histogram = load_histogram(hist_file)
+    if histogram is None:
+        histogram = build_histogram(load_image_pixels(filepath))
+        save_histogram(hist_file, histogram)
+    return histogram
+
+
+def upload_palette_task(
+    filepath: str,
+    hist_file: str,
+    color_count: int | None,
+    engine: str,
+    compaction_bits: int = 0,
+) -> list[str] | None:
+    """Одно декодирование и для палитры, и для гистограммы; `color_count=None` – только гистограмма."""
+    return pixels_palette_task(load_image_pixels(filepath), hist_file, color_count, engine, compaction_bits)
+
+
+def pixels_palette_task(
+    pixels: np.ndarray,
+    hist_file: str,
+    color_count: int | None,
+    engine: str,
+    compaction_bits: int = 0,
+) -> list[str] | None:
+    """То же по уже декодированной выборке пикселей (конвейер загрузки декодирует файл сам)."""
+    if not os.path.exists(hist_file):
+        save_histogram(hist_file, build_histogram(pixels))
+    if color_count is None:
+        return None
+    return extract_colors_from_pixels(pixels, color_count, engine, compaction_bits)
+
+
+def histogram_palette_task(filepath: str, hist_file: str, color_count: int, engine: str) -> list[str]:
+    """Палитра по сохранённой гистограмме."""
+    return extract_colors_from_histogram(open_histogram(filepath, hist_file), color_count, engine)
+
+
+def palette_ladder_task(filepath: str, hist_file: str, min_colors: int, max_colors: int) -> dict[str, list[str]]:
+    """Палитры всех размеров из диапазона по гистограмме."""
+    return extract_palette_ladder_from_histogram(open_histogram(filepath, hist_file), min_colors, max_colors)
+
+
+def warm_start_task(
+    filepath: str,
+    hist_file: str,
+    palette: list[str],
+    locked: list[bool],
+    color_count: int,
+) -> list[str]:
+    """Тёплый старт от текущей палитры по гистограмме."""
+    return refine_palette_from_histogram(open_histogram(filepath, hist_file), palette, locked, color_count)
@@ -1,42 +1,295 @@
 """
 Модуль: `utils/rate_limit.py`.
-Назначение: Локальный in-memory rate limiter и утилиты идентификации клиентов.
+Назначение: Ограничение частоты запросов (локальное и общее для процессов) и утилиты идентификации клиентов.
+
+Лимитер считает скользящее окно по двум счётчикам – текущего и предыдущего фиксированного окна
+(sliding window counter): число запросов за последние `window_seconds` оценивается как
+`предыдущий * доля_непрошедшего_окна + текущий`. На ключ хранится несколько чисел независимо
+от лимита. Ключи распределены по шардам со своими блокировками; ключи, по которым не было
+запросов дольше двух окон, периодически удаляются, а общее число ключей ограничено –
+при переполнении шарда вытесняются самые давно использованные.
+
+С `RATE_LIMIT_BACKEND=database` или `redis` счётчики окон хранятся в общем хранилище, и лимит
+действует на все воркеры и узлы, а не на каждый процесс отдельно. Проверка – один запрос
+к хранилищу: увеличить счётчик текущего окна и прочитать предыдущий. Отклонённый запрос,
+как и в локальном лимитере, не учитывается: увеличение счётчика отменяется вторым запросом.
+Отказ процесс запоминает до момента, когда оценка опустится ниже лимита, и повторные запросы
+отклоняет без обращения к хранилищу, поэтому отмена нужна лишь первому отказу. Если хранилище недоступно, проверка выполняется локальным лимитером.
 """
 
 import time
-from collections import defaultdict, deque
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from threading import Lock
 
-from flask import request
+from flask import current_app, request
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
 
+from extensions import db
+from models.rate_limit_counter import RateLimitCounter
 
-class InMemoryRateLimiter:
-    """Простой in-memory rate limiter (sliding window)."""
+
+class _Shard:
+    """Часть ключей лимитера со своей блокировкой."""
 
     def __init__(self):
         """Служебная функция `__init__` для внутренней логики модуля."""
-        self._events = defaultdict(deque)
-        self._lock = Lock()
+        # ключ -> [длина окна, номер текущего окна, счётчик предыдущего окна, счётчик текущего окна]
+        self.counters: OrderedDict[str, list] = OrderedDict()
+        self.lock = Lock()
+        self.last_sweep = time.monotonic()
+        self.evictions = 0
+
+
+class InMemoryRateLimiter:
+    """In-memory rate limiter (sliding window counter) с шардами и ограниченным числом ключей."""
+
+    def __init__(self, max_keys: int = 100_000, shards: int = 16, sweep_interval_seconds: int = 60):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self._max_keys_per_shard = max(1, max_keys // len(self._shards))
+        self._sweep_interval = sweep_interval_seconds
+
+    def _shard(self, key: str) -> _Shard:
+        """Служебная функция `_shard` для внутренней логики модуля."""
+        return self._shards[zlib.crc32(key.encode("utf-8")) % len(self._shards)]
+
+    @staticmethod
+    def _is_idle(counter: list, now: float) -> bool:
+        """Служебная функция `_is_idle` для внутренней логики модуля."""
+        # Оба окна счётчика уже закончились – он ничего не ограничивает
+        return counter[1] < int(now // counter[0]) - 1
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        """Служебная функция `_sweep` для внутренней логики модуля."""
+        shard.last_sweep = now
+        for key in [key for key, counter in shard.counters.items() if self._is_idle(counter, now)]:
+            del shard.counters[key]
 
     def is_allowed(self, key: str, limit: int, window_seconds: int) -> bool:
-        """Выполняет операцию `is_allowed` в рамках сценария модуля."""
+        """Учитывает запрос по ключу и возвращает False, если лимит `limit` за `window_seconds` исчерпан."""
         if limit <= 0 or window_seconds <= 0:
             return False
 
         now = time.monotonic()
-        cutoff = now - window_seconds
+        window_index = int(now // window_seconds)
+        shard = self._shard(key)
 
-        with self._lock:
-            events = self._events[key]
-            while events and events[0] <= cutoff:
-                events.popleft()
+        with shard.lock:
+            if now - shard.last_sweep >= self._sweep_interval:
+                self._sweep(shard, now)
 
-            if len(events) >= limit:
+            counter = shard.counters.get(key)
+            if counter is None or counter[0] != window_seconds:
+                counter = [window_seconds, window_index, 0, 0]
+                shard.counters[key] = counter
+                while len(shard.counters) > self._max_keys_per_shard:
+                    shard.counters.popitem(last=False)
+                    shard.evictions += 1
+            else:
+                shard.counters.move_to_end(key)
+
+            if counter[1] != window_index:
+                # Текущее окно стало предыдущим; если прошло больше окна – оба пусты
+                counter[2] = counter[3] if counter[1] == window_index - 1 else 0
+                counter[3] = 0
+                counter[1] = window_index
+
+            elapsed = now / window_seconds - window_index
+            if counter[2] * (1.0 - elapsed) + counter[3] >= limit:
                 return False
 
-            events.append(now)
+            counter[3] += 1
             return True
 
+    def stats(self) -> dict:
+        """Число отслеживаемых ключей и вытесненных из-за лимита ключей."""
+        keys = evictions = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys += len(shard.counters)
+                evictions += shard.evictions
+        return {"keys": keys, "evictions": evictions}
+
+
+class RateLimitStorage(ABC):
+    """Общее хранилище счётчиков фиксированных окон; ключ уже содержит длину окна."""
+
+    @abstractmethod
+    def hit(self, key: str, window_start: int, window_seconds: int) -> tuple[int, int]:
+        """Увеличивает счётчик окна `window_start` и возвращает (счётчик предыдущего окна, текущего)."""
+
+    @abstractmethod
+    def release(self, key: str, window_start: int) -> None:
+        """Отменяет увеличение счётчика окна `window_start` для отклонённого запроса."""
+
+
+class DatabaseRateLimitStorage(RateLimitStorage):
+    """Счётчики в таблице `rate_limit_counter` (upsert по ключу и окну)."""
+
+    def _upsert(self, dialect, key: str, window_start: int, expires_at: datetime):
+        """Служебная функция `_upsert` для внутренней логики модуля."""
+        table = RateLimitCounter.__table__
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        statement = insert(table).values(bucket_key=key, window_start=window_start, hits=1, expires_at=expires_at)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.bucket_key, table.c.window_start],
+            set_={"hits": table.c.hits + 1},
+        ).returning(table.c.hits)
+
+    def hit(self, key: str, window_start: int, window_seconds: int) -> tuple[int, int]:
+        """Увеличивает счётчик окна `window_start` и возвращает (счётчик предыдущего окна, текущего)."""
+        table = RateLimitCounter.__table__
+        dialect = db.engine.dialect.name
+        expires_at = datetime.utcfromtimestamp(window_start) + timedelta(seconds=2 * window_seconds)
+        upsert = self._upsert(dialect, key, window_start, expires_at)
+        previous = (
+            select(table.c.hits)
+            .where(table.c.bucket_key == key, table.c.window_start == window_start - window_seconds)
+            .scalar_subquery()
+        )
+
+        if dialect == "postgresql":
+            # Один оператор (upsert в CTE) в режиме autocommit – один обмен с сервером
+            hit = upsert.cte("hit")
+            with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                row = connection.execute(select(previous, hit.c.hits)).one()
+            return row[0] or 0, row[1]
+
+        with db.engine.begin() as connection:
+            current = connection.execute(upsert).scalar_one()
+            return connection.execute(select(previous)).scalar() or 0, current
+
+    def release(self, key: str, window_start: int) -> None:
+        """Отменяет увеличение счётчика окна `window_start` для отклонённого запроса."""
+        table = RateLimitCounter.__table__
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(table)
+                .where(table.c.bucket_key == key, table.c.window_start == window_start, table.c.hits > 0)
+                .values(hits=table.c.hits - 1)
+            )
+
+
+class RedisRateLimitStorage(RateLimitStorage):
+    """Счётчики в Redis (или совместимом сервере): INCR, EXPIRE и GET одним конвейером."""
+
+    def __init__(self, url: str, prefix: str = "paleta:rl:"):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        try:
+            import redis
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis требует пакет redis (pip install redis)") from exc
+
+        self._client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._prefix = prefix
+
+    def hit(self, key: str, window_start: int, window_seconds: int) -> tuple[int, int]:
+        """Увеличивает счётчик окна `window_start` и возвращает (счётчик предыдущего окна, текущего)."""
+        current_key = f"{self._prefix}{key}:{window_start}"
+        pipeline = self._client.pipeline(transaction=False)
+        pipeline.incr(current_key)
+        pipeline.expire(current_key, 2 * window_seconds)
+        pipeline.get(f"{self._prefix}{key}:{window_start - window_seconds}")
+        current, _expire_set, previous = pipeline.execute()
+        return int(previous or 0), int(current)
+
+    def release(self, key: str, window_start: int) -> None:
+        """Отменяет увеличение счётчика окна `window_start` для отклонённого запроса."""
+        self._client.decr(f"{self._prefix}{key}:{window_start}")
+
+
+class SharedRateLimiter:
+    """Rate limiter (sliding window counter) поверх общего хранилища с локальным кэшем отказов."""
+
+    def __init__(self, storage: RateLimitStorage, fallback: InMemoryRateLimiter, max_blocked_keys: int = 10_000):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self._storage = storage
+        self._fallback = fallback
+        self._max_blocked_keys = max(1, max_blocked_keys)
+        # ключ -> время (Unix), до которого запросы по ключу отклоняются без обращения к хранилищу
+        self._blocked: OrderedDict[str, float] = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"storage_checks": 0, "local_denials": 0, "storage_errors": 0}
+
+    @staticmethod
+    def _blocked_until(previous: int, current: int, limit: int, window_start: int, window_seconds: int) -> float:
+        """Служебная функция `_blocked_until` для внутренней логики модуля."""
+        # `current` – без отклонённого запроса
+        # Следующий запрос пройдёт, когда previous * (1 - доля окна) + current + 1 <= limit
+        if current + 1 <= limit:
+            fraction = 1.0 - (limit - current - 1) / previous if previous else 0.0
+            return window_start + window_seconds * max(0.0, fraction)
+        # В этом окне – уже нет; в следующем текущий счётчик станет предыдущим
+        fraction = 1.0 - (limit - 1) / current
+        return window_start + window_seconds * (1.0 + max(0.0, fraction))
+
+    def is_allowed(self, key: str, limit: int, window_seconds: int) -> bool:
+        """Учитывает запрос по ключу и возвращает False, если лимит `limit` за `window_seconds` исчерпан."""
+        if limit <= 0 or window_seconds <= 0:
+            return False
+
+        now = time.time()
+        storage_key = f"{key}:{window_seconds}"
+        with self._lock:
+            blocked_until = self._blocked.get(storage_key)
+            if blocked_until is not None:
+                if blocked_until > now:
+                    self._stats["local_denials"] += 1
+                    return False
+                del self._blocked[storage_key]
+
+        window_start = int(now // window_seconds) * window_seconds
+        try:
+            previous, current = self._storage.hit(storage_key, window_start, window_seconds)
+        except Exception as exc:
+            current_app.logger.warning("Хранилище лимитов недоступно (%s), проверка по локальному счётчику", exc)
+            with self._lock:
+                self._stats["storage_errors"] += 1
+            return self._fallback.is_allowed(key, limit, window_seconds)
+
+        elapsed = (now - window_start) / window_seconds
+        # Счётчик уже включает этот запрос
+        allowed = previous * (1.0 - elapsed) + current <= limit
+        if not allowed:
+            current -= 1
+            try:
+                self._storage.release(storage_key, window_start)
+            except Exception as exc:
+                current_app.logger.warning("Не удалось отменить учёт отклонённого запроса (%s)", exc)
+                with self._lock:
+                    self._stats["storage_errors"] += 1
+        with self._lock:
+            self._stats["storage_checks"] += 1
+            if not allowed:
+                self._blocked[storage_key] = self._blocked_until(previous, current, limit, window_start, window_seconds)
+                while len(self._blocked) > self._max_blocked_keys:
+                    self._blocked.popitem(last=False)
+        return allowed
+
+    def stats(self) -> dict:
+        """Счётчики обращений к хранилищу, локальных отказов и ошибок хранилища."""
+        with self._lock:
+            return {**self._stats, "blocked_keys": len(self._blocked)}
+
+
+def create_rate_limiter(config):
+    """Создаёт лимитер по настройке `RATE_LIMIT_BACKEND` (`memory`, `database` или `redis`)."""
+    local = InMemoryRateLimiter(max_keys=config["RATE_LIMIT_MAX_KEYS"], shards=config["RATE_LIMIT_SHARDS"])
+    backend = (config.get("RATE_LIMIT_BACKEND") or "memory").strip().lower()
+    if backend == "memory":
+        return local
+    if backend == "database":
+        return SharedRateLimiter(DatabaseRateLimitStorage(), local)
+    if backend == "redis":
+        if not config.get("RATE_LIMIT_REDIS_URL"):
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis требует RATE_LIMIT_REDIS_URL")
+        return SharedRateLimiter(RedisRateLimitStorage(config["RATE_LIMIT_REDIS_URL"]), local)
+    raise RuntimeError(f"Неизвестное хранилище лимитов RATE_LIMIT_BACKEND={backend!r}")
+
 
 def get_client_identifier() -> str:
     """Возвращает IP клиента с учетом X-Forwarded-For."""
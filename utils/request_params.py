@@ -0,0 +1,29 @@
+"""
+Модуль: `utils/request_params.py`.
+Назначение: Разбор параметров извлечения палитры, общих для веб-API и мобильного API.
+"""
+
+from flask import current_app
+
+from utils.image_processor import is_known_engine
+
+
+def resolve_engine(raw_value: str | None) -> str | None:
+    """Движок квантования из параметра запроса или `PALETTE_ENGINE`; `None` – движок неизвестен."""
+    engine = (raw_value or "").strip().lower() or current_app.config["PALETTE_ENGINE"]
+    return engine if is_known_engine(engine) else None
+
+
+def parse_locked_indices(raw_value, palette_size: int, color_count: int) -> set[int] | None:
+    """Индексы закреплённых цветов из списка `locked`; `None` – значение некорректно."""
+    if raw_value is None:
+        return set()
+    if not isinstance(raw_value, list) or len(raw_value) > color_count:
+        return None
+
+    locked: set[int] = set()
+    for item in raw_value:
+        if isinstance(item, bool) or not isinstance(item, int) or not (0 <= item < palette_size):
+            return None
+        locked.add(item)
+    return locked
@@ -0,0 +1,39 @@
+"""
+Модуль: `utils/schema.py`.
+Назначение: Досоздание новых nullable-колонок в существующих таблицах (базовая миграция `migrations/v0001_baseline.py`).
+"""
+
+from sqlalchemy import inspect, text
+
+
+def add_missing_columns(connection, metadata) -> list[str]:
+    """Добавляет колонки таблиц `metadata`, которых нет в БД, и их индексы; возвращает список добавленных."""
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    added: list[str] = []
+
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        new_columns = [column for column in table.columns if column.name not in existing]
+        for column in new_columns:
+            if not column.nullable:
+                # NOT NULL без значения по умолчанию добавить к заполненной таблице нельзя
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(
+                text(
+                    f"ALTER TABLE {preparer.format_table(table)} "
+                    f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                )
+            )
+            added.append(f"{table.name}.{column.name}")
+
+        new_names = {column.name for column in new_columns}
+        for index in table.indexes:
+            if new_names.intersection(column.name for column in index.columns):
+                index.create(bind=connection, checkfirst=True)
+
+    return added
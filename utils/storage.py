@@ -0,0 +1,275 @@
+"""
+Модуль: `utils/storage.py`.
+Назначение: Хранилище файлов загрузок – локальный диск или S3-совместимое объектное хранилище.
+
+Код загрузок, очистки и отдачи файлов работает с ключами (`ab/cd/<sha256>.<ext>`) через
+общий набор операций: `put`, `fetch` (локальный путь для чтения), `stream`, `delete`,
+`exists`, `list` и `presigned_url`. С S3 (`UPLOAD_STORAGE=s3`) любой узел отдаёт любую
+загрузку, а браузер читает файлы прямо из хранилища по подписанной ссылке.
+Локальный `UPLOAD_FOLDER` в этом режиме – только каталог временных файлов.
+Клиент S3 – пакет `boto3`, он нужен только для `UPLOAD_STORAGE=s3`.
+"""
+
+import mimetypes
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Iterator
+
+from flask import current_app
+from werkzeug.security import safe_join
+
+from utils.file_serving import content_etag
+
+_STREAM_CHUNK_SIZE = 64 * 1024
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class UploadStorage(ABC):
+    """Общий интерфейс хранилища загрузок; ключ – путь файла относительно корня хранилища."""
+
+    # Ошибки, после которых операцию имеет смысл повторить (сбой сети или сервиса), кроме OSError
+    transient_errors: tuple[type[Exception], ...] = ()
+
+    @abstractmethod
+    def put(self, key: str, source_path: str) -> None:
+        """Переносит локальный файл `source_path` в хранилище под ключом `key` (исходный файл удаляется)."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Проверяет, есть ли объект с ключом `key`."""
+
+    @abstractmethod
+    def fetch(self, key: str):
+        """Контекстный менеджер: локальный путь файла для чтения (`FileNotFoundError`, если объекта нет)."""
+
+    @abstractmethod
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Итератор по содержимому объекта блоками."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Удаляет объект; отсутствие объекта ошибкой не считается."""
+
+    @abstractmethod
+    def list(self, prefix: str) -> list[str]:
+        """Ключи объектов, начинающиеся с `prefix`."""
+
+    def presigned_url(self, key: str, expires_in: int) -> str | None:
+        """Временная прямая ссылка на объект или None, если файлы отдаёт приложение."""
+        return None
+
+    def local_path(self, key: str) -> str | None:
+        """Путь объекта на диске этого узла или None для удалённого хранилища."""
+        return None
+
+
+class LocalStorage(UploadStorage):
+    """Хранилище в каталоге на локальном диске (по умолчанию `UPLOAD_FOLDER`)."""
+
+    def __init__(self, root: str):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        """Служебная функция `_path` для внутренней логики модуля."""
+        path = safe_join(self.root, key)
+        if path is None:
+            raise FileNotFoundError(key)
+        return path
+
+    def put(self, key: str, source_path: str) -> None:
+        """Переносит файл в каталог хранилища (переименованием, если это та же ФС)."""
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(source_path, target)
+        except OSError:
+            shutil.move(source_path, target)
+
+    def exists(self, key: str) -> bool:
+        """Проверяет наличие файла."""
+        try:
+            return os.path.isfile(self._path(key))
+        except FileNotFoundError:
+            return False
+
+    @contextmanager
+    def fetch(self, key: str):
+        """Отдаёт путь самого файла – без копирования."""
+        path = self._path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        yield path
+
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Читает файл блоками."""
+        with open(self._path(key), "rb") as f:
+            while chunk := f.read(_STREAM_CHUNK_SIZE):
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        """Удаляет файл, если он есть."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix: str) -> list[str]:
+        """Перечисляет файлы каталога ключа `prefix`, имена которых начинаются с его последней части."""
+        directory, name_prefix = os.path.split(prefix)
+        try:
+            names = os.listdir(self._path(directory) if directory else self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            f"{directory}/{name}" if directory else name
+            for name in names
+            if name.startswith(name_prefix) and not name.endswith(".part")
+        )
+
+    def local_path(self, key: str) -> str | None:
+        """Путь файла на диске."""
+        return self._path(key)
+
+
+class S3Storage(UploadStorage):
+    """S3-совместимое хранилище (AWS S3, MinIO и т. п.); ключи объектов – `prefix` + ключ загрузки."""
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: str | None = None,
+        region: str | None = None,
+        access_key_id: str | None = None,
+        secret_access_key: str | None = None,
+    ):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        try:
+            import boto3
+            from botocore.config import Config as BotoConfig
+            from botocore.exceptions import BotoCoreError, ClientError
+        except ImportError as exc:
+            raise RuntimeError("UPLOAD_STORAGE=s3 требует пакет boto3 (pip install boto3)") from exc
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client_error = ClientError
+        self.transient_errors = (ClientError, BotoCoreError)
+        self._client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key_id or None,
+            aws_secret_access_key=secret_access_key or None,
+            # MinIO и большинство совместимых хранилищ адресуют бакет путём, а не поддоменом
+            config=BotoConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def _object_key(self, key: str) -> str:
+        """Служебная функция `_object_key` для внутренней логики модуля."""
+        return self.prefix + key
+
+    def _is_missing(self, exc) -> bool:
+        """Служебная функция `_is_missing` для внутренней логики модуля."""
+        return exc.response.get("Error", {}).get("Code") in {"404", "NoSuchKey", "NotFound"}
+
+    def put(self, key: str, source_path: str) -> None:
+        """Загружает файл в бакет и удаляет локальную копию."""
+        extra_args = {"ContentType": mimetypes.guess_type(key)[0] or "application/octet-stream"}
+        if content_etag(key):
+            # Ключ определяется содержимым – объект никогда не меняется
+            extra_args["CacheControl"] = _IMMUTABLE_CACHE_CONTROL
+        self._client.upload_file(source_path, self.bucket, self._object_key(key), ExtraArgs=extra_args)
+        os.remove(source_path)
+
+    def exists(self, key: str) -> bool:
+        """Проверяет объект запросом HEAD."""
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+        return True
+
+    @contextmanager
+    def fetch(self, key: str):
+        """Скачивает объект во временный файл и удаляет его после использования."""
+        suffix = os.path.splitext(key)[1]
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        try:
+            try:
+                self._client.download_file(self.bucket, self._object_key(key), path)
+            except self._client_error as exc:
+                if self._is_missing(exc):
+                    raise FileNotFoundError(key) from exc
+                raise
+            yield path
+        finally:
+            os.remove(path)
+
+    def stream(self, key: str) -> Iterator[bytes]:
+        """Читает объект блоками, не загружая его в память целиком."""
+        try:
+            response = self._client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except self._client_error as exc:
+            if self._is_missing(exc):
+                raise FileNotFoundError(key) from exc
+            raise
+        body = response["Body"]
+        try:
+            yield from body.iter_chunks(_STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def delete(self, key: str) -> None:
+        """Удаляет объект (S3 не сообщает об отсутствии ключа)."""
+        self._client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def list(self, prefix: str) -> list[str]:
+        """Перечисляет объекты постранично."""
+        keys = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._object_key(prefix)):
+            keys.extend(item["Key"][len(self.prefix):] for item in page.get("Contents", ()))
+        return sorted(keys)
+
+    def presigned_url(self, key: str, expires_in: int) -> str | None:
+        """Подписанная ссылка GET на объект."""
+        return self._client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=expires_in,
+        )
+
+
+def create_upload_storage(config) -> UploadStorage:
+    """Создаёт хранилище загрузок по настройке `UPLOAD_STORAGE` (`local` или `s3`)."""
+    backend = (config.get("UPLOAD_STORAGE") or "local").strip().lower()
+    if backend == "local":
+        return LocalStorage(config["UPLOAD_FOLDER"])
+    if backend == "s3":
+        if not config.get("S3_BUCKET"):
+            raise RuntimeError("UPLOAD_STORAGE=s3 требует S3_BUCKET")
+        return S3Storage(
+            bucket=config["S3_BUCKET"],
+            prefix=config.get("S3_PREFIX", ""),
+            endpoint_url=config.get("S3_ENDPOINT_URL"),
+            region=config.get("S3_REGION"),
+            access_key_id=config.get("S3_ACCESS_KEY_ID"),
+            secret_access_key=config.get("S3_SECRET_ACCESS_KEY"),
+        )
+    raise RuntimeError(f"Неизвестное хранилище загрузок UPLOAD_STORAGE={backend!r}")
+
+
+def get_upload_storage() -> UploadStorage:
+    """Хранилище загрузок текущего приложения."""
+    storage = current_app.extensions.get("upload_storage")
+    if storage is None:
+        storage = LocalStorage(current_app.config["UPLOAD_FOLDER"])
+    return storage
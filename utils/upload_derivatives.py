@@ -0,0 +1,241 @@
+"""
+Модуль: `utils/upload_derivatives.py`.
+Назначение: Производные файлы загрузки – WebP-мастер ограниченного разрешения и миниатюры.
+
+Файлы лежат рядом с оригиналом в дереве хешей: `ab/cd/<sha256>.master.webp` и
+`ab/cd/<sha256>.thumb-<px>.webp` (1x и 2x). Метаданные (EXIF, XMP) не переносятся,
+ориентация из EXIF применяется к пикселям. Имена детерминированы, поэтому шаблоны и
+клиент ссылаются на миниатюру сразу, а маршрут выдачи подставляет существующий вариант,
+пока производные не готовы или после удаления оригинала по сроку хранения.
+
+Для объектного хранилища выбор подставляемого файла запоминается в памяти процесса
+(`exists()` и `list()` там – запросы к S3): найденный файл – на 5 минут, замена – на минуту,
+столько же клиент кэширует подменённый ответ.
+"""
+
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from models.upload_blob import UploadBlob
+from utils.compute_pool import ComputePoolBusy, run_compute
+from utils.storage import get_upload_storage
+from utils.upload_pipeline import incoming_folder
+
+_SHARDED_NAME_RE = re.compile(r"^(?P<shard>[0-9a-f]{2}/[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})\.(?P<suffix>[a-z0-9.-]+)$")
+_THUMBNAIL_SCALES = (1, 2)
+_MASTER_QUALITY = 85
+_THUMBNAIL_QUALITY = 78
+
+_SERVED_NAME_CACHE_ITEMS = 10000
+_SERVED_NAME_TTL_SECONDS = 300
+_SUBSTITUTE_TTL_SECONDS = 60
+# запрошенное имя -> (имя отдаваемого файла, срок записи по time.monotonic())
+_served_names: OrderedDict[str, tuple[str, float]] = OrderedDict()
+_served_names_lock = Lock()
+
+
+def _split_name(filename: str):
+    """Служебная функция `_split_name` для внутренней логики модуля."""
+    return _SHARDED_NAME_RE.match(filename or "")
+
+
+def master_name(filename: str) -> str | None:
+    """Имя WebP-мастера для загрузки в дереве хешей (у старых плоских имён мастера нет)."""
+    match = _split_name(filename)
+    if match is None:
+        return None
+    return f"{match['shard']}/{match['digest']}.master.webp"
+
+
+def thumbnail_name(filename: str, scale: int = 1) -> str:
+    """Имя миниатюры загрузки; для старых плоских имён – сам файл."""
+    match = _split_name(filename)
+    if match is None:
+        return filename
+    width = current_app.config["UPLOAD_THUMBNAIL_SIZE"] * scale
+    return f"{match['shard']}/{match['digest']}.thumb-{width}.webp"
+
+
+def _cached_served_name(filename: str) -> str | None:
+    """Служебная функция `_cached_served_name` для внутренней логики модуля."""
+    with _served_names_lock:
+        entry = _served_names.get(filename)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del _served_names[filename]
+            return None
+        _served_names.move_to_end(filename)
+        return entry[0]
+
+
+def _remember_served_name(filename: str, served: str) -> None:
+    """Служебная функция `_remember_served_name` для внутренней логики модуля."""
+    ttl = _SERVED_NAME_TTL_SECONDS if served == filename else _SUBSTITUTE_TTL_SECONDS
+    with _served_names_lock:
+        _served_names[filename] = (served, time.monotonic() + ttl)
+        _served_names.move_to_end(filename)
+        while len(_served_names) > _SERVED_NAME_CACHE_ITEMS:
+            _served_names.popitem(last=False)
+
+
+def forget_served_names(digest: str) -> None:
+    """Сбрасывает запомненные подстановки для файлов с хешем `digest` (производные построены или удалены)."""
+    with _served_names_lock:
+        for key in [key for key in _served_names if digest in key]:
+            del _served_names[key]
+
+
+def served_upload_name(filename: str) -> str:
+    """Имя файла, который реально отдать по запрошенному: производные заменяют друг друга и оригинал."""
+    storage = get_upload_storage()
+    if storage.local_path("") is not None:
+        # Локальный диск: проверка – stat(), кэш не нужен
+        return _find_served_name(storage, filename)
+
+    served = _cached_served_name(filename)
+    if served is None:
+        served = _find_served_name(storage, filename)
+        _remember_served_name(filename, served)
+    return served
+
+
+def _find_served_name(storage, filename: str) -> str:
+    """Служебная функция `_find_served_name` для внутренней логики модуля."""
+    if storage.exists(filename):
+        return filename
+
+    match = _split_name(filename)
+    if match is None:
+        return filename
+    keys = storage.list(f"{match['shard']}/{match['digest']}.")
+    master = f"{match['shard']}/{match['digest']}.master.webp"
+    if master in keys:
+        return master
+    # Оригинал: единственный файл с этим хешем, который не является производным
+    for key in keys:
+        if ".master." not in key and ".thumb-" not in key:
+            return key
+    return filename
+
+
+def upload_source_key(upload) -> str:
+    """Ключ файла для повторного анализа: оригинал, а если он удалён по сроку – мастер."""
+    storage = get_upload_storage()
+    master = master_name(upload.filename)
+    if master and not storage.exists(upload.filename) and storage.exists(master):
+        return master
+    return upload.filename
+
+
+def _save_webp(image: Image.Image, path: str, quality: int) -> None:
+    """Служебная функция `_save_webp` для внутренней логики модуля."""
+    tmp_path = f"{path}.part"
+    # Без exif=/icc_profile= Pillow не переносит метаданные в WebP
+    image.save(tmp_path, "WEBP", quality=quality, method=4)
+    os.replace(tmp_path, path)
+
+
+def render_derivatives_task(source: str, master_path: str, thumbnails: list[tuple[int, str]], max_side: int) -> None:
+    """Строит мастер и миниатюры из оригинала (функция для пула вычислений)."""
+    with Image.open(source) as image:
+        width, height = image.size
+        scale = min(1.0, max_side / float(max(width, height)))
+        # JPEG декодируется сразу в уменьшенном масштабе, не меньше итогового размера
+        image.draft("RGB", (max(1, int(width * scale)), max(1, int(height * scale))))
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        frame = ImageOps.exif_transpose(image).convert("RGBA" if has_alpha else "RGB")
+
+    frame.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    _save_webp(frame, master_path, _MASTER_QUALITY)
+    for size, path in sorted(thumbnails, reverse=True):
+        frame.thumbnail((size, size), Image.Resampling.LANCZOS)
+        _save_webp(frame, path, _THUMBNAIL_QUALITY)
+
+
+def build_upload_derivatives(filename: str, force: bool = False) -> bool:
+    """Строит производные загрузки, если их ещё нет; возвращает True, если файлы созданы."""
+    master = master_name(filename)
+    if master is None:
+        return False
+
+    storage = get_upload_storage()
+    keys = [
+        (current_app.config["UPLOAD_THUMBNAIL_SIZE"] * scale, thumbnail_name(filename, scale))
+        for scale in _THUMBNAIL_SCALES
+    ]
+    if not force and all(storage.exists(key) for key in [master] + [key for _, key in keys]):
+        return False
+
+    scratch = incoming_folder(current_app.config["UPLOAD_FOLDER"])
+    os.makedirs(scratch, exist_ok=True)
+    try:
+        with storage.fetch(filename) as source, tempfile.TemporaryDirectory(dir=scratch) as workdir:
+            master_path = os.path.join(workdir, "master.webp")
+            thumbnails = [(size, os.path.join(workdir, f"thumb-{size}.webp")) for size, _ in keys]
+            run_compute(
+                render_derivatives_task, source, master_path, thumbnails, current_app.config["UPLOAD_MASTER_MAX_SIDE"]
+            )
+            storage.put(master, master_path)
+            for (_, path), (_, key) in zip(thumbnails, keys):
+                storage.put(key, path)
+        forget_served_names(_split_name(filename)["digest"])
+    except FileNotFoundError:
+        # Оригинала нет (удалён по сроку хранения или вместе с загрузкой)
+        return False
+    return True
+
+
+def schedule_upload_derivatives(response, filename: str):
+    """Строит производные после отправки ответа, не задерживая загрузку; возвращает `response`."""
+    app = current_app._get_current_object()
+
+    @response.call_on_close
+    def _build():
+        """Служебная функция `_build` для внутренней логики модуля."""
+        with app.app_context():
+            try:
+                build_upload_derivatives(filename)
+            except ComputePoolBusy:
+                # Пул занят: производные достроит `flask upload-derivatives`
+                app.logger.info("Производные %s отложены: пул вычислений занят", filename)
+            except Exception:
+                app.logger.exception("Не удалось построить производные загрузки %s", filename)
+
+    return response
+
+
+def backfill_derivatives() -> int:
+    """Достраивает недостающие производные для всех файлов хранилища; возвращает их число."""
+    built = 0
+    for blob in UploadBlob.query.order_by(UploadBlob.created_at).yield_per(500):
+        try:
+            if build_upload_derivatives(blob.relative_path):
+                built += 1
+        except OSError:
+            current_app.logger.warning("Не удалось построить производные %s", blob.relative_path)
+    return built
+
+
+def purge_expired_originals(retention_days: int) -> int:
+    """Удаляет оригиналы старше срока хранения, если у них есть мастер; возвращает их число."""
+    if retention_days <= 0:
+        return 0
+
+    storage = get_upload_storage()
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = 0
+    for blob in UploadBlob.query.filter(UploadBlob.created_at < cutoff).yield_per(500):
+        if storage.exists(blob.relative_path) and storage.exists(master_name(blob.relative_path)):
+            storage.delete(blob.relative_path)
+            forget_served_names(blob.digest)
+            purged += 1
+    return purged
@@ -0,0 +1,157 @@
+"""
+Модуль: `utils/upload_pipeline.py`.
+Назначение: Общий конвейер загрузки изображений для веб- и мобильного API.
+
+Тело запроса принимается потоком (`utils/upload_stream.py`): файл пишется во временный
+файл и хешируется по пути, а недопустимый формат или разрешение отклоняются по заголовку.
+Затем `decode()` один раз декодирует изображение в уменьшенную выборку пикселей – в пуле
+вычислений (`utils/compute_pool.py`), а не в потоке запроса; при полной очереди – `ComputePoolBusy`.
+Выборка уходит в извлечение палитры; ошибка декодирования означает повреждённый файл,
+поэтому отдельный `verify()` не нужен. Из той же выборки считается BlurHash-превью.
+Фоновая задача извлечения (`async=1`) ставится в очередь без декодирования – его выполнит воркер.
+Сохранение загрузки – перенос временного файла в хранилище (`utils/storage.py`).
+"""
+
+import os
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from config import Config
+from utils.blurhash import encode_blurhash, orient_grid
+from utils.compute_pool import run_compute
+from utils.image_processor import sample_image_pixels, sample_size
+from utils.upload_stream import (
+    UPLOAD_ERROR_FORMAT,
+    UPLOAD_ERROR_INVALID_IMAGE,
+    UPLOAD_ERROR_TOO_LARGE,
+    ReceivedUpload,
+    UploadValidationError,
+    receive_image_upload,
+)
+
+_FORMAT_TO_EXTENSION = {"jpeg": "jpg", "png": "png", "webp": "webp"}
+
+# Временные файлы принимаемых загрузок – в подкаталоге, чтобы `os.replace` не пересекал ФС
+_INCOMING_DIR = ".incoming"
+
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+class DecodedImage:
+    """Результат декодирования: расширение, размеры, выборка пикселей и BlurHash-превью."""
+
+    def __init__(self, extension: str, width: int, height: int, pixels: np.ndarray, placeholder: str | None):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.extension = extension
+        self.width = width
+        self.height = height
+        self.pixels = pixels
+        self.placeholder = placeholder
+
+
+def decode_upload_task(path: str) -> DecodedImage:
+    """Декодирует принятый файл в выборку пикселей и превью; задача для пула вычислений.
+
+    Недопустимое или повреждённое изображение – `UploadValidationError`.
+    """
+    try:
+        with Image.open(path) as image:
+            image_format = (image.format or "").lower()
+            if image_format not in Config.ALLOWED_IMAGE_FORMATS:
+                raise UploadValidationError(UPLOAD_ERROR_FORMAT)
+
+            width, height = image.size
+            if width * height > Config.MAX_IMAGE_PIXELS:
+                raise UploadValidationError(UPLOAD_ERROR_TOO_LARGE)
+
+            orientation = image.getexif().get(_EXIF_ORIENTATION_TAG)
+            pixels = sample_image_pixels(image)
+    except Image.DecompressionBombError as exc:
+        raise UploadValidationError(UPLOAD_ERROR_TOO_LARGE) from exc
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as exc:
+        raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE) from exc
+
+    sample_width, sample_height = sample_size((width, height))
+    grid = orient_grid(pixels.reshape(sample_height, sample_width, 3), orientation)
+    return DecodedImage(_FORMAT_TO_EXTENSION[image_format], width, height, pixels, encode_blurhash(grid))
+
+
+class PreparedUpload:
+    """Принятое изображение: поля формы, расширение, размеры, sha256, объём; после `decode()` – выборка и превью."""
+
+    def __init__(self, received: ReceivedUpload, width: int, height: int):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.form = received.form
+        self.digest = received.digest
+        self.size = received.size
+        self.extension = _FORMAT_TO_EXTENSION[received.image_format]
+        self.width = width
+        self.height = height
+        self.pixels: np.ndarray | None = None
+        self.placeholder: str | None = None
+        self._temp_path = received.path
+
+    @property
+    def path(self) -> str | None:
+        """Локальный путь принятого файла, пока он не перенесён в хранилище."""
+        return self._temp_path
+
+    def decode(self) -> None:
+        """Декодирует файл в пуле вычислений; `UploadValidationError` или `ComputePoolBusy` при отказе.
+
+        Временный файл при ошибке не удаляется – это делает маршрут через `discard()`.
+        """
+        decoded = run_compute(decode_upload_task, self._temp_path)
+        self.extension = decoded.extension
+        self.width = decoded.width
+        self.height = decoded.height
+        self.pixels = decoded.pixels
+        self.placeholder = decoded.placeholder
+
+    def save(self, storage, key: str) -> None:
+        """Переносит принятый файл в хранилище под ключом `key`."""
+        storage.put(key, self._temp_path)
+        self._temp_path = None
+
+    def discard(self) -> None:
+        """Удаляет временный файл, если загрузка так и не была сохранена."""
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        self._temp_path = None
+
+
+def _header_size(received: ReceivedUpload) -> tuple[int, int]:
+    """Служебная функция `_header_size` для внутренней логики модуля."""
+    if received.width is not None and received.height is not None:
+        return received.width, received.height
+    # Заголовок без размеров (часть WebP): Pillow читает только заголовок, без декодирования
+    try:
+        with Image.open(received.path) as image:
+            width, height = image.size
+    except Image.DecompressionBombError as exc:
+        raise UploadValidationError(UPLOAD_ERROR_TOO_LARGE) from exc
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError) as exc:
+        raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE) from exc
+    if width * height > Config.MAX_IMAGE_PIXELS:
+        raise UploadValidationError(UPLOAD_ERROR_TOO_LARGE)
+    return width, height
+
+
+def prepare_upload(request, upload_folder: str) -> PreparedUpload:
+    """Принимает загрузку запроса и проверяет её по заголовку; при ошибке – `UploadValidationError`.
+
+    Изображение ещё не декодировано: маршрут вызывает `decode()`, если палитра считается сразу.
+    Файл остаётся во временном каталоге (`path`), пока маршрут не вызовет `save()` или `discard()`.
+    """
+    received = receive_image_upload(request, incoming_folder(upload_folder))
+    try:
+        return PreparedUpload(received, *_header_size(received))
+    except BaseException:
+        os.remove(received.path)
+        raise
+
+
+def incoming_folder(upload_folder: str) -> str:
+    """Каталог временных файлов загрузок и производных до переноса в хранилище."""
+    return os.path.join(upload_folder, _INCOMING_DIR)
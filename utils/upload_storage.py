@@ -0,0 +1,253 @@
+"""
+Модуль: `utils/upload_storage.py`.
+Назначение: Хранение загрузок по хешу содержимого в дереве каталогов `ab/cd/<sha256>.<ext>`.
+
+Одинаковые файлы хранятся один раз: запись `UploadBlob` считает ссылки из `Upload`,
+и файл удаляется, когда освобождена последняя ссылка. Два уровня по 256 подкаталогов
+держат каталоги небольшими при любом числе загрузок. Файлы лежат в хранилище
+`utils/storage.py` (локальный диск или S3). Функции меняют сессию БД,
+но не коммитят её – это делает вызывающий код вместе с записью `Upload`.
+
+Взятие ссылки и удаление освобождённого файла сериализуются по sha256: в Postgres –
+транзакционной advisory-блокировкой, которую загрузка держит до своего коммита. Удаление
+под той же блокировкой перепроверяет, что записи `UploadBlob` нет, поэтому повторная
+загрузка того же содержимого не останется без файла.
+"""
+
+import os
+import re
+
+from sqlalchemy import text, update
+from sqlalchemy.exc import IntegrityError
+from PIL import Image, UnidentifiedImageError
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models.upload import Upload
+from models.upload_blob import UploadBlob
+from utils.palette_cache import content_digest
+from utils.palette_extraction import forget_upload_digest
+from utils.storage import get_upload_storage
+from utils.upload_derivatives import forget_served_names
+
+_SHARDED_NAME_RE = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.(?:jpg|png|webp)$")
+_EXTENSION_ALIASES = {"jpeg": "jpg"}
+
+
+def blob_relative_path(digest: str, extension: str) -> str:
+    """Путь файла с данным sha256 относительно UPLOAD_FOLDER."""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def is_upload_name(name) -> bool:
+    """Проверяет имя загрузки из запроса: путь в дереве хешей или старое плоское имя."""
+    if not isinstance(name, str) or not name:
+        return False
+    if _SHARDED_NAME_RE.match(name):
+        return True
+    return secure_filename(name) == name
+
+
+def find_upload_reference(filename, upload_id, owner_id: int | None) -> Upload | None:
+    """Загрузка из запроса по имени файла или id; `owner_id` – текущий пользователь (`None` – аноним)."""
+    if filename:
+        if not is_upload_name(filename):
+            return None
+        # Одинаковые загрузки делят файл: ищем только свою запись или анонимную загрузку
+        owners = [Upload.user_id.is_(None)]
+        if owner_id is not None:
+            owners.append(Upload.user_id == owner_id)
+        return (
+            Upload.query.filter(Upload.filename == filename, db.or_(*owners))
+            # Своя запись важнее анонимной, среди равных – самая свежая
+            .order_by(Upload.user_id.is_(None), Upload.id.desc())
+            .first()
+        )
+
+    if upload_id is None or owner_id is None:
+        return None
+    try:
+        upload = db.session.get(Upload, int(upload_id))
+    except (TypeError, ValueError):
+        return None
+    if upload is None or upload.user_id != owner_id:
+        return None
+    return upload
+
+
+def _lock_digest(digest: str) -> None:
+    """Блокирует sha256 до конца текущей транзакции сессии (только Postgres)."""
+    if db.engine.dialect.name != "postgresql":
+        return
+    # 60 старших бит хеша – ключ bigint без заметных коллизий
+    db.session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": int(digest[:15], 16)})
+
+
+def _acquire_blob(digest: str, extension: str, size_bytes: int, width: int, height: int) -> bool:
+    """Увеличивает счётчик ссылок файла, создавая запись при первой загрузке содержимого.
+
+    Возвращает True, если запись создана – тогда файл нужно положить в хранилище.
+    """
+    _lock_digest(digest)
+    increment = (
+        update(UploadBlob)
+        .where(UploadBlob.digest == digest)
+        .values(ref_count=UploadBlob.ref_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.execute(increment).rowcount:
+        return False
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(
+                UploadBlob(
+                    digest=digest,
+                    extension=extension,
+                    size_bytes=size_bytes,
+                    width=width,
+                    height=height,
+                    ref_count=1,
+                )
+            )
+    except IntegrityError:
+        # Параллельная загрузка того же содержимого успела создать запись
+        db.session.execute(increment)
+        return False
+    return True
+
+
+def store_upload_blob(prepared) -> str:
+    """Учитывает ссылку на файл и кладёт принятый файл в хранилище, если такого там ещё нет.
+
+    Ссылка берётся до проверки хранилища: пока она не закоммичена, освобождение последней
+    ссылки другим запросом не удалит файл. Возвращает ключ файла в хранилище – он же путь
+    относительно UPLOAD_FOLDER.
+    """
+    storage = get_upload_storage()
+    relative = blob_relative_path(prepared.digest, prepared.extension)
+    created = _acquire_blob(prepared.digest, prepared.extension, prepared.size, prepared.width, prepared.height)
+    if created or not storage.exists(relative):
+        prepared.save(storage, relative)
+    else:
+        prepared.discard()
+    return relative
+
+
+def release_upload_blobs(uploads) -> list[str]:
+    """Освобождает ссылки записей на файлы и удаляет записи `UploadBlob`, на которые больше никто не ссылается.
+
+    Файлы не трогаются: функция возвращает, что удалить после коммита (`delete_released_files`) –
+    ключи старых плоских загрузок и префиксы `ab/cd/<sha256>.` файлов с производными.
+    Если коммит не состоится, файлы останутся, а осиротевшие подберёт `flask cleanup-uploads`.
+    """
+    released: list[str] = []
+    references: dict[str, int] = {}
+    for upload in uploads:
+        if upload.content_hash and upload.filename == blob_relative_path(
+            upload.content_hash, os.path.splitext(upload.filename)[1].lstrip(".")
+        ):
+            references[upload.content_hash] = references.get(upload.content_hash, 0) + 1
+        elif upload.filename:
+            # Старая загрузка с плоским именем: файл принадлежит только ей
+            released.append(upload.filename)
+
+    for digest, count in references.items():
+        db.session.execute(
+            update(UploadBlob)
+            .where(UploadBlob.digest == digest)
+            .values(ref_count=UploadBlob.ref_count - count)
+            .execution_options(synchronize_session=False)
+        )
+
+    if references:
+        orphaned = UploadBlob.query.filter(UploadBlob.digest.in_(list(references)), UploadBlob.ref_count <= 0).all()
+        for blob in orphaned:
+            released.append(f"{os.path.dirname(blob.relative_path)}/{blob.digest}.")
+            db.session.delete(blob)
+    return released
+
+
+def delete_released_files(released: list[str]) -> int:
+    """Удаляет файлы, освобождённые `release_upload_blobs`, вместе с производными; возвращает их число.
+
+    Перед удалением файлов по хешу запись `UploadBlob` перепроверяется под блокировкой:
+    если то же содержимое успели загрузить снова, файл остаётся. Вместе с файлом удаляются
+    гистограмма и кэшированные палитры этого содержимого.
+    """
+    storage = get_upload_storage()
+    deleted = 0
+    for entry in released:
+        if not entry.endswith("."):
+            storage.delete(entry)
+            deleted += 1
+            continue
+
+        # Префикс `ab/cd/<sha256>.` – оригинал, `<sha256>.master.webp` и `<sha256>.thumb-*.webp`
+        digest = os.path.basename(entry)[:-1]
+        _lock_digest(digest)
+        try:
+            if db.session.get(UploadBlob, digest) is not None:
+                continue
+            for key in storage.list(entry):
+                storage.delete(key)
+                deleted += 1
+            forget_upload_digest(digest)
+            forget_served_names(digest)
+        finally:
+            # Снимает блокировку; сессия ничего не меняла
+            db.session.rollback()
+    return deleted
+
+
+def migrate_flat_uploads(upload_folder: str, dry_run: bool = False) -> dict:
+    """Переносит загрузки с плоскими именами из `upload_folder` в хранилище по хешам, объединяя одинаковые файлы.
+
+    Каждая запись коммитится сразу после переноса файла, поэтому прерванный перенос
+    можно безопасно запустить повторно.
+    """
+    storage = get_upload_storage()
+    stats = {"migrated": 0, "deduplicated": 0, "missing": 0, "invalid": 0}
+    seen: set[str] = set()
+    upload_ids = [
+        row.id
+        for row in Upload.query.filter(~Upload.filename.contains("/")).order_by(Upload.id).with_entities(Upload.id)
+    ]
+
+    for upload_id in upload_ids:
+        upload = db.session.get(Upload, upload_id)
+        source = os.path.join(upload_folder, upload.filename or "")
+        if not upload.filename or not os.path.isfile(source):
+            stats["missing"] += 1
+            continue
+
+        try:
+            with Image.open(source) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, OSError):
+            stats["invalid"] += 1
+            continue
+
+        with open(source, "rb") as f:
+            digest = content_digest(f)
+        extension = os.path.splitext(upload.filename)[1].lstrip(".").lower()
+        extension = _EXTENSION_ALIASES.get(extension, extension)
+        relative = blob_relative_path(digest, extension)
+
+        duplicate = digest in seen or storage.exists(relative)
+        seen.add(digest)
+        stats["deduplicated" if duplicate else "migrated"] += 1
+        if dry_run:
+            continue
+
+        size_bytes = os.path.getsize(source)
+        if _acquire_blob(digest, extension, size_bytes, width, height) or not storage.exists(relative):
+            storage.put(relative, source)
+        else:
+            os.remove(source)
+        upload.filename = relative
+        upload.content_hash = digest
+        db.session.commit()
+
+    db.session.rollback()
+    return stats
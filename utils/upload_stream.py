@@ -0,0 +1,308 @@
+"""
+Модуль: `utils/upload_stream.py`.
+Назначение: Потоковый приём multipart-загрузки изображения с ранним отказом по заголовку файла.
+
+Тело запроса читается блоками через `MultipartDecoder` (werkzeug) и целиком в памяти
+не хранится: данные файла сразу пишутся во временный файл рядом с каталогом загрузок
+и по пути хешируются (sha256). Формат и размеры в пикселях определяются по первым
+килобайтам (сигнатура и заголовок PNG/JPEG/WebP), и при недопустимом значении приём
+прерывается, не дочитывая остаток тела.
+"""
+
+import hashlib
+import os
+import struct
+import tempfile
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from config import Config
+
+# Сообщения об ошибках – msgid; маршруты переводят их или отдают как есть
+UPLOAD_ERROR_MISSING = "Файл не был загружен"
+UPLOAD_ERROR_EMPTY_NAME = "Файл не выбран"
+UPLOAD_ERROR_EXTENSION = "Недопустимый тип файла"
+UPLOAD_ERROR_INVALID_IMAGE = "Файл не является корректным изображением"
+UPLOAD_ERROR_FORMAT = "Недопустимый формат изображения"
+UPLOAD_ERROR_TOO_LARGE = "Изображение слишком большое по разрешению"
+UPLOAD_ERROR_BODY_TOO_LARGE = "Файл слишком большой. Максимальный размер: 16 МБ"
+
+_CHUNK_SIZE = 64 * 1024
+# Суммарный предел текстовых полей формы (color_count, engine и т. п.)
+_MAX_FIELDS_BYTES = 64 * 1024
+# Сколько байт начала файла просматривать в поисках размеров (JPEG с большим EXIF)
+_SNIFF_LIMIT = 256 * 1024
+# Сигнатуры форматов, которые распознаются, но не принимаются
+_FOREIGN_SIGNATURES = (
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+# Маркеры SOF (кадр JPEG), кроме DHT/JPG/DAC
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class UploadValidationError(Exception):
+    """Загруженный файл отклонён; `message` – msgid для ответа клиенту."""
+
+    def __init__(self, message: str, status: int = 400):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _jpeg_header(head: bytes, final: bool) -> tuple[str, int | None, int | None] | None:
+    """Служебная функция `_jpeg_header` для внутренней логики модуля."""
+    position = 2
+    while True:
+        if position + 4 > len(head):
+            break
+        if head[position] != 0xFF:
+            raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+        marker = head[position + 1]
+        if marker == 0xFF:
+            # Байты-заполнители перед маркером
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            position += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # Конец изображения или начало данных скана без кадра – файл повреждён
+            raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+
+        (length,) = struct.unpack(">H", head[position + 2 : position + 4])
+        if marker in _JPEG_SOF_MARKERS:
+            if position + 9 > len(head):
+                break
+            height, width = struct.unpack(">HH", head[position + 5 : position + 9])
+            return "jpeg", width, height
+        position += 2 + length
+
+    if final or len(head) >= _SNIFF_LIMIT:
+        # Кадр не найден в просмотренном начале: окончательно проверит декодер
+        return "jpeg", None, None
+    return None
+
+
+def _webp_header(head: bytes, final: bool) -> tuple[str, int | None, int | None] | None:
+    """Служебная функция `_webp_header` для внутренней логики модуля."""
+    if len(head) < 30:
+        return ("webp", None, None) if final else None
+
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return "webp", width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        b0, b1, b2, b3 = head[21:25]
+        width = 1 + (b0 | ((b1 & 0x3F) << 8))
+        height = 1 + ((b1 >> 6) | (b2 << 2) | ((b3 & 0x0F) << 10))
+        return "webp", width, height
+    if chunk == b"VP8X":
+        width = 1 + int.from_bytes(head[24:27], "little")
+        height = 1 + int.from_bytes(head[27:30], "little")
+        return "webp", width, height
+    raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+
+
+def parse_image_header(head: bytes, final: bool = False) -> tuple[str, int | None, int | None] | None:
+    """Определяет формат и размеры изображения по началу файла.
+
+    Возвращает `(format, width, height)`, `None`, если байт пока мало (при `final=False`),
+    или бросает `UploadValidationError`, если это не изображение. Размеры равны `None`,
+    когда их нельзя прочитать из заголовка – тогда их проверит декодер.
+    """
+    if len(head) < 12 and not final:
+        return None
+
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        if len(head) < 24:
+            return ("png", None, None) if final else None
+        if head[12:16] != b"IHDR":
+            raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+        width, height = struct.unpack(">II", head[16:24])
+        return "png", width, height
+
+    if head.startswith(b"\xff\xd8\xff"):
+        return _jpeg_header(head, final)
+
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return _webp_header(head, final)
+
+    for signature, image_format in _FOREIGN_SIGNATURES:
+        if head.startswith(signature):
+            return image_format, None, None
+
+    raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+
+
+class _ImageSink:
+    """Приёмник данных файла: проверка заголовка, sha256 и запись во временный файл."""
+
+    def __init__(self, directory: str, max_pixels: int, allowed_formats: set[str]):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.max_pixels = max_pixels
+        self.allowed_formats = allowed_formats
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._head = bytearray()
+        self.header: tuple[str, int | None, int | None] | None = None
+        self.size = 0
+
+    def _check_header(self, header: tuple[str, int | None, int | None]) -> None:
+        """Служебная функция `_check_header` для внутренней логики модуля."""
+        image_format, width, height = header
+        if image_format not in self.allowed_formats:
+            raise UploadValidationError(UPLOAD_ERROR_FORMAT)
+        if width is not None and height is not None and width * height > self.max_pixels:
+            raise UploadValidationError(UPLOAD_ERROR_TOO_LARGE)
+        self.header = header
+        self._head = bytearray()
+
+    def write(self, data: bytes) -> None:
+        """Служебная функция `write` для внутренней логики модуля."""
+        if not data:
+            return
+        if self.header is None:
+            self._head += data
+            header = parse_image_header(bytes(self._head))
+            if header is not None:
+                self._check_header(header)
+        self._hash.update(data)
+        self._file.write(data)
+        self.size += len(data)
+
+    def finish(self) -> str:
+        """Закрывает файл и возвращает sha256; файл короче заголовка – не изображение."""
+        self._file.close()
+        if self.header is None:
+            if not self._head:
+                raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE)
+            self._check_header(parse_image_header(bytes(self._head), final=True))
+        return self._hash.hexdigest()
+
+    def discard(self) -> None:
+        """Служебная функция `discard` для внутренней логики модуля."""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ReceivedUpload:
+    """Принятый файл во временном каталоге: поля формы, имя, sha256 и данные заголовка."""
+
+    def __init__(self, form: MultiDict, filename: str, path: str, digest: str, size: int, header: tuple):
+        """Служебная функция `__init__` для внутренней логики модуля."""
+        self.form = form
+        self.filename = filename
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.image_format, self.width, self.height = header
+
+
+def _open_sink(filename: str | None, directory: str) -> _ImageSink:
+    """Служебная функция `_open_sink` для внутренней логики модуля."""
+    if not filename:
+        raise UploadValidationError(UPLOAD_ERROR_EMPTY_NAME)
+    if not Config.allowed_file(filename):
+        raise UploadValidationError(UPLOAD_ERROR_EXTENSION)
+    return _ImageSink(directory, Config.MAX_IMAGE_PIXELS, Config.ALLOWED_IMAGE_FORMATS)
+
+
+def _receive_parsed(request, field_name: str, directory: str) -> ReceivedUpload:
+    """Форма уже разобрана werkzeug (например, CSRF-токен пришёл полем формы): тот же путь по файлу."""
+    if field_name not in request.files:
+        raise UploadValidationError(UPLOAD_ERROR_MISSING)
+    file_storage = request.files[field_name]
+    sink = _open_sink(file_storage.filename, directory)
+    try:
+        for chunk in iter(lambda: file_storage.stream.read(_CHUNK_SIZE), b""):
+            sink.write(chunk)
+        digest = sink.finish()
+    except BaseException:
+        sink.discard()
+        raise
+    return ReceivedUpload(MultiDict(request.form), file_storage.filename, sink.path, digest, sink.size, sink.header)
+
+
+def receive_image_upload(request, directory: str, field_name: str = "image") -> ReceivedUpload:
+    """Принимает multipart-запрос потоком; при отказе – `UploadValidationError` без дочитывания тела."""
+    if "files" in request.__dict__:
+        return _receive_parsed(request, field_name, directory)
+
+    mimetype, options = parse_options_header(request.headers.get("Content-Type", ""))
+    boundary = options.get("boundary")
+    if mimetype != "multipart/form-data" or not boundary:
+        raise UploadValidationError(UPLOAD_ERROR_MISSING)
+
+    # Буфер декодера не превышает блока чтения; предел полей формы проверяется ниже
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    form = MultiDict()
+    field_parts: list[bytes] = []
+    fields_size = 0
+    current_field: str | None = None
+    sink: _ImageSink | None = None
+    filename = None
+    digest = None
+    # Куда идут данные текущей части: поле формы, файл изображения или никуда (лишние файлы)
+    target = None
+
+    try:
+        # Превышение MAX_CONTENT_LENGTH по заголовку Content-Length обнаруживается уже здесь
+        stream = request.stream
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                chunk = stream.read(_CHUNK_SIZE)
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, Field):
+                current_field, field_parts, target = event.name, [], "field"
+            elif isinstance(event, File):
+                if event.name == field_name and sink is None:
+                    filename = event.filename
+                    sink = _open_sink(filename, directory)
+                    target = "file"
+                else:
+                    target = None
+            elif isinstance(event, Data):
+                if target == "field":
+                    fields_size += len(event.data)
+                    if fields_size > _MAX_FIELDS_BYTES:
+                        raise RequestEntityTooLarge()
+                    field_parts.append(event.data)
+                    if not event.more_data:
+                        form.add(current_field, b"".join(field_parts).decode("utf-8", "replace"))
+                elif target == "file":
+                    sink.write(event.data)
+                    if not event.more_data:
+                        digest = sink.finish()
+            elif isinstance(event, Epilogue):
+                break
+    except RequestEntityTooLarge as exc:
+        if sink is not None:
+            sink.discard()
+        raise UploadValidationError(UPLOAD_ERROR_BODY_TOO_LARGE, status=413) from exc
+    except ValueError as exc:
+        # Тело оборвалось или нарушена структура multipart
+        if sink is not None:
+            sink.discard()
+        raise UploadValidationError(UPLOAD_ERROR_INVALID_IMAGE if sink else UPLOAD_ERROR_MISSING) from exc
+    except BaseException:
+        if sink is not None:
+            sink.discard()
+        raise
+
+    if sink is None:
+        raise UploadValidationError(UPLOAD_ERROR_MISSING)
+    return ReceivedUpload(form, filename, sink.path, digest, sink.size, sink.header)